@@ -0,0 +1,193 @@
+from datetime import date, timedelta
+from typing import Iterable
+
+import numpy as np
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from models.habit_models import Habit, HabitCompletion, HabitType
+from schemas.habit_schemas import HabitAnalytics, WeeklyTotal
+
+
+ROLLING_WINDOWS = (7, 30)
+DEFAULT_ANALYTICS_DAYS = 365
+MAX_ANALYTICS_DAYS = 10 * 366
+# Límites de `from`/`to`: el rango se amplía hacia atrás con la ventana
+# móvil y hacia delante hasta el final de su semana o de su mes.
+ANALYTICS_MIN_DATE = date.min + timedelta(days=max(ROLLING_WINDOWS) + 7)
+ANALYTICS_MAX_DATE = date.max - timedelta(days=31)
+
+_EPOCH = date(1970, 1, 1)
+# El 1970-01-01 fue jueves: (días + 3) % 7 da 0 = lunes ... 6 = domingo.
+_EPOCH_WEEKDAY_OFFSET = 3
+
+_EMPTY_DAYS = np.empty(0, dtype=np.int64)
+_EMPTY_VALUES = np.empty(0, dtype=np.float64)
+
+
+def to_day_numbers(dates: Iterable[date]) -> np.ndarray:
+    """
+    Convierte fechas en días desde 1970-01-01 (enteros), el formato con el
+    que trabajan todos los cálculos vectorizados.
+    """
+    return np.array(list(dates), dtype="datetime64[D]").astype(np.int64)
+
+
+def _to_date(day_number: int) -> date:
+    return _EPOCH + timedelta(days=int(day_number))
+
+
+def _weekday(day_numbers):
+    return (day_numbers + _EPOCH_WEEKDAY_OFFSET) % 7
+
+
+def _window_ratio(cumulative_done: np.ndarray, cumulative_eligible: np.ndarray, ends: np.ndarray, window: int) -> np.ndarray:
+    done = cumulative_done[ends + 1] - cumulative_done[ends + 1 - window]
+    eligible = cumulative_eligible[ends + 1] - \
+        cumulative_eligible[ends + 1 - window]
+    return np.divide(done, eligible, out=np.zeros(len(ends)), where=eligible > 0)
+
+
+def _round(values: np.ndarray) -> list[float]:
+    return np.round(values, 4).tolist()
+
+
+def compute_habit_analytics(habit: Habit, days: np.ndarray, values: np.ndarray, start_date: date, end_date: date) -> HabitAnalytics:
+    """
+    Calcula todas las métricas de un hábito en el rango [start_date, end_date]
+    sin bucles de Python:
+    - `days`: días (ver `to_day_numbers`) con completitud, ordenados y sin
+      duplicados; debe incluir los `max(ROLLING_WINDOWS) - 1` días previos
+      a `start_date` para que las ventanas móviles arranquen completas.
+    - `values`: el `value` de cada completitud (NaN si no tiene).
+    Los días sin completitud anteriores a la creación del hábito no cuentan
+    como fallos.
+    """
+    start_day = int(to_day_numbers([start_date])[0])
+    end_day = int(to_day_numbers([end_date])[0])
+    created_day = int(to_day_numbers([habit.created_at.date()])[0]
+                      ) if habit.created_at else start_day
+
+    # Rejilla diaria: 1 si hubo completitud ese día, 0 si no.
+    grid_start = start_day - (max(ROLLING_WINDOWS) - 1)
+    grid = np.arange(grid_start, end_day + 1, dtype=np.int64)
+    in_grid = (days >= grid_start) & (days <= end_day)
+    done = np.zeros(len(grid), dtype=np.int64)
+    done[days[in_grid] - grid_start] = 1
+    # Un día con completitud cuenta aunque sea anterior a la creación
+    # (completitudes importadas o registradas a posteriori).
+    eligible = ((grid >= created_day) | (done == 1)).astype(np.int64)
+
+    in_range = slice(start_day - grid_start, None)
+    range_days = grid[in_range]
+    range_done = done[in_range]
+    range_eligible = eligible[in_range]
+
+    # Tasa de completitud por día de la semana (lunes a domingo).
+    weekdays = _weekday(range_days)
+    completed_by_weekday = np.bincount(
+        weekdays, weights=range_done, minlength=7)
+    eligible_by_weekday = np.bincount(
+        weekdays, weights=range_eligible, minlength=7)
+    weekday_rate = np.divide(completed_by_weekday, eligible_by_weekday,
+                             out=np.zeros(7), where=eligible_by_weekday > 0)
+
+    # Adherencia móvil: sumas por ventana a partir de sumas acumuladas.
+    cumulative_done = np.concatenate(([0], np.cumsum(done)))
+    cumulative_eligible = np.concatenate(([0], np.cumsum(eligible)))
+    ends = np.arange(start_day - grid_start, len(grid))
+    rolling = {
+        window: _window_ratio(cumulative_done, cumulative_eligible, ends, window)
+        for window in ROLLING_WINDOWS
+    }
+
+    # Rachas dentro del rango: una racha se corta donde la diferencia
+    # entre días consecutivos no es 1.
+    range_mask = (days >= start_day) & (days <= end_day)
+    range_completions = days[range_mask]
+    current_run = longest_run = 0
+    if len(range_completions):
+        breaks = np.flatnonzero(np.diff(range_completions) != 1)
+        run_starts = np.concatenate(([0], breaks + 1))
+        run_ends = np.concatenate((breaks, [len(range_completions) - 1]))
+        run_lengths = run_ends - run_starts + 1
+        longest_run = int(run_lengths.max())
+        if range_completions[-1] >= end_day - 1:
+            current_run = int(run_lengths[-1])
+
+    # Totales semanales de `value` (semanas de lunes a domingo), solo
+    # para los hábitos en los que el valor tiene sentido.
+    weekly_totals = None
+    if habit.habit_type in (HabitType.FREQUENCY, HabitType.TIMER):
+        week_origin = start_day - int(_weekday(start_day))
+        week_count = (end_day - week_origin) // 7 + 1
+        week_index = (range_completions - week_origin) // 7
+        totals = np.bincount(week_index, weights=np.nan_to_num(
+            values[range_mask]), minlength=week_count)
+        weekly_totals = [
+            WeeklyTotal(week_start=_to_date(week_origin + 7 * index), total=total)
+            for index, total in enumerate(totals.astype(np.int64).tolist())
+        ]
+
+    eligible_days = int(range_eligible.sum())
+    completed_days = int(range_done.sum())
+
+    return HabitAnalytics(
+        habit_id=habit.id,
+        start_date=start_date,
+        end_date=end_date,
+        completed_days=completed_days,
+        completion_rate=round(completed_days / eligible_days,
+                              4) if eligible_days else 0.0,
+        weekday_completion_rate=_round(weekday_rate),
+        adherence_7=_round(rolling[7]),
+        adherence_30=_round(rolling[30]),
+        current_run=current_run,
+        longest_run=longest_run,
+        weekly_totals=weekly_totals
+    )
+
+
+async def load_completion_arrays(session: AsyncSession, habit_ids: list[int], start_date: date, end_date: date) -> dict[int, tuple[np.ndarray, np.ndarray]]:
+    """
+    Lee en una sola consulta (solo columnas) las completitudes de varios
+    hábitos, incluido el margen previo que necesitan las ventanas móviles,
+    y las reparte en arrays por hábito.
+    """
+    arrays = {habit_id: (_EMPTY_DAYS, _EMPTY_VALUES) for habit_id in habit_ids}
+    if not habit_ids:
+        return arrays
+
+    statement = select(
+        HabitCompletion.habit_id, HabitCompletion.completion_date, HabitCompletion.value
+    ).where(
+        HabitCompletion.habit_id.in_(habit_ids),
+        HabitCompletion.completion_date >= start_date -
+        timedelta(days=max(ROLLING_WINDOWS) - 1),
+        HabitCompletion.completion_date <= end_date
+    ).order_by(HabitCompletion.habit_id, HabitCompletion.completion_date)
+    rows = (await session.exec(statement)).all()
+    if not rows:
+        return arrays
+
+    habit_column, date_column, value_column = zip(*rows)
+    habit_array = np.fromiter(habit_column, dtype=np.int64, count=len(rows))
+    days = to_day_numbers(date_column)
+    # `None` se convierte en NaN.
+    values = np.array(value_column, dtype=np.float64)
+
+    ids, first_rows = np.unique(habit_array, return_index=True)
+    bounds = np.append(first_rows, len(rows))
+    for index, habit_id in enumerate(ids.tolist()):
+        arrays[habit_id] = (days[bounds[index]:bounds[index + 1]],
+                            values[bounds[index]:bounds[index + 1]])
+
+    return arrays
+
+
+async def get_habits_analytics(session: AsyncSession, habits: list[Habit], start_date: date, end_date: date) -> list[HabitAnalytics]:
+    arrays = await load_completion_arrays(session, [habit.id for habit in habits], start_date, end_date)
+    return [
+        compute_habit_analytics(habit, *arrays[habit.id], start_date, end_date)
+        for habit in habits
+    ]
@@ -0,0 +1,273 @@
+from dataclasses import dataclass, field
+from datetime import date
+from fastapi import status
+from sqlalchemy import bindparam
+from sqlmodel import delete, func, select, tuple_, update
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from bitmap_services import register_bitmap_days
+from database import dialect_insert
+from models.habit_models import Habit, HabitCompletion, HabitCompletionBitmap
+from models.sync_models import ChangeOperation
+from rollup_services import register_rollup_deltas
+from schemas.habit_schemas import BatchOperationType, HabitBatchOperation, HabitBatchResult
+from stats_services import lock_snapshots, recompute_habit_stats, register_completion_upserted, register_completions_added
+from sync_services import completion_changes, record_changes
+
+
+@dataclass
+class _CompletionState:
+    """
+    Estado de un (hábito, fecha) mientras se simula el lote en memoria.
+    `completion_id` es la fila que existía al empezar; `recreated` indica
+    que se borró dentro del lote (su valor final ya no es un incremento
+    sobre el original) y `delta` acumula los `track` sobre la fila original.
+    `original_value` es el valor de esa fila, para los agregados por periodo.
+    """
+    completion_id: int | None = None
+    exists: bool = False
+    value: int | None = None
+    original_value: int | None = None
+    recreated: bool = False
+    delta: int = 0
+
+
+@dataclass
+class _HabitChanges:
+    inserted: list[date] = field(default_factory=list)
+    upserted: list[date] = field(default_factory=list)
+    removed: list[date] = field(default_factory=list)
+    # Filas que ya existían y solo cambian de valor.
+    updated: list[date] = field(default_factory=list)
+    # (fecha, Δcompletitudes, Δvalue) para `register_rollup_deltas`.
+    rollup_deltas: list[tuple[date, int, int]] = field(default_factory=list)
+
+
+async def _load_owned_habits(session: AsyncSession, user_id: int, habit_ids: set[int]) -> tuple[dict[int, Habit], set[int]]:
+    """
+    Comprueba la propiedad de todos los hábitos del lote con una sola
+    consulta `IN`. Devuelve los hábitos del usuario y los IDs que existen
+    pero son de otro.
+    """
+    habits = (await session.exec(select(Habit).where(Habit.id.in_(habit_ids)))).all()
+    owned = {habit.id: habit for habit in habits if habit.user_id == user_id}
+    foreign = {habit.id for habit in habits if habit.user_id != user_id}
+    return owned, foreign
+
+
+async def _load_states(session: AsyncSession, keys: set[tuple[int, date]]) -> dict[tuple[int, date], _CompletionState]:
+    states = {key: _CompletionState() for key in keys}
+    if not keys:
+        return states
+
+    statement = select(HabitCompletion.id, HabitCompletion.habit_id,
+                       HabitCompletion.completion_date, HabitCompletion.value).where(
+        tuple_(HabitCompletion.habit_id, HabitCompletion.completion_date).in_(list(keys)))
+    for completion_id, habit_id, completion_date, value in await session.exec(statement):
+        states[(habit_id, completion_date)] = _CompletionState(
+            completion_id=completion_id, exists=True, value=value, original_value=value)
+    return states
+
+
+def _apply(operation: HabitBatchOperation, state: _CompletionState) -> tuple[int, str | None]:
+    """
+    Aplica una operación al estado simulado y devuelve el código y el
+    mensaje que habría dado el endpoint individual.
+    """
+    if operation.op == BatchOperationType.COMPLETE:
+        if state.exists:
+            return status.HTTP_409_CONFLICT, "El hábito ya fue marcado como completado para esta fecha."
+        state.exists, state.value = True, None
+        return status.HTTP_200_OK, None
+
+    if operation.op == BatchOperationType.UNCOMPLETE:
+        if not state.exists:
+            return status.HTTP_404_NOT_FOUND, "No se encontró un registro de completitud para esta fecha."
+        state.exists, state.value, state.delta = False, None, 0
+        state.recreated = state.completion_id is not None
+        return status.HTTP_204_NO_CONTENT, None
+
+    if operation.value is None:
+        return status.HTTP_400_BAD_REQUEST, "`value` es obligatorio en las operaciones track."
+    if not state.exists:
+        state.exists, state.value = True, 0
+    state.value = (state.value or 0) + operation.value
+    if not state.recreated:
+        state.delta += operation.value
+    return status.HTTP_200_OK, None
+
+
+async def _write_changes(session: AsyncSession, states: dict[tuple[int, date], _CompletionState]) -> dict[int, _HabitChanges]:
+    """
+    Escribe el efecto neto del lote con una sentencia por tipo de cambio
+    (executemany), sea cual sea el número de hábitos y fechas.
+    """
+    changes: dict[int, _HabitChanges] = {}
+    inserts, upserts, deleted_ids, replaced, increments = [], [], [], [], []
+
+    for (habit_id, completion_date), state in states.items():
+        habit_changes = changes.setdefault(habit_id, _HabitChanges())
+        if state.completion_id is None:
+            if not state.exists:
+                continue
+            row = {"habit_id": habit_id, "completion_date": completion_date, "value": state.value}
+            if state.value is None:
+                inserts.append(row)
+            else:
+                upserts.append(row)
+                habit_changes.upserted.append(completion_date)
+                # La fila no existía al cargar el lote, así que se cuenta como nueva.
+                habit_changes.rollup_deltas.append((completion_date, 1, state.value))
+        elif not state.exists:
+            deleted_ids.append(state.completion_id)
+            habit_changes.removed.append(completion_date)
+            habit_changes.rollup_deltas.append((completion_date, -1, -(state.original_value or 0)))
+        elif state.recreated:
+            replaced.append({"completion_id": state.completion_id, "new_value": state.value})
+            habit_changes.updated.append(completion_date)
+            habit_changes.rollup_deltas.append(
+                (completion_date, 0, (state.value or 0) - (state.original_value or 0)))
+        elif state.delta:
+            increments.append({"completion_id": state.completion_id, "delta": state.delta})
+            habit_changes.updated.append(completion_date)
+            habit_changes.rollup_deltas.append((completion_date, 0, state.delta))
+
+    insert = dialect_insert(session)
+    if inserts:
+        statement = insert(HabitCompletion).on_conflict_do_nothing(
+            index_elements=["habit_id", "completion_date"]
+        ).returning(HabitCompletion.habit_id, HabitCompletion.completion_date)
+        for habit_id, completion_date in await session.exec(statement, params=inserts):
+            changes[habit_id].inserted.append(completion_date)
+            changes[habit_id].rollup_deltas.append((completion_date, 1, 0))
+
+    if upserts:
+        statement = insert(HabitCompletion)
+        statement = statement.on_conflict_do_update(
+            index_elements=["habit_id", "completion_date"],
+            set_={"value": func.coalesce(HabitCompletion.value, 0) + statement.excluded.value}
+        )
+        await session.exec(statement, params=upserts)
+
+    if deleted_ids:
+        await session.exec(delete(HabitCompletion).where(HabitCompletion.id.in_(deleted_ids)))
+
+    # UPDATE de Core por ID para poder usar executemany con expresiones
+    # (el incremento se hace en la base de datos, como en `/track`).
+    table = HabitCompletion.__table__
+    if replaced:
+        await session.exec(
+            update(table).where(table.c.id == bindparam("completion_id"))
+            .values(value=bindparam("new_value")),
+            params=replaced)
+    if increments:
+        await session.exec(
+            update(table).where(table.c.id == bindparam("completion_id"))
+            .values(value=func.coalesce(table.c.value, 0) + bindparam("delta")),
+            params=increments)
+
+    return changes
+
+
+async def _refresh_projections(session: AsyncSession, habits: dict[int, Habit], changes: dict[int, _HabitChanges]) -> None:
+    """
+    Actualiza estadísticas y bitmaps de los hábitos que cambiaron. Antes
+    carga sus proyecciones con una consulta `IN` por tabla (las de
+    estadísticas, bloqueadas con FOR UPDATE): las estadísticas quedan en
+    la sesión y los bitmaps se pasan a `register_bitmap_days` por hábito.
+    """
+    changes = {habit_id: habit_changes for habit_id, habit_changes in changes.items()
+               if habit_changes.inserted or habit_changes.upserted or habit_changes.removed}
+    if not changes:
+        return
+
+    years = {completion_date.year for habit_changes in changes.values()
+             for completion_date in habit_changes.inserted + habit_changes.upserted + habit_changes.removed}
+    snapshots = await lock_snapshots(session, changes)
+    bitmaps = (await session.exec(select(HabitCompletionBitmap).where(
+        HabitCompletionBitmap.habit_id.in_(changes), HabitCompletionBitmap.year.in_(years)))).all()
+
+    snapshots_by_habit = {snapshot.habit_id: snapshot for snapshot in snapshots}
+    bitmaps_by_habit: dict[int, dict[int, HabitCompletionBitmap]] = {
+        habit_id: {} for habit_id in changes}
+    for bitmap in bitmaps:
+        bitmaps_by_habit[bitmap.habit_id][bitmap.year] = bitmap
+
+    for habit_id, habit_changes in changes.items():
+        habit = habits[habit_id]
+        added = sorted(habit_changes.inserted + habit_changes.upserted)
+        snapshot = snapshots_by_habit.get(habit_id)
+        last_completion_date = snapshot.last_completion_date if snapshot else None
+
+        # Un único recálculo si hay borrados o fechas anteriores a la última
+        # completitud; si todas son posteriores, se añaden en O(1) y en orden.
+        if habit_changes.removed or snapshot is None or (
+                last_completion_date is not None and added and added[0] <= last_completion_date):
+            await recompute_habit_stats(session, habit_id)
+        else:
+            upserted = set(habit_changes.upserted)
+            for completion_date in added:
+                if completion_date in upserted:
+                    await register_completion_upserted(session, habit_id, completion_date)
+                else:
+                    await register_completions_added(session, habit_id, [completion_date])
+
+        if added:
+            await register_bitmap_days(session, habit, added, bitmaps=bitmaps_by_habit[habit_id])
+        if habit_changes.removed:
+            await register_bitmap_days(session, habit, habit_changes.removed, completed=False,
+                                       bitmaps=bitmaps_by_habit[habit_id])
+
+
+async def apply_habit_batch(session: AsyncSession, user_id: int, operations: list[HabitBatchOperation]) -> list[HabitBatchResult]:
+    """
+    Aplica un lote de operaciones complete/uncomplete/track sobre varios
+    hábitos del usuario en una sola transacción: una consulta para la
+    propiedad, otra para las filas afectadas, la simulación en memoria en
+    el orden del lote y después unas pocas sentencias masivas con el
+    efecto neto. Las operaciones que fallan no impiden aplicar las demás.
+    No hace commit: el llamador lo ejecuta como unidad de escritura.
+    """
+    today = date.today()
+    habits, foreign = await _load_owned_habits(
+        session, user_id, {operation.habit_id for operation in operations})
+
+    keys = {(operation.habit_id, operation.completion_date or today)
+            for operation in operations if operation.habit_id in habits}
+    states = await _load_states(session, keys)
+
+    results = []
+    for index, operation in enumerate(operations):
+        completion_date = operation.completion_date or today
+        result = HabitBatchResult(index=index, op=operation.op,
+                                  habit_id=operation.habit_id, completion_date=completion_date,
+                                  status_code=status.HTTP_200_OK)
+        if operation.habit_id in foreign:
+            result.status_code, result.detail = status.HTTP_403_FORBIDDEN, "No tienes permiso para esta acción"
+        elif operation.habit_id not in habits:
+            result.status_code, result.detail = status.HTTP_404_NOT_FOUND, "Hábito no encontrado"
+        else:
+            state = states[(operation.habit_id, completion_date)]
+            result.status_code, result.detail = _apply(operation, state)
+            if result.status_code == status.HTTP_200_OK:
+                result.value = state.value
+        results.append(result)
+
+    if not any(result.status_code < 300 for result in results):
+        return results
+
+    changes = await _write_changes(session, states)
+    await _refresh_projections(session, habits, changes)
+    await register_rollup_deltas(session, [
+        (habit_id, *delta)
+        for habit_id, habit_changes in changes.items()
+        for delta in habit_changes.rollup_deltas
+    ])
+    await record_changes(session, user_id, [
+        change
+        for habit_id, habit_changes in changes.items()
+        for change in completion_changes(
+            habit_id, habit_changes.inserted + habit_changes.upserted + habit_changes.updated)
+        + completion_changes(habit_id, habit_changes.removed, ChangeOperation.DELETE)
+    ])
+    return results
@@ -0,0 +1,5 @@
+import os
+
+# Los benchmarks siembran y borran datos: salvo que se indique otra base de
+# datos, trabajan sobre una SQLite propia y no sobre la del `.env`.
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite:///benchmark.db")
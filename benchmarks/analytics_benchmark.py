@@ -0,0 +1,145 @@
+"""
+Compara `compute_habit_analytics` (NumPy) con una implementación de
+referencia en Python puro, al estilo de los bucles de `compute_streaks`.
+
+Uso, desde la raíz del proyecto:
+    python -m benchmarks.analytics_benchmark --years 10 --repeat 20
+"""
+import argparse
+import random
+import timeit
+from datetime import date, datetime, time, timedelta, timezone
+
+import numpy as np
+
+from analytics_services import ROLLING_WINDOWS, compute_habit_analytics, to_day_numbers
+from models.habit_models import Habit, HabitType
+
+
+def reference_analytics(habit: Habit, completions: dict[date, int | None], start_date: date, end_date: date) -> dict:
+    """
+    Las mismas métricas que `compute_habit_analytics`, día a día.
+    """
+    created_date = habit.created_at.date()
+    range_days = [start_date + timedelta(days=offset)
+                  for offset in range((end_date - start_date).days + 1)]
+
+    completed_by_weekday = [0] * 7
+    eligible_by_weekday = [0] * 7
+    for day in range_days:
+        if day >= created_date or day in completions:
+            eligible_by_weekday[day.weekday()] += 1
+        if day in completions:
+            completed_by_weekday[day.weekday()] += 1
+
+    adherence = {}
+    for window in ROLLING_WINDOWS:
+        series = []
+        for day in range_days:
+            done = eligible = 0
+            for back in range(window):
+                previous_day = day - timedelta(days=back)
+                if previous_day >= created_date or previous_day in completions:
+                    eligible += 1
+                if previous_day in completions:
+                    done += 1
+            series.append(round(done / eligible, 4) if eligible else 0.0)
+        adherence[window] = series
+
+    longest_run = run = 0
+    previous_day = None
+    for day in range_days:
+        if day in completions:
+            run = run + 1 if previous_day == day - timedelta(days=1) else 1
+            previous_day = day
+            longest_run = max(longest_run, run)
+    current_run = run if previous_day is not None and previous_day >= end_date - \
+        timedelta(days=1) else 0
+
+    week_origin = start_date - timedelta(days=start_date.weekday())
+    weekly_totals = {}
+    day = week_origin
+    while day <= end_date:
+        weekly_totals[day] = 0
+        day += timedelta(days=7)
+    for day in range_days:
+        if day in completions:
+            week_start = day - timedelta(days=day.weekday())
+            weekly_totals[week_start] += completions[day] or 0
+
+    return {
+        "weekday_completion_rate": [
+            round(completed / eligible, 4) if eligible else 0.0
+            for completed, eligible in zip(completed_by_weekday, eligible_by_weekday)
+        ],
+        "adherence_7": adherence[7],
+        "adherence_30": adherence[30],
+        "current_run": current_run,
+        "longest_run": longest_run,
+        "weekly_totals": list(weekly_totals.values()),
+    }
+
+
+def build_history(years: int, density: float, seed: int) -> tuple[Habit, dict[date, int | None]]:
+    rng = random.Random(seed)
+    end_date = date.today()
+    start_date = end_date - timedelta(days=365 * years)
+    # Creado a mitad del historial: la primera mitad son completitudes
+    # importadas, anteriores a la creación.
+    created_date = start_date + (end_date - start_date) / 2
+    habit = Habit(id=1, user_id=1, name="benchmark", habit_type=HabitType.TIMER,
+                  created_at=datetime.combine(created_date, time.min, tzinfo=timezone.utc))
+
+    completions = {}
+    day = start_date
+    while day <= end_date:
+        if rng.random() < density:
+            completions[day] = rng.randint(5, 60)
+        day += timedelta(days=1)
+    return habit, completions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--years", type=int, default=5)
+    parser.add_argument("--density", type=float, default=0.7)
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    habit, completions = build_history(args.years, args.density, args.seed)
+    start_date = date.today() - timedelta(days=365 * args.years)
+    end_date = date.today()
+
+    ordered_dates = sorted(completions)
+    days = to_day_numbers(ordered_dates)
+    values = np.array([completions[day]
+                      for day in ordered_dates], dtype=np.float64)
+
+    vectorized = compute_habit_analytics(
+        habit, days, values, start_date, end_date)
+    reference = reference_analytics(habit, completions, start_date, end_date)
+
+    assert vectorized.weekday_completion_rate == reference["weekday_completion_rate"]
+    assert vectorized.adherence_7 == reference["adherence_7"]
+    assert vectorized.adherence_30 == reference["adherence_30"]
+    assert vectorized.current_run == reference["current_run"]
+    assert vectorized.longest_run == reference["longest_run"]
+    assert [week.total for week in vectorized.weekly_totals] == reference["weekly_totals"]
+
+    numpy_seconds = min(timeit.repeat(
+        lambda: compute_habit_analytics(
+            habit, days, values, start_date, end_date),
+        number=1, repeat=args.repeat))
+    python_seconds = min(timeit.repeat(
+        lambda: reference_analytics(habit, completions, start_date, end_date),
+        number=1, repeat=args.repeat))
+
+    print(f"{len(completions)} completitudes en {args.years} años")
+    print(f"NumPy:  {numpy_seconds * 1000:8.2f} ms")
+    print(f"Python: {python_seconds * 1000:8.2f} ms")
+    print(f"Aceleración: x{python_seconds / numpy_seconds:.1f}")
+
+
+if __name__ == "__main__":
+    main()
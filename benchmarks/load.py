@@ -0,0 +1,402 @@
+"""
+Prueba de carga reproducible de todos los endpoints: siembra datos
+sintéticos (o reutiliza los de una ejecución anterior), lanza peticiones
+con la concurrencia indicada y mide latencias p50/p95/p99, rendimiento y
+sentencias SQL por petición de cada endpoint.
+
+Por defecto ejecuta la app en el propio proceso (transporte ASGI, sin red)
+y cuenta las sentencias SQL. Con `--base-url` ataca un servidor ya
+arrancado, que debe usar la misma `DATABASE_URL` y `SECRET_KEY` para que
+los tokens y los datos sembrados sean válidos; en ese modo no se cuentan
+sentencias.
+
+Uso, desde la raíz del proyecto:
+    python -m benchmarks.load --reset --users 20 --requests 200 --save baseline.json
+    python -m benchmarks.load --requests 200 --compare baseline.json
+    DATABASE_URL=... python -m benchmarks.load --base-url http://localhost:8000
+"""
+import argparse
+import asyncio
+import contextvars
+import itertools
+import json
+import math
+import random
+import time
+from collections import Counter
+from dataclasses import dataclass, field, replace
+from datetime import date, datetime, timedelta, timezone
+from typing import Callable
+
+import httpx
+from sqlalchemy import event
+
+from database import engine
+from utils.pagination_utils import encode_cursor
+from benchmarks.seed import SeededUser, load_seeded_users, reset_database, seed_database
+
+
+PERCENTILES = (50, 95, 99)
+
+# Contador de sentencias SQL de la petición en curso. Cada petición del
+# modo en proceso se ejecuta en la tarea del worker que la lanza, así que
+# el listener del engine ve el contador de esa petición.
+_statements: contextvars.ContextVar[list[int] | None] = contextvars.ContextVar(
+    "benchmark_statements", default=None)
+
+
+def _count_statement(*_) -> None:
+    counter = _statements.get()
+    if counter is not None:
+        counter[0] += 1
+
+
+@dataclass
+class Scenario:
+    name: str
+    method: str
+    # Recibe el usuario y el generador aleatorio; devuelve la ruta y los
+    # argumentos de `httpx.AsyncClient.request`.
+    build: Callable[[SeededUser, random.Random], tuple[str, dict]]
+    # Envía el último ETag del usuario en `If-None-Match` (camino del 304).
+    conditional: bool = False
+    tracked_only: bool = False
+    # Antes de medir crea un hábito vacío por usuario y deja solo ese en
+    # `habit_ids`, para que las escrituras no choquen con el historial.
+    fresh_habit: bool = False
+
+
+@dataclass
+class EndpointResult:
+    name: str
+    latencies: list[float] = field(default_factory=list)
+    statements: list[int] = field(default_factory=list)
+    status_codes: Counter = field(default_factory=Counter)
+    errors: int = 0
+    elapsed: float = 0.0
+
+    def summary(self) -> dict:
+        ordered = sorted(self.latencies)
+        result = {
+            "requests": len(ordered),
+            "errors": self.errors,
+            "status_codes": {str(code): count for code, count in sorted(self.status_codes.items())},
+            "throughput_rps": round(len(ordered) / self.elapsed, 1) if self.elapsed else 0.0,
+            "mean_ms": round(sum(ordered) / len(ordered) * 1000, 2) if ordered else None,
+        }
+        for percentile in PERCENTILES:
+            result[f"p{percentile}_ms"] = round(_percentile(ordered, percentile) * 1000, 2) if ordered else None
+        result["statements_per_request"] = (
+            round(sum(self.statements) / len(self.statements), 2) if self.statements else None)
+        return result
+
+
+def _percentile(ordered: list[float], percentile: int) -> float:
+    """
+    Percentil por rango más cercano sobre una lista ya ordenada.
+    """
+    rank = max(1, math.ceil(percentile / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+# Cursor desde el principio del registro de cambios: el seeder no anota
+# cambios, así que mide el coste de una página (casi) vacía.
+_SYNC_CURSOR = encode_cursor(0, 0)
+
+
+def _recent_day(rng: random.Random, days: int = 365) -> date:
+    return date.today() - timedelta(days=rng.randrange(days))
+
+
+# Fechas que no se repiten en toda la ejecución: con `fresh_habit`, cada
+# `complete` inserta una fila nueva en lugar de devolver 409.
+_unused_days = itertools.count(1)
+
+
+def _unused_day() -> date:
+    return date.today() - timedelta(days=next(_unused_days))
+
+
+def _habit(user: SeededUser, rng: random.Random) -> int:
+    return rng.choice(user.habit_ids)
+
+
+def _batch_body(user: SeededUser, rng: random.Random) -> dict:
+    operations = []
+    for _ in range(20):
+        op = rng.choice(("complete", "uncomplete", "track"))
+        operation = {"op": op, "habit_id": _habit(user, rng), "completion_date": _recent_day(rng, 7).isoformat()}
+        if op == "track":
+            operation["value"] = rng.randint(1, 30)
+        operations.append(operation)
+    return {"operations": operations}
+
+
+def _import_body(rng: random.Random) -> bytes:
+    lines = [json.dumps({"completion_date": _recent_day(rng).isoformat()}) for _ in range(50)]
+    return ("\n".join(lines) + "\n").encode()
+
+
+# Orden de ejecución: primero las lecturas, luego las escrituras (que
+# cambian los datos que leen las demás) y al final la exportación completa.
+SCENARIOS = [
+    Scenario("GET /users/", "GET", lambda user, rng: ("/users/", {})),
+    Scenario("GET /habits/", "GET", lambda user, rng: ("/habits/", {})),
+    Scenario("GET /habits/ (msgpack)", "GET",
+             lambda user, rng: ("/habits/", {"headers": {"Accept": "application/msgpack"}})),
+    Scenario("GET /habits/ (304)", "GET", lambda user, rng: ("/habits/", {}), conditional=True),
+    Scenario("GET /habits/dashboard", "GET", lambda user, rng: ("/habits/dashboard", {})),
+    Scenario("GET /habits/analytics", "GET", lambda user, rng: ("/habits/analytics", {})),
+    Scenario("GET /habits/{id}", "GET", lambda user, rng: (f"/habits/{_habit(user, rng)}", {})),
+    Scenario("GET /habits/{id}/completions", "GET",
+             lambda user, rng: (f"/habits/{_habit(user, rng)}/completions", {})),
+    Scenario("GET /habits/{id}/stats", "GET",
+             lambda user, rng: (f"/habits/{_habit(user, rng)}/stats", {})),
+    Scenario("GET /habits/{id}/analytics", "GET",
+             lambda user, rng: (f"/habits/{_habit(user, rng)}/analytics", {})),
+    Scenario("GET /habits/{id}/heatmap", "GET",
+             lambda user, rng: (f"/habits/{_habit(user, rng)}/heatmap", {})),
+    Scenario("GET /habits/{id}/periods", "GET",
+             lambda user, rng: (f"/habits/{_habit(user, rng)}/periods", {"params": {"period": rng.choice(("week", "month"))}})),
+    Scenario("GET /sync", "GET", lambda user, rng: ("/sync", {"params": {"since": _SYNC_CURSOR}})),
+    Scenario("POST /habits/", "POST",
+             lambda user, rng: ("/habits/", {"json": {"name": f"Carga {rng.randrange(10**6)}"}})),
+    Scenario("PATCH /users/", "PATCH",
+             lambda user, rng: ("/users/", {"json": {"full_name": f"Usuario {rng.randrange(10**6)}"}})),
+    Scenario("PATCH /habits/{id}", "PATCH",
+             lambda user, rng: (f"/habits/{_habit(user, rng)}", {"json": {"description": f"v{rng.randrange(10**6)}"}})),
+    Scenario("POST /habits/{id}/complete", "POST",
+             lambda user, rng: (f"/habits/{_habit(user, rng)}/complete",
+                                {"json": {"completion_date": _unused_day().isoformat()}}),
+             fresh_habit=True),
+    Scenario("DELETE /habits/{id}/complete", "DELETE",
+             lambda user, rng: (f"/habits/{_habit(user, rng)}/complete",
+                                {"params": {"completion_date": _recent_day(rng).isoformat()}})),
+    Scenario("POST /habits/{id}/track", "POST",
+             lambda user, rng: (f"/habits/{rng.choice(user.tracked_habit_ids)}/track",
+                                {"json": {"value": rng.randint(1, 30)}}),
+             tracked_only=True),
+    Scenario("POST /habits/{id}/completions/bulk", "POST",
+             lambda user, rng: (f"/habits/{_habit(user, rng)}/completions/bulk",
+                                {"json": {"dates": [_recent_day(rng).isoformat() for _ in range(10)]}})),
+    Scenario("POST /habits/batch", "POST",
+             lambda user, rng: ("/habits/batch", {"json": _batch_body(user, rng)})),
+    Scenario("POST /habits/{id}/completions/import", "POST",
+             lambda user, rng: (f"/habits/{_habit(user, rng)}/completions/import",
+                                {"content": _import_body(rng), "headers": {"Content-Type": "application/x-ndjson"}})),
+    Scenario("GET /users/export", "GET", lambda user, rng: ("/users/export", {})),
+    Scenario("GET /users/export (gzip)", "GET",
+             lambda user, rng: ("/users/export", {"params": {"gzip": "true"}})),
+]
+
+
+async def _fetch_etags(client: httpx.AsyncClient, users: list[SeededUser]) -> dict[int, str]:
+    etags = {}
+    for user in users:
+        response = await client.get("/habits/", headers={"Authorization": f"Bearer {user.access_token}"})
+        etags[user.user_id] = response.headers.get("etag", "")
+    return etags
+
+
+async def _create_habit(client: httpx.AsyncClient, user: SeededUser, name: str) -> int:
+    response = await client.post("/habits/", json={"name": f"Carga {name}"},
+                                 headers={"Authorization": f"Bearer {user.access_token}"})
+    response.raise_for_status()
+    return response.json()["id"]
+
+
+async def run_scenario(
+    client: httpx.AsyncClient,
+    scenario: Scenario,
+    users: list[SeededUser],
+    requests: int,
+    concurrency: int,
+    seed: int,
+    count_statements: bool
+) -> EndpointResult:
+    """
+    Lanza `requests` peticiones del escenario repartidas entre
+    `concurrency` workers y recoge latencias, códigos y sentencias SQL.
+    """
+    rng = random.Random(f"{seed}-{scenario.name}")
+    candidates = [user for user in users if user.tracked_habit_ids] if scenario.tracked_only else users
+    result = EndpointResult(scenario.name)
+    if not candidates:
+        return result
+
+    if scenario.fresh_habit:
+        candidates = [replace(user, habit_ids=[await _create_habit(client, user, scenario.name)])
+                      for user in candidates]
+    etags = await _fetch_etags(client, candidates) if scenario.conditional else {}
+    queue: asyncio.Queue = asyncio.Queue()
+    for _ in range(requests):
+        user = rng.choice(candidates)
+        path, kwargs = scenario.build(user, rng)
+        headers = {"Authorization": f"Bearer {user.access_token}", **kwargs.pop("headers", {})}
+        if scenario.conditional:
+            headers["If-None-Match"] = etags[user.user_id]
+        queue.put_nowait((path, headers, kwargs))
+
+    async def worker() -> None:
+        while not queue.empty():
+            path, headers, kwargs = queue.get_nowait()
+            counter = [0]
+            if count_statements:
+                _statements.set(counter)
+            started = time.perf_counter()
+            try:
+                response = await client.request(scenario.method, path, headers=headers, **kwargs)
+            except httpx.HTTPError:
+                result.errors += 1
+                continue
+            result.latencies.append(time.perf_counter() - started)
+            result.status_codes[response.status_code] += 1
+            if response.status_code >= 500:
+                result.errors += 1
+            if count_statements:
+                result.statements.append(counter[0])
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    result.elapsed = time.perf_counter() - started
+    return result
+
+
+async def run_load(
+    client: httpx.AsyncClient,
+    users: list[SeededUser],
+    requests: int,
+    concurrency: int,
+    seed: int,
+    count_statements: bool,
+    only: str | None = None
+) -> dict[str, dict]:
+    results = {}
+    for scenario in SCENARIOS:
+        if only and only not in scenario.name:
+            continue
+        result = await run_scenario(client, scenario, users, requests, concurrency, seed, count_statements)
+        results[scenario.name] = result.summary()
+        print(_format_row(scenario.name, results[scenario.name]))
+    return results
+
+
+def _format_row(name: str, summary: dict) -> str:
+    statements = summary["statements_per_request"]
+    codes = ",".join(f"{code}x{count}" for code, count in summary["status_codes"].items())
+    return (f"{name:40} {summary['requests']:>6} {summary['errors']:>4} "
+            f"{_ms(summary['p50_ms'])} {_ms(summary['p95_ms'])} {_ms(summary['p99_ms'])} "
+            f"{summary['throughput_rps']:>9.1f} {statements if statements is not None else '-':>6}  {codes}")
+
+
+def _ms(value: float | None) -> str:
+    return f"{value:>8.2f}" if value is not None else f"{'-':>8}"
+
+
+def _header() -> str:
+    return (f"{'endpoint':40} {'reqs':>6} {'err':>4} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+            f"{'req/s':>9} {'sql':>6}  códigos")
+
+
+def compare_with_baseline(results: dict[str, dict], baseline: dict) -> None:
+    """
+    Imprime la variación de cada métrica respecto a una línea base guardada
+    con `--save`. Las latencias y las sentencias son mejores si bajan; el
+    rendimiento, si sube.
+    """
+    previous = baseline["endpoints"]
+    print(f"\nComparación con la línea base del {baseline['meta']['created_at']}")
+    print(f"{'endpoint':40} {'p50':>9} {'p95':>9} {'p99':>9} {'req/s':>9} {'sql':>9}")
+    for name, summary in results.items():
+        if name not in previous:
+            print(f"{name:40} (sin línea base)")
+            continue
+        deltas = [
+            _delta(previous[name].get(metric), summary.get(metric))
+            for metric in ("p50_ms", "p95_ms", "p99_ms", "throughput_rps", "statements_per_request")
+        ]
+        print(f"{name:40} " + " ".join(f"{delta:>9}" for delta in deltas))
+
+
+def _delta(before: float | None, after: float | None) -> str:
+    if before is None or after is None:
+        return "-"
+    if before == 0:
+        return "=" if after == 0 else "+inf"
+    return f"{(after - before) / before * 100:+.1f}%"
+
+
+async def _prepare_users(args: argparse.Namespace) -> list[SeededUser]:
+    if args.reset:
+        await reset_database()
+    users = [] if args.reset else await load_seeded_users(args.users)
+    if not users:
+        print(f"Sembrando {args.users} usuarios con {args.habits} hábitos y {args.years} años de historial...")
+        users = await seed_database(args.users, args.habits, args.years, args.seed)
+    return users
+
+
+async def _main(args: argparse.Namespace) -> None:
+    users = await _prepare_users(args)
+    print(f"{len(users)} usuarios, {args.requests} peticiones por endpoint, concurrencia {args.concurrency}\n")
+    print(_header())
+
+    if args.base_url:
+        await engine.dispose()
+        async with httpx.AsyncClient(base_url=args.base_url, timeout=60) as client:
+            results = await run_load(client, users, args.requests, args.concurrency,
+                                     args.seed, count_statements=False, only=args.only)
+    else:
+        from main import app
+
+        event.listen(engine.sync_engine, "before_cursor_execute", _count_statement)
+        async with app.router.lifespan_context(app):
+            # Los fallos de la app cuentan como 500 en vez de abortar la carga.
+            transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+            async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=60) as client:
+                results = await run_load(client, users, args.requests, args.concurrency,
+                                         args.seed, count_statements=True, only=args.only)
+        event.remove(engine.sync_engine, "before_cursor_execute", _count_statement)
+    await engine.dispose()
+
+    report = {
+        "meta": {
+            "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "mode": args.base_url or "in-process",
+            "users": len(users),
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "seed": args.seed,
+        },
+        "endpoints": results,
+    }
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            compare_with_baseline(results, json.load(baseline_file))
+    if args.save:
+        with open(args.save, "w") as report_file:
+            json.dump(report, report_file, indent=2, ensure_ascii=False)
+        print(f"\nResultados guardados en {args.save}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--habits", type=int, default=5)
+    parser.add_argument("--years", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--reset", action="store_true",
+                        help="Borra las tablas y siembra datos nuevos.")
+    parser.add_argument("--requests", type=int, default=200,
+                        help="Peticiones por endpoint.")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--base-url",
+                        help="Servidor ya arrancado; si se omite, la app corre en este proceso.")
+    parser.add_argument("--only", help="Solo los endpoints cuyo nombre contenga este texto.")
+    parser.add_argument("--save", help="Guarda los resultados en este JSON (línea base).")
+    parser.add_argument("--compare", help="Compara con una línea base guardada con --save.")
+    asyncio.run(_main(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+"""
+Genera una base de datos sintética para benchmarks: usuarios, hábitos de
+todos los tipos e historiales de completitudes con rachas y huecos
+realistas. Usa la base de datos de `DATABASE_URL`.
+
+Uso, desde la raíz del proyecto:
+    DATABASE_URL=sqlite+aiosqlite:///benchmark.db \\
+        python -m benchmarks.seed --users 50 --habits 5 --years 3 --reset
+"""
+import argparse
+import asyncio
+import random
+import uuid
+from dataclasses import dataclass, field
+from datetime import date, datetime, time, timedelta, timezone
+
+from sqlmodel import SQLModel, func, insert, select
+
+from database import async_session_maker, create_db_and_tables, engine
+from models.habit_models import Habit, HabitCompletion, HabitType
+from models.user_models import User
+from security import create_jwt_tokens
+from stats_services import build_missing_snapshots
+from rollup_services import rebuild_rollups
+
+
+SEED_CHUNK_SIZE = 5000
+
+_HABIT_NAMES = ("Leer", "Meditar", "Correr", "Beber agua",
+                "Estudiar", "Escribir", "Estirar", "Dormir 8 horas")
+
+
+@dataclass
+class SeededUser:
+    user_id: int
+    access_token: str
+    habit_ids: list[int] = field(default_factory=list)
+    # Hábitos de frecuencia o temporizador, los únicos que admiten `/track`.
+    tracked_habit_ids: list[int] = field(default_factory=list)
+
+
+def completion_history(rng: random.Random, start_date: date, end_date: date) -> list[date]:
+    """
+    Historial con rachas y huecos: una cadena de Markov de dos estados
+    (en racha / en pausa) con probabilidades propias de cada hábito y algo
+    menos de constancia los fines de semana.
+    """
+    keep_streak = rng.uniform(0.80, 0.97)
+    resume = rng.uniform(0.15, 0.50)
+    weekend_penalty = rng.uniform(0.0, 0.15)
+
+    dates = []
+    active = rng.random() < 0.5
+    day = start_date
+    while day <= end_date:
+        probability = keep_streak if active else resume
+        if day.weekday() >= 5:
+            probability -= weekend_penalty
+        active = rng.random() < probability
+        if active:
+            dates.append(day)
+        day += timedelta(days=1)
+    return dates
+
+
+def _completion_value(rng: random.Random, habit_type: HabitType) -> int | None:
+    if habit_type == HabitType.TIMER:
+        return rng.randint(5, 90)
+    if habit_type == HabitType.FREQUENCY:
+        return rng.randint(1, 10)
+    return None
+
+
+async def reset_database() -> None:
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.drop_all)
+    await create_db_and_tables()
+
+
+async def seed_database(users: int, habits_per_user: int, years: int, seed: int = 42) -> list[SeededUser]:
+    """
+    Inserta los datos con executemany por bloques (sin objetos ORM para las
+    completitudes), construye las proyecciones de estadísticas y los
+    agregados por periodo y devuelve los usuarios creados con un JWT de
+    acceso cada uno.
+    """
+    rng = random.Random(seed)
+    run_id = uuid.uuid4().hex[:8]
+    end_date = date.today()
+    start_date = end_date - timedelta(days=365 * years)
+    created_at = datetime.combine(start_date, time.min, tzinfo=timezone.utc)
+
+    await create_db_and_tables()
+
+    async with async_session_maker() as session:
+        user_rows = [
+            {
+                "google_id": f"benchmark-{run_id}-{index}",
+                "email": f"benchmark-{run_id}-{index}@example.com",
+                "full_name": f"Usuario de prueba {index}",
+                "timezone": "UTC",
+            }
+            for index in range(users)
+        ]
+        await session.exec(insert(User), params=user_rows)
+        user_ids = (await session.exec(
+            select(User.id).where(User.google_id.startswith(f"benchmark-{run_id}-")).order_by(User.id)
+        )).all()
+
+        habit_rows = []
+        for user_id in user_ids:
+            for index in range(habits_per_user):
+                habit_type = rng.choice(list(HabitType))
+                habit_rows.append({
+                    "user_id": user_id,
+                    "name": f"{rng.choice(_HABIT_NAMES)} {index + 1}",
+                    "habit_type": habit_type,
+                    "frequency_count": rng.randint(2, 8) if habit_type == HabitType.FREQUENCY else None,
+                    "target_minutes": rng.choice((15, 25, 30, 60)) if habit_type == HabitType.TIMER else None,
+                    "created_at": created_at,
+                })
+        await session.exec(insert(Habit), params=habit_rows)
+        habits = (await session.exec(
+            select(Habit.id, Habit.user_id, Habit.habit_type).where(Habit.user_id.in_(user_ids)).order_by(Habit.id)
+        )).all()
+
+        chunk = []
+        for habit_id, _, habit_type in habits:
+            for completion_date in completion_history(rng, start_date, end_date):
+                chunk.append({
+                    "habit_id": habit_id,
+                    "completion_date": completion_date,
+                    "value": _completion_value(rng, habit_type),
+                })
+                if len(chunk) >= SEED_CHUNK_SIZE:
+                    await session.exec(insert(HabitCompletion), params=chunk)
+                    chunk = []
+        if chunk:
+            await session.exec(insert(HabitCompletion), params=chunk)
+
+        await build_missing_snapshots(session, [habit_id for habit_id, _, _ in habits])
+        await rebuild_rollups(session, [habit_id for habit_id, _, _ in habits])
+        await session.commit()
+
+    return _seeded_users(user_ids, habits)
+
+
+async def load_seeded_users(limit: int | None = None) -> list[SeededUser]:
+    """
+    Recupera los usuarios sembrados en una ejecución anterior (los que
+    tienen `google_id` de benchmark) con tokens nuevos, para lanzar la
+    carga sin volver a sembrar.
+    """
+    async with async_session_maker() as session:
+        statement = select(User.id).where(
+            User.google_id.startswith("benchmark-")).order_by(User.id)
+        if limit is not None:
+            statement = statement.limit(limit)
+        user_ids = (await session.exec(statement)).all()
+        habits = (await session.exec(
+            select(Habit.id, Habit.user_id, Habit.habit_type).where(Habit.user_id.in_(user_ids)).order_by(Habit.id)
+        )).all()
+    return _seeded_users(user_ids, habits)
+
+
+def _seeded_users(user_ids, habits) -> list[SeededUser]:
+    by_user = {user_id: SeededUser(user_id=user_id, access_token=create_jwt_tokens(user_id)["access_token"])
+               for user_id in user_ids}
+    for habit_id, user_id, habit_type in habits:
+        by_user[user_id].habit_ids.append(habit_id)
+        if habit_type != HabitType.SIMPLE:
+            by_user[user_id].tracked_habit_ids.append(habit_id)
+    return list(by_user.values())
+
+
+async def _main(args: argparse.Namespace) -> None:
+    if args.reset:
+        await reset_database()
+    seeded = await seed_database(args.users, args.habits, args.years, args.seed)
+    async with async_session_maker() as session:
+        total = (await session.exec(select(func.count(HabitCompletion.id)))).one()
+    print(f"{len(seeded)} usuarios, {sum(len(user.habit_ids) for user in seeded)} hábitos, "
+          f"{total} completitudes en total")
+    await engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--habits", type=int, default=5)
+    parser.add_argument("--years", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--reset", action="store_true",
+                        help="Borra y recrea las tablas antes de sembrar.")
+    asyncio.run(_main(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
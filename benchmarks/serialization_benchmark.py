@@ -0,0 +1,74 @@
+"""
+Mide el coste de serializar listas grandes de completitudes por el camino
+original (validación del `response_model` + `json.dumps`) y por los nuevos
+(filas planas con orjson o MessagePack).
+
+Uso, desde la raíz del proyecto:
+    python -m benchmarks.serialization_benchmark --rows 10000 --repeat 20
+"""
+import argparse
+import json
+import timeit
+from datetime import date, timedelta
+from typing import List
+
+from pydantic import TypeAdapter
+
+from models.habit_models import HabitCompletion
+from schemas.habit_schemas import HabitCompletionRead, HabitStats
+from utils.response_utils import MsgPackResponse, ORJSONResponse
+
+
+def json_render(content) -> bytes:
+    # Igual que `JSONResponse.render` de Starlette.
+    return json.dumps(content, ensure_ascii=False, allow_nan=False,
+                      indent=None, separators=(",", ":")).encode("utf-8")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    first_day = date.today() - timedelta(days=args.rows)
+    completions = [
+        HabitCompletion(id=index + 1, habit_id=1,
+                        completion_date=first_day + timedelta(days=index), value=index % 60)
+        for index in range(args.rows)
+    ]
+    # Lo que devuelve `select(*COMPLETION_READ_COLUMNS)` convertido a dict.
+    rows = [
+        {name: getattr(completion, name)
+         for name in HabitCompletionRead.model_fields}
+        for completion in completions
+    ]
+    completion_dates = [completion.completion_date for completion in completions]
+
+    completions_adapter = TypeAdapter(List[HabitCompletionRead])
+    stats_adapter = TypeAdapter(HabitStats)
+
+    cases = {
+        "completions: response_model + json": lambda: json_render(completions_adapter.dump_python(
+            completions_adapter.validate_python(completions, from_attributes=True), mode="json")),
+        "completions: filas + orjson": lambda: ORJSONResponse(rows).body,
+        "completions: filas + msgpack": lambda: MsgPackResponse(rows).body,
+        "stats: response_model + json": lambda: json_render(stats_adapter.dump_python(stats_adapter.validate_python({
+            "current_streak": 1, "longest_streak": 1, "total_completions": args.rows,
+            "completion_dates": completion_dates}), mode="json")),
+        "stats: dict + orjson": lambda: ORJSONResponse({
+            "current_streak": 1, "longest_streak": 1, "total_completions": args.rows,
+            "completion_dates": completion_dates}).body,
+        "stats: dict + msgpack": lambda: MsgPackResponse({
+            "current_streak": 1, "longest_streak": 1, "total_completions": args.rows,
+            "completion_dates": completion_dates}).body,
+    }
+
+    print(f"{args.rows} completitudes, mejor de {args.repeat} repeticiones")
+    for name, case in cases.items():
+        seconds = min(timeit.repeat(case, number=1, repeat=args.repeat))
+        print(f"{name:40} {seconds * 1000:8.2f} ms {len(case()):>10} bytes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+from datetime import date
+from typing import Iterable
+from sqlmodel import delete, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from database import dialect_insert
+from models.habit_models import Habit, HabitCompletion, HabitCompletionBitmap, HabitType
+from utils.bitmap_utils import bitmap_from_dates, set_days
+
+
+def uses_bitmap(habit: Habit) -> bool:
+    """
+    Solo los hábitos simples guardan bitmap: los de frecuencia y
+    temporizador necesitan el `value` de cada fila.
+    """
+    return habit.habit_type == HabitType.SIMPLE
+
+
+async def _read_year_dates(session: AsyncSession, habit_id: int, year: int) -> list[date]:
+    statement = select(HabitCompletion.completion_date).where(
+        HabitCompletion.habit_id == habit_id,
+        HabitCompletion.completion_date >= date(year, 1, 1),
+        HabitCompletion.completion_date <= date(year, 12, 31)
+    )
+    return list((await session.exec(statement)).all())
+
+
+async def build_year_bitmap(session: AsyncSession, habit_id: int, year: int) -> HabitCompletionBitmap:
+    """
+    Reconstruye el bitmap de un año leyendo solo la columna de fechas y lo
+    guarda con INSERT ... ON CONFLICT DO UPDATE, para que dos peticiones
+    que lo construyen a la vez no choquen con la clave primaria.
+    """
+    bits = bitmap_from_dates(await _read_year_dates(session, habit_id, year))
+
+    insert = dialect_insert(session)
+    statement = insert(HabitCompletionBitmap).values(
+        habit_id=habit_id, year=year, bits=bits)
+    statement = statement.on_conflict_do_update(
+        index_elements=["habit_id", "year"],
+        set_={"bits": statement.excluded.bits}
+    ).returning(HabitCompletionBitmap).execution_options(populate_existing=True)
+
+    result = await session.exec(statement)
+    return result.scalars().one()
+
+
+async def get_year_bitmap(session: AsyncSession, habit: Habit, year: int) -> HabitCompletionBitmap:
+    """
+    Devuelve el bitmap de un año sin escribir nada. En los hábitos simples
+    se lee el guardado; si falta (o en el resto de tipos) se calcula al
+    vuelo desde las filas. Solo las escrituras de completitudes guardan
+    bitmaps nuevos, así que leer años arbitrarios no llena la tabla.
+    """
+    if uses_bitmap(habit):
+        bitmap = await session.get(HabitCompletionBitmap, (habit.id, year))
+        if bitmap is not None:
+            return bitmap
+    return HabitCompletionBitmap(
+        habit_id=habit.id, year=year,
+        bits=bitmap_from_dates(await _read_year_dates(session, habit.id, year)))
+
+
+async def register_bitmap_days(session: AsyncSession, habit: Habit, completion_dates: Iterable[date], completed: bool = True, bitmaps: dict[int, HabitCompletionBitmap] | None = None) -> None:
+    """
+    Mantiene los bitmaps al día tras insertar (o borrar, con
+    `completed=False`) completitudes. Hay que llamarla después de escribir
+    las filas: si el bitmap de un año aún no existe, se construye desde ellas.
+    Con `bitmaps` (año -> bitmap del hábito, ya cargados para todos los
+    años afectados) no se consulta ninguno; los construidos se añaden ahí.
+    """
+    if not uses_bitmap(habit):
+        return
+
+    dates_by_year: dict[int, list[date]] = {}
+    for completion_date in completion_dates:
+        dates_by_year.setdefault(completion_date.year, []).append(completion_date)
+
+    for year, year_dates in dates_by_year.items():
+        if bitmaps is None:
+            bitmap = await session.get(HabitCompletionBitmap, (habit.id, year))
+        else:
+            bitmap = bitmaps.get(year)
+        if bitmap is None:
+            bitmap = await build_year_bitmap(session, habit.id, year)
+            if bitmaps is not None:
+                bitmaps[year] = bitmap
+            continue
+        bitmap.bits = set_days(bitmap.bits, year_dates, completed)
+        session.add(bitmap)
+
+
+async def discard_bitmaps(session: AsyncSession, habit_id: int) -> None:
+    """
+    Borra los bitmaps de un hábito (p. ej. si cambia de tipo); se
+    reconstruyen desde las filas la próxima vez que se necesiten.
+    """
+    await session.exec(delete(HabitCompletionBitmap).where(
+        HabitCompletionBitmap.habit_id == habit_id))
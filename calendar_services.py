@@ -1,30 +1,110 @@
+import json
+import os
+import uuid
 import httpx
+from dataclasses import dataclass
 from datetime import date, datetime, timedelta
+from urllib.parse import urlsplit
 from models.user_models import User
-from models.habit_models import Habit
+from models.habit_models import Habit, HabitType
 
 
 GOOGLE_CALENDAR_API_URL = "https://www.googleapis.com/discovery/v1/apis/calendar/v3/rest"
 
+# Configurable para poder apuntar a un servidor local que imite a Google.
+GOOGLE_CALENDAR_BASE_URL = os.getenv(
+    "GOOGLE_CALENDAR_BASE_URL", "https://www.googleapis.com/calendar/v3")
+GOOGLE_CALENDAR_BATCH_URL = os.getenv(
+    "GOOGLE_CALENDAR_BATCH_URL", "https://www.googleapis.com/batch/calendar/v3")
 
-async def create_calendar_event_for_habit(user: User, habit: Habit, event_date: date):
+# Límite de Google Calendar para peticiones por lote.
+CALENDAR_BATCH_SIZE = 50
+
+_RRULE_FREQUENCIES = {
+    "day": "DAILY",
+    "daily": "DAILY",
+    "week": "WEEKLY",
+    "weekly": "WEEKLY",
+    "month": "MONTHLY",
+    "monthly": "MONTHLY",
+}
+
+
+class CalendarSyncError(Exception):
     """
-    Crea un evento en el calendario del usuario.
-    - Si el hábito tiene una hora programada, crea un evento de 1 hora en esa hora.
-    - Si no, crea un evento de "todo el día".
+    Error al sincronizar con Google Calendar. `retryable` indica si tiene
+    sentido reintentar más tarde (errores de red, 429, 5xx...).
     """
-    if not user.google_access_token:
-        print("El usuario no tiene un token de acceso de Google.")
-        return
+
+    def __init__(self, message: str, retryable: bool = True, status_code: int | None = None):
+        super().__init__(message)
+        self.retryable = retryable
+        self.status_code = status_code
+
+
+@dataclass
+class CalendarBatchItem:
+    """
+    Una operación dentro de una petición por lote. `method` es POST (crear),
+    PATCH (actualizar) o DELETE; `event_id` es obligatorio salvo al crear.
+    """
+    method: str
+    event_id: str | None = None
+    body: dict | None = None
+
+
+@dataclass
+class CalendarBatchResult:
+    status_code: int
+    body: dict | None = None
+
+    @property
+    def ok(self) -> bool:
+        return 200 <= self.status_code < 300
+
+    @property
+    def retryable(self) -> bool:
+        return _is_retryable_status(self.status_code)
+
+
+def _is_retryable_status(status_code: int) -> bool:
+    return status_code in (401, 408, 429) or status_code >= 500
+
+
+def build_recurrence_rule(habit: Habit) -> str:
+    """
+    Regla RRULE del evento recurrente de un hábito. Los hábitos de
+    frecuencia respetan `frequency_period`; el resto se repiten a diario.
+    """
+    frequency = "DAILY"
+    if habit.habit_type == HabitType.FREQUENCY and habit.frequency_period:
+        frequency = _RRULE_FREQUENCIES.get(
+            habit.frequency_period.strip().lower(), "DAILY")
+    return f"RRULE:FREQ={frequency}"
+
+
+def build_recurring_event(user: User, habit: Habit) -> dict:
+    """
+    Construye un único evento recurrente para el hábito.
+    - Si el hábito tiene una hora programada, el evento dura `target_minutes`
+      en los hábitos de temporizador y 1 hora en el resto.
+    - Si no, es un evento de "todo el día".
+    """
+    start_date = habit.created_at.date() if habit.created_at else date.today()
 
     event_data = {
         "summary": f"Hábito: {habit.name}",
         "description": habit.description or "Completar este hábito.",
+        "recurrence": [build_recurrence_rule(habit)],
     }
 
     if habit.scheduled_time:
-        start_datetime = datetime.combine(event_date, habit.scheduled_time)
-        end_datetime = start_datetime + timedelta(hours=1)
+        duration = timedelta(hours=1)
+        if habit.habit_type == HabitType.TIMER and habit.target_minutes:
+            duration = timedelta(minutes=habit.target_minutes)
+
+        start_datetime = datetime.combine(start_date, habit.scheduled_time)
+        end_datetime = start_datetime + duration
 
         user_timezone = user.timezone or "UTC"
 
@@ -37,22 +117,142 @@ async def create_calendar_event_for_habit(user: User, habit: Habit, event_date:
             "timeZone": user_timezone,
         }
     else:
-        event_data["start"] = {"date": event_date.isoformat()}
+        event_data["start"] = {"date": start_date.isoformat()}
         event_data["end"] = {
-            "date": (event_date + timedelta(days=1)).isoformat()}
+            "date": (start_date + timedelta(days=1)).isoformat()}
+
+    return event_data
+
 
+def _events_path() -> str:
+    return urlsplit(GOOGLE_CALENDAR_BASE_URL).path.rstrip("/") + "/calendars/primary/events"
+
+
+def build_batch_body(items: list[CalendarBatchItem], boundary: str) -> bytes:
+    """
+    Serializa las operaciones en el formato multipart/mixed de la API
+    por lotes de Google: cada parte es una petición HTTP completa.
+    """
+    events_path = _events_path()
+    lines = []
+
+    for index, item in enumerate(items):
+        path = events_path if item.event_id is None else f"{events_path}/{item.event_id}"
+        lines += [
+            f"--{boundary}",
+            "Content-Type: application/http",
+            f"Content-ID: <item{index}>",
+            "",
+            f"{item.method} {path} HTTP/1.1",
+        ]
+        if item.body is not None:
+            lines += [
+                "Content-Type: application/json",
+                "",
+                json.dumps(item.body),
+            ]
+        else:
+            lines.append("")
+        lines.append("")
+
+    lines.append(f"--{boundary}--")
+    return "\r\n".join(lines).encode()
+
+
+def _split_head_and_body(raw: str) -> tuple[str, str]:
+    head, _, body = raw.partition("\n\n")
+    return head, body
+
+
+def parse_batch_response(content_type: str, payload: bytes, size: int) -> list[CalendarBatchResult]:
+    """
+    Interpreta una respuesta multipart/mixed y devuelve un resultado por
+    operación, en el orden en que se enviaron (según su Content-ID).
+    Las operaciones sin respuesta se marcan como 500 para reintentarlas.
+    """
+    boundary = None
+    for param in content_type.split(";"):
+        key, _, value = param.strip().partition("=")
+        if key.lower() == "boundary":
+            boundary = value.strip('"')
+    if not boundary:
+        raise CalendarSyncError("Respuesta por lotes sin boundary.")
+
+    text = payload.decode().replace("\r\n", "\n")
+    results = [CalendarBatchResult(status_code=500) for _ in range(size)]
+
+    for part in text.split(f"--{boundary}"):
+        part = part.strip("\n")
+        if not part or part == "--":
+            continue
+
+        part_headers, http_response = _split_head_and_body(part)
+        index = None
+        for header in part_headers.split("\n"):
+            name, _, value = header.partition(":")
+            if name.strip().lower() == "content-id":
+                content_id = value.strip().strip("<>")
+                digits = content_id.rsplit("item", 1)[-1]
+                if digits.isdigit():
+                    index = int(digits)
+        if index is None or index >= size:
+            continue
+
+        response_head, response_body = _split_head_and_body(http_response)
+        status_line = response_head.split("\n", 1)[0]
+        try:
+            status_code = int(status_line.split()[1])
+        except (IndexError, ValueError):
+            continue
+
+        body = None
+        if response_body.strip():
+            try:
+                body = json.loads(response_body)
+            except ValueError:
+                body = None
+        results[index] = CalendarBatchResult(status_code=status_code, body=body)
+
+    return results
+
+
+async def execute_calendar_batch(client: httpx.AsyncClient, user: User, items: list[CalendarBatchItem]) -> list[CalendarBatchResult]:
+    """
+    Envía hasta `CALENDAR_BATCH_SIZE` operaciones en una sola petición por
+    lotes y devuelve el resultado de cada una.
+    Lanza `CalendarSyncError` si falla la petición completa.
+    """
+    if not items:
+        return []
+    if len(items) > CALENDAR_BATCH_SIZE:
+        raise ValueError(
+            f"Un lote admite como máximo {CALENDAR_BATCH_SIZE} operaciones")
+    if not user.google_access_token:
+        raise CalendarSyncError(
+            "El usuario no tiene un token de acceso de Google.", retryable=False)
+
+    boundary = f"batch_{uuid.uuid4().hex}"
     headers = {
         "Authorization": f"Bearer {user.google_access_token}",
-        "Content-Type": "application/json",
+        "Content-Type": f"multipart/mixed; boundary={boundary}",
     }
 
-    events_url = f"https://www.googleapis.com/calendar/v3/calendars/primary/events"
+    try:
+        response = await client.post(
+            GOOGLE_CALENDAR_BATCH_URL,
+            content=build_batch_body(items, boundary),
+            headers=headers
+        )
+        response.raise_for_status()
+    except httpx.HTTPStatusError as e:
+        raise CalendarSyncError(
+            f"Error en la petición por lotes a Google Calendar: {e.response.text}",
+            retryable=_is_retryable_status(e.response.status_code),
+            status_code=e.response.status_code,
+        ) from e
+    except httpx.TransportError as e:
+        raise CalendarSyncError(
+            f"No se pudo contactar con Google Calendar: {e!r}") from e
 
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.post(events_url, json=event_data, headers=headers)
-            response.raise_for_status()
-            print("Evento de calendario creado exitosamente:", response.json())
-        except httpx.HTTPStatusError as e:
-            print(
-                f"Error al crear el evento en Google Calendar: {e.response.text}")
+    return parse_batch_response(
+        response.headers.get("content-type", ""), response.content, len(items))
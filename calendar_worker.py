@@ -0,0 +1,450 @@
+import asyncio
+import json
+import os
+import random
+from datetime import datetime, timedelta, timezone
+
+import httpx
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlmodel import func, select, update
+
+from calendar_services import CALENDAR_BATCH_SIZE, CalendarBatchItem, CalendarBatchResult, CalendarSyncError, build_recurring_event, execute_calendar_batch
+from google_token_services import GoogleTokenError, GoogleTokenManager
+from models.calendar_models import CalendarOperation, CalendarSyncTask, CalendarTaskStatus
+from models.habit_models import CalendarSyncStatus, Habit
+from models.user_models import User
+from sync_services import habit_change, record_changes
+
+
+CALENDAR_SYNC_CONCURRENCY = int(os.getenv("CALENDAR_SYNC_CONCURRENCY", "8"))
+CALENDAR_SYNC_POLL_SECONDS = float(
+    os.getenv("CALENDAR_SYNC_POLL_SECONDS", "5"))
+CALENDAR_SYNC_MAX_ATTEMPTS = int(os.getenv("CALENDAR_SYNC_MAX_ATTEMPTS", "8"))
+CALENDAR_SYNC_BACKOFF_BASE_SECONDS = float(
+    os.getenv("CALENDAR_SYNC_BACKOFF_BASE_SECONDS", "2"))
+CALENDAR_SYNC_BACKOFF_MAX_SECONDS = float(
+    os.getenv("CALENDAR_SYNC_BACKOFF_MAX_SECONDS", "900"))
+# Tiempo que una tarea queda reservada por un worker antes de poder
+# reclamarse de nuevo (por ejemplo, si el proceso murió a mitad).
+CALENDAR_SYNC_LEASE_SECONDS = float(
+    os.getenv("CALENDAR_SYNC_LEASE_SECONDS", "120"))
+
+_ACTIVE_STATUSES = (CalendarTaskStatus.PENDING, CalendarTaskStatus.IN_PROGRESS)
+
+
+def backoff_delay(attempts: int) -> float:
+    """
+    Espera exponencial con jitter para el reintento número `attempts`.
+    """
+    delay = min(CALENDAR_SYNC_BACKOFF_MAX_SECONDS,
+                CALENDAR_SYNC_BACKOFF_BASE_SECONDS * (2 ** (attempts - 1)))
+    return delay * random.uniform(0.5, 1.0)
+
+
+class CalendarSyncWorker:
+    """
+    Vacía la tabla `CalendarSyncTask` en segundo plano.
+    - Concurrencia acotada con un semáforo.
+    - Orden por usuario: las tareas de un usuario se envían en orden, en
+      lotes de hasta `CALENDAR_BATCH_SIZE`, y nunca dos lotes suyos a la vez.
+    - Reintentos con espera exponencial hasta `CALENDAR_SYNC_MAX_ATTEMPTS`.
+    - Si recibe un `token_manager`, refresca el token de Google antes de
+      enviar cada lote y tras un 401.
+    """
+
+    def __init__(self, session_maker: async_sessionmaker, http_client: httpx.AsyncClient, token_manager: GoogleTokenManager | None = None):
+        self.session_maker = session_maker
+        self.http_client = http_client
+        self.token_manager = token_manager
+        self._semaphore = asyncio.Semaphore(CALENDAR_SYNC_CONCURRENCY)
+        self._wakeup = asyncio.Event()
+        self._in_flight_users: set[int] = set()
+        self._jobs: set[asyncio.Task] = set()
+        self._runner: asyncio.Task | None = None
+
+    def start(self) -> None:
+        self._runner = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            self._runner.cancel()
+            try:
+                await self._runner
+            except asyncio.CancelledError:
+                pass
+        if self._jobs:
+            await asyncio.gather(*self._jobs, return_exceptions=True)
+
+    def notify(self) -> None:
+        """Despierta al worker sin esperar al siguiente sondeo."""
+        self._wakeup.set()
+
+    async def _run(self) -> None:
+        while True:
+            timeout = CALENDAR_SYNC_POLL_SECONDS
+            try:
+                await self.drain_once()
+                timeout = min(timeout, await self._seconds_until_next_due())
+            except Exception as err:
+                print(f"Error en el worker de sincronización de calendario: {err!r}")
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), max(timeout, 0.05))
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def _seconds_until_next_due(self) -> float:
+        """
+        Cuánto falta para el próximo reintento programado, para no esperar
+        al siguiente sondeo cuando la espera exponencial es corta.
+        """
+        statement = select(func.min(CalendarSyncTask.next_attempt_at)).where(
+            CalendarSyncTask.status == CalendarTaskStatus.PENDING)
+
+        async with self.session_maker() as session:
+            next_attempt_at = (await session.exec(statement)).first()
+
+        if next_attempt_at is None:
+            return CALENDAR_SYNC_POLL_SECONDS
+        if next_attempt_at.tzinfo is None:
+            next_attempt_at = next_attempt_at.replace(tzinfo=timezone.utc)
+        return (next_attempt_at - datetime.now(timezone.utc)).total_seconds()
+
+    async def drain_once(self) -> int:
+        """
+        Reserva y lanza los lotes listos para ejecutarse: como mucho uno por
+        usuario, con hasta `CALENDAR_BATCH_SIZE` operaciones. Devuelve
+        cuántos lotes se lanzaron.
+        """
+        now = datetime.now(timezone.utc)
+        free_slots = CALENDAR_SYNC_CONCURRENCY - len(self._jobs)
+        if free_slots <= 0:
+            return 0
+
+        head_ids = select(func.min(CalendarSyncTask.id)).where(
+            CalendarSyncTask.status.in_(_ACTIVE_STATUSES)
+        ).group_by(CalendarSyncTask.user_id)
+
+        statement = select(CalendarSyncTask.user_id).where(
+            CalendarSyncTask.id.in_(head_ids),
+            CalendarSyncTask.next_attempt_at <= now
+        ).order_by(CalendarSyncTask.id).limit(free_slots)
+
+        launched = 0
+        async with self.session_maker() as session:
+            user_ids = (await session.exec(statement)).all()
+
+            for user_id in user_ids:
+                if user_id in self._in_flight_users:
+                    continue
+                task_ids = await self._claim_batch(session, user_id, now)
+                if not task_ids:
+                    continue
+
+                self._in_flight_users.add(user_id)
+                job = asyncio.create_task(self._process(user_id, task_ids))
+                self._jobs.add(job)
+                job.add_done_callback(self._jobs.discard)
+                launched += 1
+
+        return launched
+
+    async def _claim_batch(self, session, user_id: int, now: datetime) -> list[int]:
+        """
+        Reserva las tareas activas más antiguas del usuario que ya tocan,
+        deteniéndose en la primera que aún está esperando un reintento para
+        no adelantarla. El UPDATE condicional evita que dos procesos
+        ejecuten la misma tarea.
+        """
+        statement = select(CalendarSyncTask.id, CalendarSyncTask.next_attempt_at).where(
+            CalendarSyncTask.user_id == user_id,
+            CalendarSyncTask.status.in_(_ACTIVE_STATUSES)
+        ).order_by(CalendarSyncTask.id).limit(CALENDAR_BATCH_SIZE)
+
+        due_ids = []
+        for task_id, next_attempt_at in await session.exec(statement):
+            if next_attempt_at.tzinfo is None:
+                next_attempt_at = next_attempt_at.replace(tzinfo=timezone.utc)
+            if next_attempt_at > now:
+                break
+            due_ids.append(task_id)
+
+        if not due_ids:
+            return []
+
+        claim = update(CalendarSyncTask).where(
+            CalendarSyncTask.id.in_(due_ids),
+            CalendarSyncTask.status.in_(_ACTIVE_STATUSES),
+            CalendarSyncTask.next_attempt_at <= now
+        ).values(
+            status=CalendarTaskStatus.IN_PROGRESS,
+            next_attempt_at=now + timedelta(seconds=CALENDAR_SYNC_LEASE_SECONDS)
+        ).returning(CalendarSyncTask.id)
+        claimed_ids = sorted((await session.exec(claim)).scalars().all())
+        await session.commit()
+        return claimed_ids
+
+    async def _process(self, user_id: int, task_ids: list[int]) -> None:
+        try:
+            async with self._semaphore:
+                try:
+                    await self._execute(user_id, task_ids)
+                except Exception as err:
+                    print(f"Error inesperado al sincronizar las tareas {task_ids} del usuario {user_id}: {err!r}")
+                    await self._record_crash(task_ids, err)
+        finally:
+            self._in_flight_users.discard(user_id)
+            self.notify()
+
+    async def _execute(self, user_id: int, task_ids: list[int]) -> None:
+        """
+        Agrupa las tareas por hábito, las reduce a una sola operación por
+        hábito (crear, actualizar o borrar según el estado actual) y las
+        envía en una petición por lotes. Los hábitos cargados no se
+        modifican: los resultados se acumulan por hábito y se escriben al
+        final con `_write_habit_updates`.
+        """
+        async with self.session_maker() as session:
+            tasks = (await session.exec(
+                select(CalendarSyncTask).where(CalendarSyncTask.id.in_(task_ids)).order_by(CalendarSyncTask.id)
+            )).all()
+            user = await session.get(User, user_id)
+
+            habit_ids = {task.habit_id for task in tasks}
+            habits = {
+                habit.id: habit for habit in (await session.exec(select(Habit).where(Habit.id.in_(habit_ids)))).all()
+            }
+
+            retry_at = _retry_at(tasks)
+            habit_updates: dict[int, dict] = {}
+
+            pending: list[tuple[int, list[CalendarSyncTask], CalendarBatchItem]] = []
+            for habit_id, habit_tasks in _group_by_habit(tasks).items():
+                item = _coalesce(habits.get(habit_id), habit_tasks, user)
+                if item is None:
+                    self._record_success(habit_tasks, habit_updates)
+                else:
+                    pending.append((habit_id, habit_tasks, item))
+
+            if pending:
+                try:
+                    if user is None:
+                        raise CalendarSyncError(
+                            "El usuario ya no existe.", retryable=False)
+                    await self._ensure_access_token(user)
+                    results = await execute_calendar_batch(
+                        self.http_client, user, [item for _, _, item in pending])
+                except CalendarSyncError as err:
+                    if err.status_code == 401:
+                        await self._force_token_refresh(user_id)
+                    for _, habit_tasks, _ in pending:
+                        self._record_failure(habit_tasks, err, retry_at, habit_updates)
+                else:
+                    for (_, habit_tasks, item), result in zip(pending, results):
+                        self._apply_result(
+                            habit_tasks, item, result, retry_at, habit_updates)
+
+            updated_habit_ids = await _write_habit_updates(session, user_id, habit_updates)
+
+            # `calendar_sync_status` forma parte de las lecturas del usuario.
+            if user is not None and updated_habit_ids:
+                await record_changes(session, user_id, [habit_change(habit_id) for habit_id in updated_habit_ids])
+            await session.commit()
+
+    async def _record_crash(self, task_ids: list[int], err: Exception) -> None:
+        """
+        Un error inesperado (no una respuesta de Google) cuenta como un
+        intento fallido de todas las tareas del lote. Sin esto quedarían
+        reservadas hasta que caduque la reserva y se reintentarían sin
+        límite, sin que `attempts` suba nunca.
+        """
+        try:
+            async with self.session_maker() as session:
+                tasks = (await session.exec(select(CalendarSyncTask).where(
+                    CalendarSyncTask.id.in_(task_ids),
+                    CalendarSyncTask.status == CalendarTaskStatus.IN_PROGRESS
+                ).order_by(CalendarSyncTask.id))).all()
+                if not tasks:
+                    return
+
+                retry_at = _retry_at(tasks)
+                habit_updates: dict[int, dict] = {}
+                error = CalendarSyncError(f"Error interno del worker: {err!r}")
+                for habit_tasks in _group_by_habit(tasks).values():
+                    self._record_failure(habit_tasks, error, retry_at, habit_updates)
+
+                await _write_habit_updates(session, tasks[0].user_id, habit_updates)
+                await session.commit()
+        except Exception as record_err:
+            print(f"No se pudo registrar el fallo de las tareas {task_ids}: {record_err!r}")
+
+    async def _ensure_access_token(self, user: User) -> None:
+        """
+        Pone en `user` un token de acceso vigente. Se asigna como valor ya
+        guardado: el gestor de tokens lo persiste por su cuenta y así el
+        `commit` del worker no lo vuelve a escribir.
+        """
+        if self.token_manager is None:
+            return
+        try:
+            token = await self.token_manager.get_access_token(user)
+        except GoogleTokenError as err:
+            raise CalendarSyncError(str(err), retryable=err.retryable) from err
+        set_committed_value(user, "google_access_token", token.access_token)
+        set_committed_value(user, "google_token_expires_at", token.expires_at)
+
+    async def _force_token_refresh(self, user_id: int) -> None:
+        """
+        Google rechazó el token aunque no había caducado (p. ej. se revocó):
+        se refresca ya para que el reintento use uno nuevo.
+        """
+        if self.token_manager is None:
+            return
+        try:
+            await self.token_manager.refresh(user_id, force=True)
+        except GoogleTokenError as err:
+            print(f"No se pudo refrescar el token del usuario {user_id}: {err}")
+
+    def _apply_result(self, tasks: list[CalendarSyncTask], item: CalendarBatchItem, result: CalendarBatchResult, retry_at: datetime, habit_updates: dict[int, dict]) -> None:
+        gone = result.status_code in (404, 410)
+
+        if result.ok or (item.method == "DELETE" and gone):
+            if item.method == "POST" and result.body:
+                habit_updates.setdefault(tasks[0].habit_id, {})[
+                    "google_event_id"] = result.body.get("id")
+            self._record_success(tasks, habit_updates)
+            return
+
+        if item.method == "PATCH" and gone:
+            # El evento se borró en Google: el siguiente intento lo recrea.
+            habit_updates.setdefault(tasks[0].habit_id, {})["google_event_id"] = None
+            self._record_failure(tasks, CalendarSyncError(
+                "El evento ya no existe en Google Calendar; se volverá a crear."), retry_at, habit_updates)
+            return
+
+        body = json.dumps(result.body) if result.body else ""
+        self._record_failure(tasks, CalendarSyncError(
+            f"Google Calendar respondió {result.status_code} {body}".strip(),
+            retryable=result.retryable), retry_at, habit_updates)
+
+    def _record_success(self, tasks: list[CalendarSyncTask], habit_updates: dict[int, dict]) -> None:
+        for task in tasks:
+            task.status = CalendarTaskStatus.DONE
+            task.last_error = None
+        if tasks[-1].operation != CalendarOperation.DELETE:
+            habit_updates.setdefault(tasks[0].habit_id, {})[
+                "calendar_sync_status"] = CalendarSyncStatus.SYNCED
+
+    def _record_failure(self, tasks: list[CalendarSyncTask], err: CalendarSyncError, retry_at: datetime, habit_updates: dict[int, dict]) -> None:
+        for task in tasks:
+            task.attempts += 1
+            task.last_error = str(err)
+
+            if err.retryable and task.attempts < CALENDAR_SYNC_MAX_ATTEMPTS:
+                task.status = CalendarTaskStatus.PENDING
+                task.next_attempt_at = retry_at
+            else:
+                task.status = CalendarTaskStatus.FAILED
+
+        if tasks[-1].status == CalendarTaskStatus.FAILED:
+            if tasks[-1].operation != CalendarOperation.DELETE:
+                habit_updates.setdefault(tasks[0].habit_id, {})[
+                    "calendar_sync_status"] = CalendarSyncStatus.FAILED
+            print(
+                f"Sincronización de calendario fallida para las tareas {[task.id for task in tasks]}: {err}")
+
+
+def _group_by_habit(tasks: list[CalendarSyncTask]) -> dict[int, list[CalendarSyncTask]]:
+    tasks_by_habit: dict[int, list[CalendarSyncTask]] = {}
+    for task in tasks:
+        tasks_by_habit.setdefault(task.habit_id, []).append(task)
+    return tasks_by_habit
+
+
+def _retry_at(tasks: list[CalendarSyncTask]) -> datetime:
+    """
+    Un único instante de reintento para todo el lote, para que las tareas
+    fallidas vuelvan a salir juntas y en el mismo orden.
+    """
+    return datetime.now(timezone.utc) + timedelta(
+        seconds=backoff_delay(max(task.attempts for task in tasks) + 1))
+
+
+async def _write_habit_updates(session, user_id: int, habit_updates: dict[int, dict]) -> list[int]:
+    """
+    Escribe los resultados con un UPDATE por hábito en lugar de a través
+    de objetos cargados: si el usuario borró el hábito mientras el lote
+    estaba en vuelo, el UPDATE no encuentra la fila (en vez de hacer
+    fallar el commit de todo el lote) y, si Google acababa de crear su
+    evento, se encola su borrado para no dejarlo huérfano.
+    Devuelve los hábitos que seguían existiendo.
+    """
+    updated_habit_ids = []
+    for habit_id, values in habit_updates.items():
+        result = await session.exec(update(Habit).where(Habit.id == habit_id).values(**values))
+        if result.rowcount:
+            updated_habit_ids.append(habit_id)
+        elif values.get("google_event_id"):
+            session.add(CalendarSyncTask(
+                user_id=user_id,
+                habit_id=habit_id,
+                operation=CalendarOperation.DELETE,
+                remote_event_id=values["google_event_id"]
+            ))
+    return updated_habit_ids
+
+
+def _coalesce(habit: Habit | None, tasks: list[CalendarSyncTask], user: User | None) -> CalendarBatchItem | None:
+    """
+    Reduce las operaciones pendientes de un hábito a la única que hace
+    falta: el evento se construye siempre con el estado actual del hábito,
+    así que crear+actualizar es crear, y cualquier cosa seguida de borrar es
+    borrar. Devuelve `None` si no hay nada que enviar.
+    """
+    last_operation = tasks[-1].operation
+
+    if last_operation == CalendarOperation.DELETE or habit is None:
+        remote_event_id = next(
+            (task.remote_event_id for task in reversed(tasks) if task.remote_event_id), None)
+        if remote_event_id is None and habit is not None:
+            remote_event_id = habit.google_event_id
+        if remote_event_id is None:
+            return None
+        return CalendarBatchItem(method="DELETE", event_id=remote_event_id)
+
+    if user is None:
+        return None
+
+    body = build_recurring_event(user, habit)
+    if habit.google_event_id:
+        return CalendarBatchItem(method="PATCH", event_id=habit.google_event_id, body=body)
+    return CalendarBatchItem(method="POST", body=body)
+
+
+def enqueue_calendar_sync(session, habit: Habit, operation: CalendarOperation) -> CalendarSyncTask:
+    """
+    Añade una operación a la bandeja de salida dentro de la transacción en
+    curso. El hábito queda en estado "pending" hasta que el worker la procese.
+    """
+    task = CalendarSyncTask(
+        user_id=habit.user_id,
+        habit_id=habit.id,
+        operation=operation,
+        remote_event_id=habit.google_event_id if operation == CalendarOperation.DELETE else None
+    )
+    session.add(task)
+    if operation != CalendarOperation.DELETE:
+        habit.calendar_sync_status = CalendarSyncStatus.PENDING
+        session.add(habit)
+    return task
+
+
+def notify_calendar_worker(app) -> None:
+    """
+    Avisa al worker de la app (si está corriendo) de que hay trabajo nuevo.
+    """
+    worker = getattr(app.state, "calendar_worker", None)
+    if worker is not None:
+        worker.notify()
@@ -0,0 +1,135 @@
+import os
+from datetime import date
+from typing import Any, AsyncIterable, Awaitable, Callable
+from sqlmodel import func
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from bitmap_services import register_bitmap_days
+from database import dialect_insert
+from models.habit_models import Habit, HabitCompletion, HabitType
+from rollup_services import register_rollup_deltas
+from stats_services import recompute_habit_stats
+from sync_services import completion_changes, record_changes
+from write_queue import WriteUnit
+
+from dotenv import load_dotenv
+load_dotenv()
+
+
+IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", "1000"))
+
+
+async def upsert_completion_value(session: AsyncSession, habit_id: int, completion_date: date, delta: int) -> HabitCompletion:
+    """
+    Suma `delta` al valor de la completitud (habit_id, completion_date),
+    creándola si no existe, en una sola sentencia atómica:
+    INSERT ... ON CONFLICT DO UPDATE SET value = value + :delta RETURNING *.
+    """
+    insert = dialect_insert(session)
+    statement = insert(HabitCompletion).values(
+        habit_id=habit_id,
+        completion_date=completion_date,
+        value=delta
+    )
+    statement = statement.on_conflict_do_update(
+        index_elements=["habit_id", "completion_date"],
+        set_={"value": func.coalesce(
+            HabitCompletion.value, 0) + statement.excluded.value}
+    ).returning(HabitCompletion).execution_options(populate_existing=True)
+
+    result = await session.exec(statement)
+    return result.scalars().one()
+
+
+async def insert_completion_if_absent(session: AsyncSession, habit_id: int, completion_date: date) -> HabitCompletion | None:
+    """
+    Inserta la completitud en una sola sentencia. Devuelve `None` si ya
+    existía una para esa fecha (INSERT ... ON CONFLICT DO NOTHING RETURNING *).
+    """
+    insert = dialect_insert(session)
+    statement = insert(HabitCompletion).values(
+        habit_id=habit_id,
+        completion_date=completion_date
+    ).on_conflict_do_nothing(
+        index_elements=["habit_id", "completion_date"]
+    ).returning(HabitCompletion)
+
+    result = await session.exec(statement)
+    return result.scalars().first()
+
+
+async def insert_completions_ignoring_conflicts(session: AsyncSession, habit_id: int, rows: list[tuple[date, int | None]]) -> list[date]:
+    """
+    Inserta un bloque de filas (fecha, valor) con un único executemany de
+    INSERT ... ON CONFLICT DO NOTHING, sin crear objetos ORM. Devuelve las
+    fechas que se insertaron de verdad (las existentes se ignoran).
+    """
+    if not rows:
+        return []
+
+    insert = dialect_insert(session)
+    statement = insert(HabitCompletion).on_conflict_do_nothing(
+        index_elements=["habit_id", "completion_date"]
+    ).returning(HabitCompletion.completion_date)
+
+    params = [
+        {"habit_id": habit_id, "completion_date": completion_date, "value": value}
+        for completion_date, value in rows
+    ]
+    result = await session.exec(statement, params=params)
+    return list(result.scalars().all())
+
+
+async def import_completions(habit: Habit, records: AsyncIterable[tuple[date, int | None]], write: Callable[[WriteUnit], Awaitable[Any]]) -> tuple[int, int]:
+    """
+    Importa completitudes a medida que se van leyendo, en bloques de
+    `IMPORT_CHUNK_SIZE`: la memoria usada no depende del tamaño del
+    fichero ni del historial ya guardado. El `value` solo se guarda en
+    hábitos de frecuencia y temporizador.
+    Cada bloque con filas nuevas queda anotado en el registro de cambios.
+    Devuelve (filas creadas, filas omitidas por estar repetidas).
+    Cada bloque es una unidad de escritura que se confirma por separado
+    con `write` (normalmente `run_write`), así que el bloqueo de escritura
+    solo se retiene lo que tarda un bloque: `records` debe venir ya
+    validado (ver `spool_records`) y no esperar a la red.
+    """
+    keep_value = habit.habit_type != HabitType.SIMPLE
+    created = skipped = 0
+    chunk: list[tuple[date, int | None]] = []
+
+    async def write_chunk(session: AsyncSession) -> list[date]:
+        inserted_dates = await insert_completions_ignoring_conflicts(session, habit.id, chunk)
+        await register_bitmap_days(session, habit, inserted_dates)
+        # Con fechas repetidas en el bloque se queda la primera fila.
+        values: dict[date, int | None] = {}
+        for completion_date, value in chunk:
+            values.setdefault(completion_date, value)
+        await register_rollup_deltas(session, [
+            (habit.id, completion_date, 1, values[completion_date] or 0)
+            for completion_date in inserted_dates
+        ])
+        if inserted_dates:
+            await record_changes(session, habit.user_id, completion_changes(habit.id, inserted_dates))
+        return inserted_dates
+
+    async def flush_chunk() -> None:
+        nonlocal created, skipped
+        inserted_dates = await write(write_chunk)
+        created += len(inserted_dates)
+        skipped += len(chunk) - len(inserted_dates)
+        chunk.clear()
+
+    async for completion_date, value in records:
+        chunk.append((completion_date, value if keep_value else None))
+        if len(chunk) >= IMPORT_CHUNK_SIZE:
+            await flush_chunk()
+    await flush_chunk()
+
+    if created:
+        # Un único recálculo al final sale más barato que actualizar la
+        # proyección bloque a bloque con fechas desordenadas.
+        async def recompute(session: AsyncSession) -> None:
+            await recompute_habit_stats(session, habit.id)
+        await write(recompute)
+
+    return created, skipped
@@ -1,15 +1,174 @@
-from sqlmodel import create_engine, SQLModel, Session
+import os
+import time
+from sqlalchemy import event
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
+from sqlmodel import SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
 
-DATABASE_URL = "sqlite:///habitapp.db"
+from migrations import run_migrations
+from utils.metrics_utils import record_statement
 
-engine = create_engine(DATABASE_URL, echo=True, connect_args={
-                       "check_same_thread": False})
+from dotenv import load_dotenv
+load_dotenv()
 
 
-def create_db_and_tables():
-    SQLModel.metadata.create_all(engine)
+def _async_database_url(url: str) -> str:
+    """
+    Asegura que la URL use un driver asíncrono: aiosqlite en local y
+    asyncpg en producción (acepta las URLs `postgres://` de los proveedores).
+    """
+    if url.startswith("sqlite:///"):
+        return url.replace("sqlite:///", "sqlite+aiosqlite:///", 1)
+    if url.startswith("postgres://"):
+        return url.replace("postgres://", "postgresql+asyncpg://", 1)
+    if url.startswith("postgresql://"):
+        return url.replace("postgresql://", "postgresql+asyncpg://", 1)
+    return url
 
 
-def get_session():
-    with Session(engine) as session:
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+DATABASE_URL = _async_database_url(
+    os.getenv("DATABASE_URL", "sqlite+aiosqlite:///habitapp.db"))
+
+DB_ECHO = _env_bool("DB_ECHO", False)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+
+SQLITE_PRAGMAS = {
+    "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+    "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+    # Valor negativo: tamaño en KiB en lugar de número de páginas.
+    "cache_size": int(os.getenv("SQLITE_CACHE_SIZE", str(-64 * 1024))),
+    "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000")),
+}
+
+
+def _is_sqlite_memory(url: str) -> bool:
+    database = make_url(url).database
+    return not database or database == ":memory:"
+
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    """
+    Se ejecuta en cada conexión nueva de SQLite. WAL permite que los
+    lectores no esperen a los escritores y synchronous=NORMAL es seguro en WAL.
+    """
+    cursor = dbapi_connection.cursor()
+    for pragma, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {pragma}={value}")
+    cursor.close()
+
+
+def _start_statement_timer(conn, cursor, statement, parameters, context, executemany):
+    context._metrics_started_at = time.perf_counter()
+
+
+def _record_statement_time(conn, cursor, statement, parameters, context, executemany):
+    """
+    Suma la sentencia a las métricas de la petición en curso (número de
+    sentencias y tiempo de base de datos).
+    """
+    record_statement(time.perf_counter() - context._metrics_started_at)
+
+
+def build_engine(url: str = DATABASE_URL) -> AsyncEngine:
+    """
+    Crea el motor asíncrono según la configuración del entorno:
+    pool (tamaño, desbordamiento, reciclado), echo de SQL, en SQLite los
+    PRAGMA de rendimiento en cada conexión y los eventos que alimentan las
+    métricas de sentencias por petición.
+    """
+    engine_kwargs = {"echo": DB_ECHO}
+    is_sqlite = make_url(url).get_backend_name() == "sqlite"
+
+    if not (is_sqlite and _is_sqlite_memory(url)):
+        engine_kwargs.update(
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_recycle=DB_POOL_RECYCLE,
+        )
+
+    new_engine = create_async_engine(url, **engine_kwargs)
+
+    if is_sqlite:
+        event.listen(new_engine.sync_engine, "connect", _apply_sqlite_pragmas)
+
+    event.listen(new_engine.sync_engine, "before_cursor_execute", _start_statement_timer)
+    event.listen(new_engine.sync_engine, "after_cursor_execute", _record_statement_time)
+
+    return new_engine
+
+
+async def describe_engine(target: AsyncEngine) -> str:
+    """
+    Resumen legible del perfil efectivo del motor, para el log de arranque.
+    En SQLite lee los PRAGMA de vuelta desde una conexión real, así se ve
+    lo que de verdad quedó activo y no solo lo que se pidió.
+    """
+    url = target.url
+    pool = target.pool
+    parts = [
+        f"backend={url.get_backend_name()}+{url.get_driver_name()}",
+        f"database={url.database}",
+        f"echo={target.echo}",
+    ]
+
+    if hasattr(pool, "size"):
+        parts.append(
+            f"pool={type(pool).__name__}(size={pool.size()}, "
+            f"max_overflow={DB_MAX_OVERFLOW}, recycle={DB_POOL_RECYCLE}s)")
+    else:
+        parts.append(f"pool={type(pool).__name__}")
+
+    if url.get_backend_name() == "sqlite":
+        async with target.connect() as conn:
+            for pragma in SQLITE_PRAGMAS:
+                value = (await conn.exec_driver_sql(f"PRAGMA {pragma}")).scalar()
+                parts.append(f"{pragma}={value}")
+
+    return " ".join(parts)
+
+
+engine = build_engine()
+
+async_session_maker = async_sessionmaker(
+    engine, class_=AsyncSession, expire_on_commit=False)
+
+
+def dialect_insert(session: AsyncSession):
+    """
+    Devuelve la construcción `insert` del dialecto activo, que es la que
+    expone `on_conflict_do_update` / `on_conflict_do_nothing`.
+    """
+    dialect_name = session.get_bind().dialect.name
+    if dialect_name == "postgresql":
+        return postgresql.insert
+    if dialect_name == "sqlite":
+        return sqlite.insert
+    raise NotImplementedError(
+        f"Dialecto no soportado para upserts: {dialect_name}")
+
+
+async def create_db_and_tables():
+    """
+    Crea las tablas que faltan y aplica las migraciones pendientes de las
+    bases de datos creadas con versiones anteriores (ver `migrations`).
+    """
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+        await conn.run_sync(run_migrations)
+
+
+async def get_session():
+    async with async_session_maker() as session:
         yield session
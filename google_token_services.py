@@ -0,0 +1,269 @@
+import asyncio
+import os
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+
+import httpx
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlmodel import select, update
+
+from models.calendar_models import CalendarSyncTask, CalendarTaskStatus
+from models.user_models import User
+from utils.auth_utils import invalidate_cached_user
+
+from dotenv import load_dotenv
+load_dotenv()
+
+
+GOOGLE_TOKEN_URL = os.getenv(
+    "GOOGLE_TOKEN_URL", "https://oauth2.googleapis.com/token")
+GOOGLE_CLIENT_ID = os.getenv("GOOGLE_CLIENT_ID")
+GOOGLE_CLIENT_SECRET = os.getenv("GOOGLE_CLIENT_SECRET")
+
+# Se refresca antes de que caduque, no cuando ya ha caducado.
+GOOGLE_TOKEN_REFRESH_MARGIN_SECONDS = float(
+    os.getenv("GOOGLE_TOKEN_REFRESH_MARGIN_SECONDS", "300"))
+GOOGLE_TOKEN_SWEEP_INTERVAL_SECONDS = float(
+    os.getenv("GOOGLE_TOKEN_SWEEP_INTERVAL_SECONDS", "60"))
+GOOGLE_TOKEN_SWEEP_LOOKAHEAD_SECONDS = float(
+    os.getenv("GOOGLE_TOKEN_SWEEP_LOOKAHEAD_SECONDS", "600"))
+GOOGLE_TOKEN_SWEEP_CONCURRENCY = int(
+    os.getenv("GOOGLE_TOKEN_SWEEP_CONCURRENCY", "4"))
+GOOGLE_TOKEN_SWEEP_BATCH_SIZE = int(
+    os.getenv("GOOGLE_TOKEN_SWEEP_BATCH_SIZE", "500"))
+
+
+class GoogleTokenError(Exception):
+    """
+    No se pudo obtener un token de acceso válido de Google. `retryable`
+    es falso cuando el usuario tiene que volver a autorizar la app.
+    """
+
+    def __init__(self, message: str, retryable: bool = True):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+@dataclass
+class GoogleToken:
+    access_token: str
+    expires_at: datetime | None
+
+
+def _as_utc(value: datetime | None) -> datetime | None:
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def needs_refresh(expires_at: datetime | None, margin_seconds: float = GOOGLE_TOKEN_REFRESH_MARGIN_SECONDS) -> bool:
+    """
+    Los tokens sin fecha de caducidad conocida se dan por válidos.
+    """
+    expires_at = _as_utc(expires_at)
+    if expires_at is None:
+        return False
+    return expires_at <= datetime.now(timezone.utc) + timedelta(seconds=margin_seconds)
+
+
+class GoogleTokenManager:
+    """
+    Gestiona los tokens de acceso de Google de los usuarios:
+    - Los refresca antes de que caduquen.
+    - Garantiza un único refresco en curso por usuario: las llamadas
+      concurrentes esperan a la misma tarea.
+    - Guarda los tokens nuevos en la base de datos.
+    - Un barrido periódico refresca por adelantado los que van a caducar
+      de los usuarios con sincronizaciones de calendario pendientes.
+    """
+
+    def __init__(self, session_maker: async_sessionmaker, http_client: httpx.AsyncClient):
+        self.session_maker = session_maker
+        self.http_client = http_client
+        # user_id -> (tarea de refresco en curso, si es forzado)
+        self._in_flight: dict[int, tuple[asyncio.Task, bool]] = {}
+        self._sweeper: asyncio.Task | None = None
+
+    async def get_access_token(self, user: User) -> GoogleToken:
+        """
+        Devuelve un token válido para el usuario, refrescándolo si hace falta.
+        """
+        if user.google_access_token and not needs_refresh(user.google_token_expires_at):
+            return GoogleToken(user.google_access_token, _as_utc(user.google_token_expires_at))
+        return await self.refresh(user.id)
+
+    async def refresh(self, user_id: int, force: bool = False, margin_seconds: float = GOOGLE_TOKEN_REFRESH_MARGIN_SECONDS) -> GoogleToken:
+        """
+        Refresca el token del usuario si caduca en menos de `margin_seconds`
+        (o siempre, con `force`). Si ya hay un refresco en curso para él,
+        espera a ese en lugar de lanzar otro; salvo que se pida `force` y
+        el que está en curso no lo sea, porque ese puede devolver el mismo
+        token que Google acaba de rechazar: entonces se encadena uno
+        forzado tras él.
+        """
+        in_flight = self._in_flight.get(user_id)
+        if in_flight is not None and (in_flight[1] or not force):
+            task = in_flight[0]
+        else:
+            previous = in_flight[0] if in_flight is not None else None
+            task = asyncio.create_task(
+                self._refresh_after(previous, user_id, force, margin_seconds))
+            self._in_flight[user_id] = (task, force)
+            task.add_done_callback(
+                lambda done: self._forget(user_id, done))
+        # `shield` para que cancelar a un llamador no cancele a los demás.
+        return await asyncio.shield(task)
+
+    def _forget(self, user_id: int, task: asyncio.Task) -> None:
+        in_flight = self._in_flight.get(user_id)
+        if in_flight is not None and in_flight[0] is task:
+            del self._in_flight[user_id]
+
+    async def _refresh_after(self, previous: asyncio.Task | None, user_id: int, force: bool, margin_seconds: float) -> GoogleToken:
+        if previous is not None:
+            # Solo se espera a que termine; su resultado o error es de sus llamadores.
+            await asyncio.wait([previous])
+        return await self._refresh(user_id, force, margin_seconds)
+
+    async def _refresh(self, user_id: int, force: bool, margin_seconds: float) -> GoogleToken:
+        # Lectura corta: la sesión se cierra antes de llamar a Google para
+        # no retener una conexión del pool (ni, en SQLite, un bloqueo)
+        # durante la ida y vuelta por la red.
+        async with self.session_maker() as session:
+            user = await session.get(User, user_id)
+        if user is None:
+            raise GoogleTokenError("El usuario no existe.", retryable=False)
+
+        # Otro proceso puede haberlo refrescado ya.
+        if not force and user.google_access_token and not needs_refresh(user.google_token_expires_at, margin_seconds):
+            return GoogleToken(user.google_access_token, _as_utc(user.google_token_expires_at))
+
+        refresh_token = user.google_refresh_token
+        if not refresh_token:
+            raise GoogleTokenError(
+                "El usuario no tiene un refresh token de Google.", retryable=False)
+
+        data = {
+            "grant_type": "refresh_token",
+            "refresh_token": refresh_token,
+            "client_id": GOOGLE_CLIENT_ID,
+            "client_secret": GOOGLE_CLIENT_SECRET,
+        }
+        try:
+            response = await self.http_client.post(GOOGLE_TOKEN_URL, data=data)
+        except httpx.TransportError as e:
+            raise GoogleTokenError(
+                f"No se pudo contactar con Google: {e!r}") from e
+
+        if response.status_code != 200:
+            error = None
+            if response.headers.get("content-type", "").startswith("application/json"):
+                try:
+                    error = response.json().get("error")
+                except (ValueError, AttributeError):
+                    error = None
+            if error == "invalid_grant":
+                # Acceso revocado: no tiene sentido reintentar con este token.
+                # Solo se borra si sigue siendo el mismo (el usuario puede
+                # haber vuelto a iniciar sesión mientras tanto).
+                await self._save_token(user_id, refresh_token, {"google_refresh_token": None})
+            raise GoogleTokenError(
+                f"Google rechazó el refresco del token: {response.text}",
+                retryable=response.status_code == 429 or response.status_code >= 500,
+            )
+
+        try:
+            token = response.json()
+            access_token = token["access_token"]
+            expires_in = float(token.get("expires_in", 0))
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            raise GoogleTokenError(
+                f"Respuesta inesperada de Google al refrescar el token: {response.text[:200]}") from e
+
+        values = {
+            "google_access_token": access_token,
+            "google_token_expires_at": datetime.now(timezone.utc) + timedelta(seconds=expires_in),
+        }
+        if token.get("refresh_token"):
+            values["google_refresh_token"] = token["refresh_token"]
+        await self._save_token(user_id, None, values)
+
+        return GoogleToken(values["google_access_token"], values["google_token_expires_at"])
+
+    async def _save_token(self, user_id: int, refresh_token: str | None, values: dict) -> None:
+        """
+        Guarda `values` en una transacción corta con un UPDATE por clave
+        primaria. Con `refresh_token`, solo si el usuario aún tiene ese.
+        """
+        statement = update(User).where(User.id == user_id).values(**values)
+        if refresh_token is not None:
+            statement = statement.where(User.google_refresh_token == refresh_token)
+        async with self.session_maker() as session:
+            await session.exec(statement)
+            await session.commit()
+        invalidate_cached_user(user_id)
+
+    async def sweep(self) -> int:
+        """
+        Refresca por adelantado los tokens que caducan pronto de los
+        usuarios con tareas de calendario pendientes, que son los que el
+        worker va a necesitar. El resto se refresca bajo demanda: refrescar
+        cada hora las cuentas inactivas solo gasta cuota de Google.
+        Filtra por `google_refresh_token` (indexado) y procesa en lotes con
+        concurrencia acotada. Devuelve cuántos tokens se refrescaron.
+        """
+        users_with_pending_sync = select(CalendarSyncTask.user_id).where(
+            CalendarSyncTask.status.in_((CalendarTaskStatus.PENDING, CalendarTaskStatus.IN_PROGRESS)))
+        horizon = datetime.now(timezone.utc) + \
+            timedelta(seconds=GOOGLE_TOKEN_SWEEP_LOOKAHEAD_SECONDS)
+        semaphore = asyncio.Semaphore(GOOGLE_TOKEN_SWEEP_CONCURRENCY)
+        refreshed = 0
+        last_id = 0
+
+        async def refresh_one(user_id: int) -> bool:
+            async with semaphore:
+                try:
+                    await self.refresh(
+                        user_id, margin_seconds=GOOGLE_TOKEN_SWEEP_LOOKAHEAD_SECONDS)
+                    return True
+                except GoogleTokenError as err:
+                    print(
+                        f"No se pudo refrescar el token del usuario {user_id}: {err}")
+                    return False
+
+        while True:
+            statement = select(User.id).where(
+                User.google_refresh_token.is_not(None),
+                User.google_token_expires_at <= horizon,
+                User.id.in_(users_with_pending_sync),
+                User.id > last_id
+            ).order_by(User.id).limit(GOOGLE_TOKEN_SWEEP_BATCH_SIZE)
+
+            async with self.session_maker() as session:
+                user_ids = (await session.exec(statement)).all()
+
+            if not user_ids:
+                return refreshed
+
+            results = await asyncio.gather(*(refresh_one(user_id) for user_id in user_ids))
+            refreshed += sum(results)
+            last_id = user_ids[-1]
+
+    def start(self) -> None:
+        self._sweeper = asyncio.create_task(self._run_sweeper())
+
+    async def stop(self) -> None:
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            try:
+                await self._sweeper
+            except asyncio.CancelledError:
+                pass
+
+    async def _run_sweeper(self) -> None:
+        while True:
+            try:
+                await self.sweep()
+            except Exception as err:
+                print(f"Error en el barrido de tokens de Google: {err!r}")
+            await asyncio.sleep(GOOGLE_TOKEN_SWEEP_INTERVAL_SECONDS)
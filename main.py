@@ -1,7 +1,15 @@
 from routers.auth import router as auth_router
 from routers.users import router as users_router
 from routers.habits import router as habits_router
-from database import create_db_and_tables
+from routers.sync import router as sync_router
+from database import async_session_maker, create_db_and_tables, describe_engine, engine
+from calendar_worker import CalendarSyncWorker
+from tracking_buffer import TRACK_WRITE_BEHIND, TrackingBuffer
+from write_queue import GROUP_COMMIT_ENABLED, GroupCommitWriter
+from google_token_services import GoogleTokenManager
+from utils.http_utils import create_http_client
+from utils.metrics_utils import MetricsMiddleware, metrics_response
+from utils.response_utils import ORJSONResponse
 import os
 from fastapi import FastAPI
 from starlette.middleware.sessions import SessionMiddleware
@@ -16,13 +24,40 @@ load_dotenv()
 async def lifespan(app: FastAPI):
     """
     Gestor de contexto para la aplicación.
-    Se ejecuta al inicio para crear la base de datos y las tablas.
+    Se ejecuta al inicio para crear la base de datos y las tablas, abrir el
+    cliente HTTP compartido y arrancar el gestor de tokens de Google y el
+    worker de sincronización de calendario (y, si están activados, el buffer
+    write-behind de `/track` y el escritor de group commit); al cerrar, los
+    detiene, vuelca el progreso pendiente y libera el pool de conexiones.
     """
     print("Iniciando aplicación y creando base de datos...")
-    create_db_and_tables()
+    await create_db_and_tables()
+    print(f"Perfil del motor de base de datos: {await describe_engine(engine)}")
+    app.state.http_client = create_http_client()
+    app.state.token_manager = GoogleTokenManager(
+        async_session_maker, app.state.http_client)
+    app.state.token_manager.start()
+    app.state.calendar_worker = CalendarSyncWorker(
+        async_session_maker, app.state.http_client, app.state.token_manager)
+    app.state.calendar_worker.start()
+    app.state.tracking_buffer = None
+    if TRACK_WRITE_BEHIND:
+        app.state.tracking_buffer = TrackingBuffer(async_session_maker)
+        app.state.tracking_buffer.start()
+    app.state.write_queue = None
+    if GROUP_COMMIT_ENABLED:
+        app.state.write_queue = GroupCommitWriter(async_session_maker)
+        app.state.write_queue.start()
     yield
-    # TODO: Añadir limpieza al cerrar la aplicación
     print("Apagando aplicación...")
+    if app.state.tracking_buffer is not None:
+        await app.state.tracking_buffer.stop()
+    if app.state.write_queue is not None:
+        await app.state.write_queue.stop()
+    await app.state.calendar_worker.stop()
+    await app.state.token_manager.stop()
+    await app.state.http_client.aclose()
+    await engine.dispose()
 
 
 app = FastAPI(
@@ -30,6 +65,7 @@ app = FastAPI(
     description="API para gestionar hábitos, notificaciones y recordatorios.",
     lifespan=lifespan,
     version="0.1.0",
+    default_response_class=ORJSONResponse,
 )
 
 
@@ -52,12 +88,25 @@ app.add_middleware(
     secret_key=os.getenv("SECRET_KEY")
 )
 
+# Se añade el último para envolver a los demás y medir la petición entera.
+app.add_middleware(MetricsMiddleware)
+
 
 @app.get("/")
 def read_root():
     return {"mensaje": "Bienvenido a la API de la App de Hábitos"}
 
 
+@app.get("/metrics", include_in_schema=False)
+async def read_metrics():
+    """
+    Métricas en formato Prometheus: latencia por ruta y sentencias SQL y
+    tiempo de base de datos por petición.
+    """
+    return metrics_response()
+
+
 app.include_router(auth_router)
 app.include_router(users_router)
 app.include_router(habits_router)
+app.include_router(sync_router)
@@ -0,0 +1,128 @@
+"""
+Migraciones de esquema para bases de datos creadas con versiones
+anteriores de la app. `create_all` solo crea las tablas que faltan: no
+añade columnas, índices ni restricciones a las que ya existen.
+
+Cada paso mira el esquema real y no hace nada si ya está aplicado, así
+que todos se ejecutan en cada arranque (tras `create_all`, en la misma
+transacción) y una base de datos nueva los atraviesa sin cambios.
+"""
+from sqlalchemy import Column, inspect
+from sqlalchemy.engine import Connection
+from sqlalchemy.types import SchemaType
+
+from models.habit_models import Habit, HabitCompletion
+from models.user_models import User
+
+
+def _has_unique(connection: Connection, table_name: str, column_names: list[str]) -> bool:
+    inspector = inspect(connection)
+    constraints = inspector.get_unique_constraints(table_name)
+    indexes = [index for index in inspector.get_indexes(table_name) if index["unique"]]
+    return any(item["column_names"] == column_names for item in constraints + indexes)
+
+
+def _add_column(connection: Connection, column: Column, default: str | None = None) -> None:
+    """
+    Añade `column` a su tabla si aún no la tiene, con el tipo del modelo.
+    Con `default` (SQL literal) la columna se crea NOT NULL con ese valor
+    para las filas existentes; sin él, admite nulos.
+    """
+    table = column.table
+    inspector = inspect(connection)
+    if not inspector.has_table(table.name):
+        return
+    if column.name in {existing["name"] for existing in inspector.get_columns(table.name)}:
+        return
+
+    # Los enum nativos (PostgreSQL) necesitan su tipo antes que la columna.
+    if isinstance(column.type, SchemaType):
+        column.type.create(connection, checkfirst=True)
+
+    preparer = connection.dialect.identifier_preparer
+    ddl = (f"ALTER TABLE {preparer.format_table(table)} ADD COLUMN "
+           f"{preparer.format_column(column)} {column.type.compile(connection.dialect)}")
+    if default is not None:
+        ddl += f" NOT NULL DEFAULT {default}"
+    print(f"Migración: añadiendo la columna {table.name}.{column.name}...")
+    connection.exec_driver_sql(ddl)
+
+
+def _unique_completion_per_day(connection: Connection) -> None:
+    """
+    Una sola completitud por (hábito, fecha): los upserts de `/track` y
+    de los lotes usan ON CONFLICT sobre esas columnas. Antes de crear el
+    índice se fusionan los duplicados que pudo dejar la versión anterior:
+    se conserva la fila más antigua con la suma de los `value`.
+    """
+    table = HabitCompletion.__table__
+    if not inspect(connection).has_table(table.name):
+        return
+    if _has_unique(connection, table.name, ["habit_id", "completion_date"]):
+        return
+
+    print("Migración: fusionando completitudes duplicadas por (hábito, fecha)...")
+    connection.exec_driver_sql(
+        "UPDATE habitcompletion SET value = ("
+        " SELECT SUM(duplicate.value) FROM habitcompletion AS duplicate"
+        " WHERE duplicate.habit_id = habitcompletion.habit_id"
+        " AND duplicate.completion_date = habitcompletion.completion_date)"
+        " WHERE id IN (SELECT MIN(id) FROM habitcompletion WHERE habit_id IS NOT NULL"
+        " GROUP BY habit_id, completion_date HAVING COUNT(*) > 1)"
+    )
+    connection.exec_driver_sql(
+        "DELETE FROM habitcompletion WHERE habit_id IS NOT NULL AND id NOT IN ("
+        " SELECT MIN(id) FROM habitcompletion WHERE habit_id IS NOT NULL"
+        " GROUP BY habit_id, completion_date)"
+    )
+    connection.exec_driver_sql(
+        "CREATE UNIQUE INDEX uq_habitcompletion_habit_date"
+        " ON habitcompletion (habit_id, completion_date)"
+    )
+
+
+def _habit_user_index(connection: Connection) -> None:
+    """
+    Índice de `habit.user_id`, en el que se apoyan los listados paginados
+    de hábitos de un usuario.
+    """
+    table = Habit.__table__
+    if not inspect(connection).has_table(table.name):
+        return
+    for index in table.indexes:
+        if index.name == "ix_habit_user_id":
+            index.create(connection, checkfirst=True)
+
+
+def _habit_calendar_columns(connection: Connection) -> None:
+    """
+    Estado de la sincronización con Google Calendar y el ID del evento
+    remoto de cada hábito.
+    """
+    _add_column(connection, Habit.__table__.c.calendar_sync_status)
+    _add_column(connection, Habit.__table__.c.google_event_id)
+
+
+def _user_data_version(connection: Connection) -> None:
+    """
+    Versión de datos del usuario, de la que salen los ETag. Las filas
+    existentes empiezan en 0, como los usuarios nuevos.
+    """
+    _add_column(connection, User.__table__.c.data_version, default="0")
+
+
+MIGRATIONS = [
+    _unique_completion_per_day,
+    _habit_user_index,
+    _habit_calendar_columns,
+    _user_data_version,
+]
+
+
+def run_migrations(connection: Connection) -> None:
+    """
+    Aplica en orden los pasos pendientes. Se llama con `run_sync` desde
+    `create_db_and_tables`.
+    """
+    for migration in MIGRATIONS:
+        migration(connection)
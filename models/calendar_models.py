@@ -0,0 +1,40 @@
+from enum import Enum
+from sqlmodel import Field, SQLModel
+from datetime import datetime, timezone
+
+
+class CalendarOperation(str, Enum):
+    CREATE = "create"
+    UPDATE = "update"
+    DELETE = "delete"
+
+
+class CalendarTaskStatus(str, Enum):
+    PENDING = "pending"
+    IN_PROGRESS = "in_progress"
+    DONE = "done"
+    FAILED = "failed"
+
+
+class CalendarSyncTask(SQLModel, table=True):
+    """
+    Bandeja de salida (outbox) de operaciones pendientes contra Google
+    Calendar. Se escribe en la misma transacción que el cambio del hábito
+    y la vacía el worker en segundo plano.
+    `habit_id` no es clave foránea a propósito: la tarea debe sobrevivir
+    al borrado del hábito.
+    """
+    id: int | None = Field(default=None, primary_key=True)
+    user_id: int = Field(foreign_key="user.id", index=True)
+    habit_id: int = Field(index=True)
+    operation: CalendarOperation = Field(default=CalendarOperation.CREATE)
+    # Para borrados: el id del evento remoto, porque el hábito ya no existe.
+    remote_event_id: str | None = Field(default=None)
+    status: CalendarTaskStatus = Field(
+        default=CalendarTaskStatus.PENDING, index=True)
+    attempts: int = Field(default=0)
+    next_attempt_at: datetime = Field(
+        default_factory=lambda: datetime.now(timezone.utc), index=True)
+    last_error: str | None = Field(default=None)
+    created_at: datetime = Field(
+        default_factory=lambda: datetime.now(timezone.utc))
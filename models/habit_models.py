@@ -1,8 +1,9 @@
 from enum import Enum
-from sqlmodel import Field, Relationship, SQLModel
+from sqlmodel import Field, Relationship, SQLModel, UniqueConstraint
 from datetime import datetime, timezone, date, time
 from typing import List, Optional, TYPE_CHECKING
 from models.user_models import User
+from utils.bitmap_utils import YEAR_BITMAP_BYTES
 
 
 class HabitType(str, Enum):
@@ -11,6 +12,12 @@ class HabitType(str, Enum):
     TIMER = "timer"
 
 
+class CalendarSyncStatus(str, Enum):
+    PENDING = "pending"
+    SYNCED = "synced"
+    FAILED = "failed"
+
+
 class Habit(SQLModel, table=True):
     id: int | None = Field(default=None, primary_key=True)
     name: str = Field(index=True)
@@ -22,16 +29,93 @@ class Habit(SQLModel, table=True):
     created_at: datetime = Field(
         default_factory=lambda: datetime.now(timezone.utc))
     scheduled_time: time | None = Field(default=None)
-    user_id: int | None = Field(default=None, foreign_key="user.id")
+    calendar_sync_status: CalendarSyncStatus | None = Field(default=None)
+    google_event_id: str | None = Field(default=None)
+    user_id: int | None = Field(
+        default=None, foreign_key="user.id", index=True)
     user: Optional[User] = Relationship(back_populates="habits")
     completions: List["HabitCompletion"] = Relationship(
         back_populates="habit", sa_relationship_kwargs={"cascade": "all, delete"}
     )
+    stats: Optional["HabitStatsSnapshot"] = Relationship(
+        back_populates="habit", sa_relationship_kwargs={"cascade": "all, delete", "uselist": False}
+    )
+    bitmaps: List["HabitCompletionBitmap"] = Relationship(
+        back_populates="habit", sa_relationship_kwargs={"cascade": "all, delete"}
+    )
+    weekly_rollups: List["HabitWeeklyRollup"] = Relationship(
+        back_populates="habit", sa_relationship_kwargs={"cascade": "all, delete"}
+    )
+    monthly_rollups: List["HabitMonthlyRollup"] = Relationship(
+        back_populates="habit", sa_relationship_kwargs={"cascade": "all, delete"}
+    )
 
 
 class HabitCompletion(SQLModel, table=True):
+    __table_args__ = (
+        UniqueConstraint("habit_id", "completion_date",
+                         name="uq_habitcompletion_habit_date"),
+    )
+
     id: int | None = Field(default=None, primary_key=True)
     completion_date: date = Field(index=True)
     value: int | None = Field(default=None)
     habit_id: int | None = Field(default=None, foreign_key="habit.id")
     habit: Optional[Habit] = Relationship(back_populates="completions")
+
+
+class HabitStatsSnapshot(SQLModel, table=True):
+    """
+    Proyección persistida de las estadísticas de un hábito. Se mantiene
+    al día en cada escritura de completitudes para que leerla sea O(1).
+    `current_run` es la longitud de la racha que termina en
+    `last_completion_date`, independientemente de la fecha actual.
+    """
+    habit_id: int | None = Field(
+        default=None, primary_key=True, foreign_key="habit.id")
+    current_run: int = Field(default=0)
+    longest_streak: int = Field(default=0)
+    total_completions: int = Field(default=0)
+    last_completion_date: date | None = Field(default=None)
+    habit: Optional[Habit] = Relationship(back_populates="stats")
+
+
+class HabitCompletionBitmap(SQLModel, table=True):
+    """
+    Completitudes de un hábito simple en un año, un bit por día
+    (bit 0 = 1 de enero). Es una proyección de `HabitCompletion`, que sigue
+    siendo la fuente de verdad; los hábitos con `value` no la usan.
+    """
+    habit_id: int | None = Field(
+        default=None, primary_key=True, foreign_key="habit.id")
+    year: int = Field(primary_key=True)
+    bits: bytes = Field(default=bytes(YEAR_BITMAP_BYTES))
+    habit: Optional[Habit] = Relationship(back_populates="bitmaps")
+
+
+class HabitWeeklyRollup(SQLModel, table=True):
+    """
+    Número de completitudes y suma de `value` de un hábito en una semana
+    ISO. Es una proyección de `HabitCompletion` que se actualiza con cada
+    escritura; `rollup_services` puede reconstruirla desde las filas.
+    """
+    habit_id: int | None = Field(
+        default=None, primary_key=True, foreign_key="habit.id")
+    iso_year: int = Field(primary_key=True)
+    iso_week: int = Field(primary_key=True)
+    completions: int = Field(default=0)
+    total_value: int = Field(default=0)
+    habit: Optional[Habit] = Relationship(back_populates="weekly_rollups")
+
+
+class HabitMonthlyRollup(SQLModel, table=True):
+    """
+    Lo mismo que `HabitWeeklyRollup`, por mes natural.
+    """
+    habit_id: int | None = Field(
+        default=None, primary_key=True, foreign_key="habit.id")
+    year: int = Field(primary_key=True)
+    month: int = Field(primary_key=True)
+    completions: int = Field(default=0)
+    total_value: int = Field(default=0)
+    habit: Optional[Habit] = Relationship(back_populates="monthly_rollups")
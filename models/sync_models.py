@@ -0,0 +1,38 @@
+from enum import Enum
+from sqlalchemy import Index
+from sqlmodel import Field, SQLModel
+from datetime import date
+
+
+class ChangeEntity(str, Enum):
+    HABIT = "habit"
+    COMPLETION = "completion"
+
+
+class ChangeOperation(str, Enum):
+    UPSERT = "upsert"
+    DELETE = "delete"
+
+
+class SyncChange(SQLModel, table=True):
+    """
+    Registro de cambios de un usuario para la sincronización incremental.
+    `version` es la `data_version` del usuario en la transacción que hizo
+    el cambio: se incrementa con un UPDATE que bloquea la fila del usuario,
+    así que las versiones de un usuario se confirman en orden y un cursor
+    (version, id) nunca se salta un cambio que tarde en confirmarse.
+    Las completitudes se identifican por (habit_id, completion_date).
+    `habit_id` no es clave foránea a propósito: el registro de un borrado
+    debe sobrevivir al hábito.
+    """
+    __table_args__ = (
+        Index("ix_syncchange_user_version", "user_id", "version", "id"),
+    )
+
+    id: int | None = Field(default=None, primary_key=True)
+    user_id: int = Field(foreign_key="user.id")
+    version: int
+    entity: ChangeEntity
+    operation: ChangeOperation = Field(default=ChangeOperation.UPSERT)
+    habit_id: int
+    completion_date: date | None = Field(default=None)
@@ -19,4 +19,7 @@ class User(SQLModel, table=True):
     created_at: datetime = Field(
         default_factory=lambda: datetime.now(timezone.utc))
     is_active: bool = Field(default=True)
+    # Se incrementa con cada escritura sobre los datos del usuario; de ella
+    # salen los ETag de las lecturas.
+    data_version: int = Field(default=0)
     habits: List["Habit"] = Relationship(back_populates="user")
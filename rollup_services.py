@@ -0,0 +1,193 @@
+import argparse
+import asyncio
+import calendar
+from datetime import date, timedelta
+from typing import Iterable
+from sqlmodel import SQLModel, delete, select, tuple_
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from database import async_session_maker, create_db_and_tables, dialect_insert, engine
+from models.habit_models import Habit, HabitCompletion, HabitMonthlyRollup, HabitWeeklyRollup
+from schemas.habit_schemas import PeriodType
+
+
+# Hábitos por bloque al reconstruir: se leen sus completitudes de una vez.
+ROLLUP_REBUILD_BATCH_SIZE = 200
+
+_WEEK_COLUMNS = ("iso_year", "iso_week")
+_MONTH_COLUMNS = ("year", "month")
+
+
+def week_key(completion_date: date) -> tuple[int, int]:
+    iso_calendar = completion_date.isocalendar()
+    return iso_calendar.year, iso_calendar.week
+
+
+def month_key(completion_date: date) -> tuple[int, int]:
+    return completion_date.year, completion_date.month
+
+
+def _aggregate(changes: Iterable[tuple[int, date, int, int]]) -> tuple[dict, dict]:
+    """
+    Agrupa (habit_id, fecha, completitudes, value) por semana ISO y por mes.
+    """
+    weeks: dict[tuple[int, int, int], list[int]] = {}
+    months: dict[tuple[int, int, int], list[int]] = {}
+    for habit_id, completion_date, completions, total_value in changes:
+        for totals, key in ((weeks, (habit_id, *week_key(completion_date))),
+                            (months, (habit_id, *month_key(completion_date)))):
+            entry = totals.setdefault(key, [0, 0])
+            entry[0] += completions
+            entry[1] += total_value
+    return weeks, months
+
+
+async def _upsert(session: AsyncSession, model: type[SQLModel], columns: tuple[str, str], totals: dict, accumulate: bool) -> None:
+    """
+    Escribe los agregados con un único executemany de INSERT ... ON
+    CONFLICT DO UPDATE. Con `accumulate` se suman a los guardados (en la
+    base de datos, así dos escrituras simultáneas no se pisan); si no, los
+    sustituyen.
+    """
+    params = [
+        {"habit_id": habit_id, columns[0]: first, columns[1]: second,
+         "completions": completions, "total_value": total_value}
+        for (habit_id, first, second), (completions, total_value) in totals.items()
+        if not accumulate or completions or total_value
+    ]
+    if not params:
+        return
+
+    insert = dialect_insert(session)
+    statement = insert(model)
+    if accumulate:
+        set_ = {"completions": model.completions + statement.excluded.completions,
+                "total_value": model.total_value + statement.excluded.total_value}
+    else:
+        set_ = {"completions": statement.excluded.completions,
+                "total_value": statement.excluded.total_value}
+    statement = statement.on_conflict_do_update(
+        index_elements=["habit_id", *columns], set_=set_)
+    await session.exec(statement, params=params)
+
+
+async def register_rollup_deltas(session: AsyncSession, changes: Iterable[tuple[int, date, int, int]]) -> None:
+    """
+    Aplica a los agregados semanales y mensuales los cambios ya escritos en
+    `HabitCompletion`, como tuplas (habit_id, fecha, Δcompletitudes, Δvalue):
+    una fila nueva es (+1, value), una borrada (-1, -value) y un cambio de
+    valor (0, Δvalue). Son dos sentencias en total, sea cual sea el número
+    de hábitos y fechas.
+    """
+    weeks, months = _aggregate(changes)
+    await _upsert(session, HabitWeeklyRollup, _WEEK_COLUMNS, weeks, accumulate=True)
+    await _upsert(session, HabitMonthlyRollup, _MONTH_COLUMNS, months, accumulate=True)
+
+
+async def refresh_rollup_periods(session: AsyncSession, habit_id: int, completion_date: date) -> None:
+    """
+    Recalcula desde las filas la semana y el mes de `completion_date`. Es
+    para los upserts, donde no se sabe si la fila era nueva: lee como mucho
+    las completitudes de 37 días por el índice único (habit_id, completion_date).
+    """
+    week_start = completion_date - timedelta(days=completion_date.weekday())
+    week_end = week_start + timedelta(days=6)
+    month_start = completion_date.replace(day=1)
+    month_end = completion_date.replace(
+        day=calendar.monthrange(completion_date.year, completion_date.month)[1])
+
+    statement = select(HabitCompletion.completion_date, HabitCompletion.value).where(
+        HabitCompletion.habit_id == habit_id,
+        HabitCompletion.completion_date >= min(week_start, month_start),
+        HabitCompletion.completion_date <= max(week_end, month_end)
+    )
+    week, month = [0, 0], [0, 0]
+    for row_date, value in await session.exec(statement):
+        for totals, start, end in ((week, week_start, week_end), (month, month_start, month_end)):
+            if start <= row_date <= end:
+                totals[0] += 1
+                totals[1] += value or 0
+
+    await _upsert(session, HabitWeeklyRollup, _WEEK_COLUMNS,
+                  {(habit_id, *week_key(completion_date)): week}, accumulate=False)
+    await _upsert(session, HabitMonthlyRollup, _MONTH_COLUMNS,
+                  {(habit_id, *month_key(completion_date)): month}, accumulate=False)
+
+
+async def rebuild_rollups(session: AsyncSession, habit_ids: list[int] | None = None) -> int:
+    """
+    Reconstruye desde `HabitCompletion` los agregados de los hábitos
+    indicados (todos si es `None`), por bloques de
+    `ROLLUP_REBUILD_BATCH_SIZE` hábitos. Sirve para rellenar los datos
+    anteriores a los agregados o repararlos. Devuelve el número de hábitos
+    procesados; no hace commit.
+    """
+    if habit_ids is None:
+        habit_ids = list((await session.exec(select(Habit.id).order_by(Habit.id))).all())
+
+    for start in range(0, len(habit_ids), ROLLUP_REBUILD_BATCH_SIZE):
+        batch = habit_ids[start:start + ROLLUP_REBUILD_BATCH_SIZE]
+        await session.exec(delete(HabitWeeklyRollup).where(HabitWeeklyRollup.habit_id.in_(batch)))
+        await session.exec(delete(HabitMonthlyRollup).where(HabitMonthlyRollup.habit_id.in_(batch)))
+
+        rows = await session.exec(select(
+            HabitCompletion.habit_id, HabitCompletion.completion_date, HabitCompletion.value
+        ).where(HabitCompletion.habit_id.in_(batch)))
+        weeks, months = _aggregate(
+            (habit_id, completion_date, 1, value or 0) for habit_id, completion_date, value in rows)
+        await _upsert(session, HabitWeeklyRollup, _WEEK_COLUMNS, weeks, accumulate=False)
+        await _upsert(session, HabitMonthlyRollup, _MONTH_COLUMNS, months, accumulate=False)
+
+    return len(habit_ids)
+
+
+async def get_habit_periods(session: AsyncSession, habit_id: int, period: PeriodType, start_date: date, end_date: date) -> list[dict]:
+    """
+    Devuelve los periodos con alguna completitud que se solapan con
+    [start_date, end_date], leídos solo de los agregados.
+    """
+    if period == PeriodType.WEEK:
+        model, first, second, key = HabitWeeklyRollup, HabitWeeklyRollup.iso_year, HabitWeeklyRollup.iso_week, week_key
+    else:
+        model, first, second, key = HabitMonthlyRollup, HabitMonthlyRollup.year, HabitMonthlyRollup.month, month_key
+
+    statement = select(first, second, model.completions, model.total_value).where(
+        model.habit_id == habit_id,
+        model.completions > 0,
+        tuple_(first, second) >= tuple_(*key(start_date)),
+        tuple_(first, second) <= tuple_(*key(end_date))
+    ).order_by(first, second)
+
+    periods = []
+    for first_value, second_value, completions, total_value in await session.exec(statement):
+        if period == PeriodType.WEEK:
+            period_start = date.fromisocalendar(first_value, second_value, 1)
+            period_end = period_start + timedelta(days=6)
+        else:
+            period_start = date(first_value, second_value, 1)
+            period_end = period_start.replace(
+                day=calendar.monthrange(first_value, second_value)[1])
+        periods.append({"period_start": period_start, "period_end": period_end,
+                        "completions": completions, "total_value": total_value})
+    return periods
+
+
+async def _main(args: argparse.Namespace) -> None:
+    await create_db_and_tables()
+    async with async_session_maker() as session:
+        count = await rebuild_rollups(session, args.habit_id)
+        await session.commit()
+    print(f"Agregados semanales y mensuales reconstruidos para {count} hábitos")
+    await engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Reconstruye los agregados semanales y mensuales desde las completitudes.")
+    parser.add_argument("--habit-id", type=int, action="append",
+                        help="Hábito a reconstruir (repetible); todos si se omite.")
+    asyncio.run(_main(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
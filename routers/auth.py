@@ -3,12 +3,15 @@ import os
 from fastapi import APIRouter, Depends, HTTPException, status
 from authlib.integrations.starlette_client import OAuth
 from starlette.requests import Request
-from sqlmodel import Session, select
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 from database import get_session
 from models.user_models import User
 from security import create_access_token, create_jwt_tokens, oauth2_scheme, SECRET_KEY, ALGORITHM
 from schemas.user_schemas import TokenRefreshResponse
+from utils.auth_utils import invalidate_cached_user
+from write_queue import run_write
 from jose import jwt, JWTError
 
 from dotenv import load_dotenv
@@ -33,8 +36,8 @@ FRONTEND_URL = os.getenv("FRONTEND_URL", "http://localhost:3000")
 
 
 @router.post("/refresh-token", response_model=TokenRefreshResponse)
-def refresh_access_token(
-    session: Session = Depends(get_session),
+async def refresh_access_token(
+    session: AsyncSession = Depends(get_session),
     token: str = Depends(oauth2_scheme),
 ):
     """
@@ -58,7 +61,7 @@ def refresh_access_token(
     except JWTError:
         raise credentials_exception
 
-    user = session.get(User, user_id)
+    user = await session.get(User, user_id)
     if user is None or not user.is_active:
         raise credentials_exception
 
@@ -82,7 +85,7 @@ async def login_via_google(request: Request):
 
 
 @router.get("/callback")
-async def auth_via_google(request: Request, db: Session = Depends(get_session)):
+async def auth_via_google(request: Request, db: AsyncSession = Depends(get_session)):
     """
     Callback de Google. Procesa la info del usuario, lo crea/actualiza en la BD
     y devuelve los tokens JWT de acceso y refresco.
@@ -103,39 +106,34 @@ async def auth_via_google(request: Request, db: Session = Depends(get_session)):
         )
 
     email = user_info.get('email')
-    statement = select(User).where(User.email == email)
-    db_user = db.exec(statement).first()
-
-    if not db_user:
-        new_user = User(
-            google_id=user_info.get("sub"),
-            email=email,
-            full_name=user_info.get('name'),
-            picture_url=user_info.get('picture'),
-        )
-        db.add(new_user)
-        db.commit()
-        db.refresh(new_user)
-        db_user = new_user
-    else:
+    expires_in = token.get('expires_in', 0)
+
+    async def upsert_user(db: AsyncSession) -> int:
+        statement = select(User).where(User.email == email)
+        db_user = (await db.exec(statement)).first()
+
+        if not db_user:
+            db_user = User(
+                google_id=user_info.get("sub"),
+                email=email,
+            )
         db_user.full_name = user_info.get('name')
         db_user.picture_url = user_info.get('picture')
-        db.add(db_user)
-        db.commit()
-        db.refresh(db_user)
 
-    db_user.google_access_token = token.get('access_token')
-    if token.get('refresh_token'):
-        db_user.google_refresh_token = token.get('refresh_token')
+        db_user.google_access_token = token.get('access_token')
+        if token.get('refresh_token'):
+            db_user.google_refresh_token = token.get('refresh_token')
 
-    expires_in = token.get('expires_in', 0)
-    db_user.google_token_expires_at = datetime.now(
-        timezone.utc) + timedelta(seconds=expires_in)
+        db_user.google_token_expires_at = datetime.now(
+            timezone.utc) + timedelta(seconds=expires_in)
+
+        db.add(db_user)
+        await db.flush()
+        return db_user.id
 
-    db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    user_id = await run_write(request, db, upsert_user)
+    invalidate_cached_user(user_id)
 
-    jwt_tokens = create_jwt_tokens(user_id=db_user.id)
+    jwt_tokens = create_jwt_tokens(user_id=user_id)
 
     return jwt_tokens
@@ -1,23 +1,56 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlmodel import Session, select
+import base64
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from sqlmodel import and_, select, tuple_
+from sqlmodel.ext.asyncio.session import AsyncSession
 from typing import List
-from datetime import date, timedelta
+from datetime import date, datetime, time, timedelta, timezone
 
 from database import get_session
-from models.habit_models import Habit, HabitCompletion
+from models.habit_models import Habit, HabitCompletion, HabitStatsSnapshot
+from models.calendar_models import CalendarOperation
+from models.sync_models import ChangeOperation
 from models.user_models import User
 from utils.auth_utils import get_current_user
-from schemas.habit_schemas import HabitCompletionCreate, HabitCreate, HabitRead, HabitUpdate, HabitCompletionRead, HabitTrack, HabitStats, HabitCompletionBulkCreate, BulkResponse
-
-from calendar_services import create_calendar_event_for_habit
+from utils.etag_utils import check_not_modified
+from utils.metrics_utils import set_query_budget
+from utils.response_utils import negotiated_response
+from utils.pagination_utils import NEXT_CURSOR_HEADER, decode_cursor, encode_cursor
+from schemas.habit_schemas import HabitCompletionCreate, HabitCreate, HabitRead, HabitUpdate, HabitCompletionRead, HabitTrack, HabitStats, HabitCompletionBulkCreate, BulkResponse, HabitDashboardItem, CalendarSyncResponse, HabitAnalytics, HabitHeatmap, ImportResponse, HabitBatchRequest, HabitBatchResponse, HabitPeriod, PeriodType
+
+from calendar_worker import enqueue_calendar_sync, notify_calendar_worker
+from stats_services import build_missing_snapshots, current_streak_from_snapshot, get_habit_stats_snapshot, register_completion_added, register_completion_removed, register_completion_upserted, register_completions_added
+from completion_services import import_completions, insert_completion_if_absent, insert_completions_ignoring_conflicts, upsert_completion_value
+from utils.import_utils import ImportFormatError, import_format, iter_lines, iter_spooled, parse_csv, parse_ndjson, spool_records
+from analytics_services import ANALYTICS_MAX_DATE, ANALYTICS_MIN_DATE, DEFAULT_ANALYTICS_DAYS, MAX_ANALYTICS_DAYS, get_habits_analytics
+from batch_services import apply_habit_batch
+from tracking_buffer import flush_pending_tracks
+from write_queue import run_write
+from sync_services import completion_changes, habit_change, record_changes
+from bitmap_services import discard_bitmaps, get_year_bitmap, register_bitmap_days
+from rollup_services import get_habit_periods, refresh_rollup_periods, register_rollup_deltas
+from utils.bitmap_utils import bitmap_to_int, count_days, day_index, days_in_year, longest_run, run_ending_at
 
 router = APIRouter(prefix="/habits", tags=["Habits"])
 
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+MAX_BATCH_OPERATIONS = 1000
+# Sentencias SQL que puede ejecutar un lote: unas fijas (propiedad, filas,
+# escrituras masivas) más las proyecciones de cada hábito afectado.
+BATCH_QUERY_BUDGET_BASE = 15
+BATCH_QUERY_BUDGET_PER_HABIT = 6
+
+# Columnas de las respuestas de las rutas de lectura más usadas: se leen
+# como filas planas y se serializan sin volver a validarlas.
+HABIT_READ_COLUMNS = [getattr(Habit, name) for name in HabitRead.model_fields]
+COMPLETION_READ_COLUMNS = [getattr(HabitCompletion, name)
+                           for name in HabitCompletionRead.model_fields]
+
 
 # --- Dependencia ---
-def get_valid_habit_for_user(
+async def get_valid_habit_for_user(
     *,
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_session),
     current_user: User = Depends(get_current_user),
     habit_id: int
 ) -> Habit:
@@ -25,7 +58,7 @@ def get_valid_habit_for_user(
     Dependencia que obtiene un hábito por ID y verifica que pertenezca
     al usuario autenticado. Devuelve el objeto Habit o lanza una excepción.
     """
-    habit = session.get(Habit, habit_id)
+    habit = await session.get(Habit, habit_id)
     if not habit:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Hábito no encontrado")
@@ -38,114 +71,357 @@ def get_valid_habit_for_user(
 @router.post("/", response_model=HabitRead)
 async def create_habit(
     *,
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_session),
     current_user: User = Depends(get_current_user),
+    request: Request,
     habit_in: HabitCreate
 ):
-    """Crea un nuevo hábito para el usuario autenticado."""
-    habit = Habit.model_validate(habit_in, update={"user_id": current_user.id})
-    session.add(habit)
-    session.commit()
-    session.refresh(habit)
+    """
+    Crea un nuevo hábito para el usuario autenticado.
+    Si se pide sincronizar con el calendario, la operación se encola en la
+    misma transacción y se responde enseguida con `calendar_sync_status`
+    en "pending"; el cliente puede consultar el hábito para ver el resultado.
+    """
+    async def create(session: AsyncSession) -> Habit:
+        habit = Habit.model_validate(habit_in, update={"user_id": current_user.id})
+        session.add(habit)
+        await session.flush()
+        # La proyección nace vacía con el hábito: así nunca hay que crearla
+        # a la vez desde dos lecturas.
+        session.add(HabitStatsSnapshot(habit_id=habit.id))
+
+        if habit_in.sync_to_calendar:
+            enqueue_calendar_sync(session, habit, CalendarOperation.CREATE)
+
+        await record_changes(session, current_user.id, [habit_change(habit.id)])
+        return habit
+
+    habit = await run_write(request, session, create)
 
     if habit_in.sync_to_calendar:
-        await create_calendar_event_for_habit(current_user, habit, date.today())
+        notify_calendar_worker(request.app)
 
     return habit
 
 
-@router.get("/", response_model=List[HabitRead])
-def get_user_habits(
+@router.get("/", response_model=List[HabitRead], dependencies=[Depends(flush_pending_tracks), Depends(check_not_modified)])
+async def get_user_habits(
     *,
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_session),
+    current_user: User = Depends(get_current_user),
+    request: Request,
+    response: Response,
+    from_date: date | None = Query(default=None, alias="from"),
+    to_date: date | None = Query(default=None, alias="to"),
+    cursor: str | None = None,
+    limit: int = Query(default=DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE)
+):
+    """
+    Obtiene los hábitos del usuario autenticado, paginados por ID.
+    `from`/`to` filtran por fecha de creación. Si hay más resultados, el
+    cursor de la siguiente página viene en la cabecera `X-Next-Cursor`.
+    Responde en MessagePack si se pide con `Accept: application/msgpack`.
+    """
+    statement = select(*HABIT_READ_COLUMNS).where(
+        Habit.user_id == current_user.id)
+
+    if from_date:
+        statement = statement.where(
+            Habit.created_at >= datetime.combine(from_date, time.min, tzinfo=timezone.utc))
+    if to_date:
+        statement = statement.where(
+            Habit.created_at < datetime.combine(to_date + timedelta(days=1), time.min, tzinfo=timezone.utc))
+    if cursor:
+        (last_id,) = decode_cursor(cursor, int)
+        statement = statement.where(Habit.id > last_id)
+
+    statement = statement.order_by(Habit.id).limit(limit + 1)
+    habits = [dict(row._mapping) for row in await session.exec(statement)]
+
+    if len(habits) > limit:
+        habits = habits[:limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(habits[-1]["id"])
+
+    return negotiated_response(request, habits, response)
+
+
+@router.get("/dashboard", response_model=List[HabitDashboardItem], dependencies=[Depends(flush_pending_tracks), Depends(check_not_modified)])
+async def get_habits_dashboard(
+    *,
+    session: AsyncSession = Depends(get_session),
     current_user: User = Depends(get_current_user)
 ):
-    """Obtiene todos los hábitos del usuario autenticado."""
-    statement = select(Habit).where(Habit.user_id == current_user.id)
-    habits = session.exec(statement).all()
-    return habits
+    """
+    Devuelve en una sola petición las estadísticas y el progreso de hoy de
+    todos los hábitos del usuario. Una única consulta une cada hábito con su
+    proyección de estadísticas y con la completitud de hoy.
+    """
+    today = date.today()
+
+    statement = select(Habit, HabitStatsSnapshot, HabitCompletion).outerjoin(
+        HabitStatsSnapshot, HabitStatsSnapshot.habit_id == Habit.id
+    ).outerjoin(
+        HabitCompletion,
+        and_(HabitCompletion.habit_id == Habit.id,
+             HabitCompletion.completion_date == today)
+    ).where(Habit.user_id == current_user.id).order_by(Habit.id)
+    rows = (await session.exec(statement)).all()
+
+    missing_ids = [habit.id for habit, snapshot, _ in rows if snapshot is None]
+    built_snapshots = await build_missing_snapshots(session, missing_ids)
+
+    dashboard = []
+    for habit, snapshot, today_completion in rows:
+        snapshot = snapshot or built_snapshots[habit.id]
+        dashboard.append(HabitDashboardItem(
+            habit=HabitRead.model_validate(habit),
+            current_streak=current_streak_from_snapshot(snapshot, today),
+            longest_streak=snapshot.longest_streak,
+            total_completions=snapshot.total_completions,
+            completed_today=today_completion is not None,
+            today_value=today_completion.value if today_completion else None
+        ))
+
+    if built_snapshots:
+        await session.commit()
+
+    return dashboard
+
+
+def _analytics_range(from_date: date | None, to_date: date | None) -> tuple[date, date]:
+    end_date = to_date or date.today()
+    start_date = from_date or end_date - \
+        timedelta(days=DEFAULT_ANALYTICS_DAYS - 1)
+    if start_date > end_date:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="`from` no puede ser posterior a `to`")
+    if start_date < ANALYTICS_MIN_DATE or end_date > ANALYTICS_MAX_DATE:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"El rango debe estar entre {ANALYTICS_MIN_DATE} y {ANALYTICS_MAX_DATE}")
+    if (end_date - start_date).days >= MAX_ANALYTICS_DAYS:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"El rango no puede superar los {MAX_ANALYTICS_DAYS} días")
+    return start_date, end_date
+
+
+@router.get("/analytics", response_model=List[HabitAnalytics], dependencies=[Depends(flush_pending_tracks), Depends(check_not_modified)])
+async def get_habits_analytics_for_user(
+    *,
+    session: AsyncSession = Depends(get_session),
+    current_user: User = Depends(get_current_user),
+    habit_ids: List[int] | None = Query(default=None, alias="habit_id"),
+    from_date: date | None = Query(default=None, alias="from"),
+    to_date: date | None = Query(default=None, alias="to")
+):
+    """
+    Analíticas de varios hábitos del usuario (todos si no se indica
+    ningún `habit_id`) con una sola consulta de completitudes.
+    Por defecto cubre los últimos `DEFAULT_ANALYTICS_DAYS` días.
+    """
+    start_date, end_date = _analytics_range(from_date, to_date)
+
+    statement = select(Habit).where(
+        Habit.user_id == current_user.id).order_by(Habit.id)
+    if habit_ids:
+        statement = statement.where(Habit.id.in_(habit_ids))
+    habits = list((await session.exec(statement)).all())
+
+    return await get_habits_analytics(session, habits, start_date, end_date)
 
 
-@router.get("/{habit_id}", response_model=HabitRead)
-def get_habit_by_id(habit: Habit = Depends(get_valid_habit_for_user)):
+@router.post("/calendar/sync", response_model=CalendarSyncResponse)
+async def sync_habits_to_calendar(
+    *,
+    session: AsyncSession = Depends(get_session),
+    current_user: User = Depends(get_current_user),
+    request: Request
+):
+    """
+    Sincroniza todos los hábitos del usuario con su calendario: un evento
+    recurrente por hábito. Los que ya tienen evento se actualizan en lugar
+    de recrearse. El worker envía las operaciones en lotes de hasta 50.
+    """
+    user_id = current_user.id
+
+    async def enqueue_all(session: AsyncSession) -> int:
+        statement = select(Habit).where(Habit.user_id == user_id)
+        habits = (await session.exec(statement)).all()
+
+        for habit in habits:
+            operation = CalendarOperation.UPDATE if habit.google_event_id else CalendarOperation.CREATE
+            enqueue_calendar_sync(session, habit, operation)
+
+        if habits:
+            await record_changes(session, user_id, [habit_change(habit.id) for habit in habits])
+        return len(habits)
+
+    enqueued = await run_write(request, session, enqueue_all)
+
+    if enqueued:
+        notify_calendar_worker(request.app)
+
+    return CalendarSyncResponse(operations_enqueued=enqueued)
+
+
+@router.post("/batch", response_model=HabitBatchResponse, dependencies=[Depends(flush_pending_tracks)])
+async def apply_habits_batch(
+    *,
+    session: AsyncSession = Depends(get_session),
+    current_user: User = Depends(get_current_user),
+    request: Request,
+    batch_in: HabitBatchRequest
+):
+    """
+    Aplica en una sola petición y una sola transacción una lista de
+    operaciones `complete`, `uncomplete` y `track` sobre varios hábitos,
+    pensada para que los clientes sin conexión reenvíen su cola al volver.
+    Las operaciones se aplican en orden y cada una tiene su resultado con
+    el código que habría devuelto su endpoint individual; las que fallan
+    no impiden aplicar las demás.
+    """
+    if len(batch_in.operations) > MAX_BATCH_OPERATIONS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Un lote admite como máximo {MAX_BATCH_OPERATIONS} operaciones."
+        )
+
+    set_query_budget(BATCH_QUERY_BUDGET_BASE + BATCH_QUERY_BUDGET_PER_HABIT *
+                     len({operation.habit_id for operation in batch_in.operations}))
+    user_id = current_user.id
+
+    async def apply(session: AsyncSession) -> list:
+        return await apply_habit_batch(session, user_id, batch_in.operations)
+
+    results = await run_write(request, session, apply)
+    applied = sum(1 for result in results if result.status_code < 300)
+    return HabitBatchResponse(applied=applied, failed=len(results) - applied, results=results)
+
+
+@router.get("/{habit_id}", response_model=HabitRead, dependencies=[Depends(flush_pending_tracks), Depends(check_not_modified)])
+async def get_habit_by_id(habit: Habit = Depends(get_valid_habit_for_user)):
     """Obtiene un hábito específico por su ID usando la dependencia."""
     return habit
 
 
 @router.patch("/{habit_id}", response_model=HabitRead)
-def update_habit_by_id(
+async def update_habit_by_id(
     *,
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_session),
+    request: Request,
     habit_in: HabitUpdate,
     habit: Habit = Depends(get_valid_habit_for_user)
 ):
     """
     Actualiza parcialmente un hábito por su ID.
+    Si el hábito está sincronizado con el calendario, se encola la
+    actualización de su evento recurrente.
     """
     update_data = habit_in.model_dump(exclude_unset=True)
-    habit.sqlmodel_update(update_data)
-    session.add(habit)
-    session.commit()
-    session.refresh(habit)
+    habit_id = habit.id
+
+    async def update_habit(session: AsyncSession) -> tuple[Habit, bool]:
+        # Se relee en la sesión de la escritura, que puede no ser la de la petición.
+        habit = await session.get(Habit, habit_id, populate_existing=True)
+        if habit is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Hábito no encontrado")
+        previous_type = habit.habit_type
+        habit.sqlmodel_update(update_data)
+        session.add(habit)
+
+        if habit.habit_type != previous_type:
+            await discard_bitmaps(session, habit.id)
+
+        calendar_synced = bool(habit.google_event_id or habit.calendar_sync_status is not None)
+        if update_data and calendar_synced:
+            enqueue_calendar_sync(session, habit, CalendarOperation.UPDATE)
+
+        if update_data:
+            await record_changes(session, habit.user_id, [habit_change(habit.id)])
+        await session.flush()
+        return habit, calendar_synced
+
+    habit, calendar_synced = await run_write(request, session, update_habit)
+
+    if update_data and calendar_synced:
+        notify_calendar_worker(request.app)
     return habit
 
 
 @router.delete("/{habit_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_habit_by_id(
+async def delete_habit_by_id(
     *,
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_session),
+    request: Request,
     habit: Habit = Depends(get_valid_habit_for_user)  # Y aquí también
 ):
-    """Elimina un hábito por su ID usando la dependencia."""
-    session.delete(habit)
-    session.commit()
+    """
+    Elimina un hábito por su ID usando la dependencia.
+    Si tenía un evento en el calendario, se encola su borrado.
+    """
+    habit_id = habit.id
+
+    async def delete_habit(session: AsyncSession) -> bool:
+        habit = await session.get(Habit, habit_id, populate_existing=True)
+        if habit is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Hábito no encontrado")
+        calendar_synced = bool(habit.google_event_id or habit.calendar_sync_status is not None)
+        if calendar_synced:
+            enqueue_calendar_sync(session, habit, CalendarOperation.DELETE)
+
+        await session.delete(habit)
+        await record_changes(session, habit.user_id, [habit_change(habit.id, ChangeOperation.DELETE)])
+        return calendar_synced
+
+    calendar_synced = await run_write(request, session, delete_habit)
+
+    if calendar_synced:
+        notify_calendar_worker(request.app)
 
     return None
 
 
 @router.post("/{habit_id}/complete", response_model=HabitCompletionRead)
-def mark_habit_as_complete(
+async def mark_habit_as_complete(
     *,
-    session: Session = Depends(get_session),
-
+    session: AsyncSession = Depends(get_session),
+    request: Request,
     habit: Habit = Depends(get_valid_habit_for_user),
     completion_in: HabitCompletionCreate
 ):
     """
     Marca un hábito como completado para una fecha específica (por defecto, hoy).
-    Evita que se marque como completado dos veces en el mismo día.
+    Evita que se marque como completado dos veces en el mismo día: la
+    inserción y la comprobación son una sola sentencia atómica.
     """
 
     completion_date = completion_in.completion_date or date.today()
 
-    statement = select(HabitCompletion).where(
-        HabitCompletion.habit_id == habit.id,
-        HabitCompletion.completion_date == completion_date
-    )
-    existing_completion = session.exec(statement).first()
+    async def complete(session: AsyncSession) -> HabitCompletion:
+        db_completion = await insert_completion_if_absent(
+            session, habit.id, completion_date)
 
-    if existing_completion:
-        raise HTTPException(
-            status_code=status.HTTP_409_CONFLICT,
-            detail="El hábito ya fue marcado como completado para esta fecha."
-        )
-
-    db_completion = HabitCompletion(
-        habit_id=habit.id,
-        completion_date=completion_date
-    )
+        if db_completion is None:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="El hábito ya fue marcado como completado para esta fecha."
+            )
 
-    session.add(db_completion)
-    session.commit()
-    session.refresh(db_completion)
+        await register_completion_added(session, habit.id, completion_date)
+        await register_bitmap_days(session, habit, [completion_date])
+        await register_rollup_deltas(session, [(habit.id, completion_date, 1, 0)])
+        await record_changes(session, habit.user_id, completion_changes(habit.id, [completion_date]))
+        return db_completion
 
-    return db_completion
+    return await run_write(request, session, complete)
 
 
-@router.delete("/{habit_id}/complete", status_code=status.HTTP_204_NO_CONTENT)
-def unmark_habit_as_complete(
+@router.delete("/{habit_id}/complete", status_code=status.HTTP_204_NO_CONTENT, dependencies=[Depends(flush_pending_tracks)])
+async def unmark_habit_as_complete(
     *,
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_session),
+    request: Request,
     habit: Habit = Depends(get_valid_habit_for_user),
     completion_date: date | None = None
 ):
@@ -154,134 +430,223 @@ def unmark_habit_as_complete(
     """
     target_date = completion_date or date.today()
 
-    statement = select(HabitCompletion).where(
-        HabitCompletion.habit_id == habit.id,
-        HabitCompletion.completion_date == target_date
-    )
-    completion_to_delete = session.exec(statement).first()
-
-    if not completion_to_delete:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="No se encontró un registro de completitud para esta fecha."
+    async def unmark(session: AsyncSession) -> None:
+        statement = select(HabitCompletion).where(
+            HabitCompletion.habit_id == habit.id,
+            HabitCompletion.completion_date == target_date
         )
+        completion_to_delete = (await session.exec(statement)).first()
+
+        if not completion_to_delete:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="No se encontró un registro de completitud para esta fecha."
+            )
+
+        await session.delete(completion_to_delete)
+        await register_completion_removed(session, habit.id, target_date)
+        await register_bitmap_days(session, habit, [target_date], completed=False)
+        await register_rollup_deltas(
+            session, [(habit.id, target_date, -1, -(completion_to_delete.value or 0))])
+        await record_changes(session, habit.user_id, completion_changes(
+            habit.id, [target_date], ChangeOperation.DELETE))
 
-    session.delete(completion_to_delete)
-    session.commit()
+    await run_write(request, session, unmark)
     return None
 
 
-@router.get("/{habit_id}/completions", response_model=List[HabitCompletionRead])
-def get_habit_completions(
+@router.get("/{habit_id}/completions", response_model=List[HabitCompletionRead], dependencies=[Depends(flush_pending_tracks), Depends(check_not_modified)])
+async def get_habit_completions(
     *,
-    habit: Habit = Depends(get_valid_habit_for_user)
+    session: AsyncSession = Depends(get_session),
+    habit: Habit = Depends(get_valid_habit_for_user),
+    request: Request,
+    response: Response,
+    from_date: date | None = Query(default=None, alias="from"),
+    to_date: date | None = Query(default=None, alias="to"),
+    cursor: str | None = None,
+    limit: int = Query(default=DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE)
 ):
     """
-    Obtiene el historial de completitud de un hábito específico.
+    Obtiene el historial de completitud de un hábito específico, ordenado
+    por fecha y paginado por cursor sobre (completion_date, id).
+    `from`/`to` acotan el rango de fechas (ambos inclusive). Si hay más
+    resultados, el cursor de la siguiente página viene en `X-Next-Cursor`.
+    Responde en MessagePack si se pide con `Accept: application/msgpack`.
     """
+    statement = select(*COMPLETION_READ_COLUMNS).where(
+        HabitCompletion.habit_id == habit.id)
+
+    if from_date:
+        statement = statement.where(
+            HabitCompletion.completion_date >= from_date)
+    if to_date:
+        statement = statement.where(HabitCompletion.completion_date <= to_date)
+    if cursor:
+        last_date, last_id = decode_cursor(cursor, date, int)
+        statement = statement.where(
+            tuple_(HabitCompletion.completion_date, HabitCompletion.id) > tuple_(last_date, last_id))
+
+    statement = statement.order_by(
+        HabitCompletion.completion_date, HabitCompletion.id).limit(limit + 1)
+    completions = [dict(row._mapping) for row in await session.exec(statement)]
 
-    return habit.completions
+    if len(completions) > limit:
+        completions = completions[:limit]
+        last = completions[-1]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(
+            last["completion_date"], last["id"])
+
+    return negotiated_response(request, completions, response)
 
 
 @router.post("/{habit_id}/track", response_model=HabitCompletionRead)
-def track_habit_progress(
+async def track_habit_progress(
     *,
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_session),
+    request: Request,
     habit: Habit = Depends(get_valid_habit_for_user),
     track_in: HabitTrack
 ):
     """
     Registra progreso para un hábito de frecuencia o temporizador.
     Si ya existe un registro para hoy, le suma el valor. Si no, lo crea.
+    La suma se hace en la base de datos con un upsert atómico, así que
+    dos incrementos simultáneos nunca se pisan.
+    Con `TRACK_WRITE_BEHIND` activo, los incrementos sobre un registro que
+    ya existe se acumulan en memoria y se escriben por lotes.
     """
     today = date.today()
 
-    statement = select(HabitCompletion).where(
-        HabitCompletion.habit_id == habit.id,
-        HabitCompletion.completion_date == today
-    )
-    db_completion = session.exec(statement).first()
-
-    if db_completion:
+    tracking_buffer = getattr(request.app.state, "tracking_buffer", None)
+    if tracking_buffer is not None:
+        completion = await tracking_buffer.track(session, habit, today, track_in.value)
+        if completion is not None:
+            return completion
 
-        db_completion.value = (db_completion.value or 0) + track_in.value
-    else:
+    async def track(session: AsyncSession) -> HabitCompletion:
+        db_completion = await upsert_completion_value(
+            session, habit.id, today, track_in.value)
+        await register_completion_upserted(session, habit.id, today)
+        await register_bitmap_days(session, habit, [today])
+        await refresh_rollup_periods(session, habit.id, today)
+        await record_changes(session, habit.user_id, completion_changes(habit.id, [today]))
+        return db_completion
 
-        db_completion = HabitCompletion(
-            habit_id=habit.id,
-            completion_date=today,
-            value=track_in.value
-        )
+    return await run_write(request, session, track)
 
-    session.add(db_completion)
-    session.commit()
-    session.refresh(db_completion)
 
-    return db_completion
+@router.get("/{habit_id}/stats", response_model=HabitStats, dependencies=[Depends(flush_pending_tracks), Depends(check_not_modified)])
+async def get_habit_stats(
+    *,
+    session: AsyncSession = Depends(get_session),
+    habit: Habit = Depends(get_valid_habit_for_user),
+    request: Request,
+    response: Response,
+    include_dates: bool = True
+):
+    """
+    Devuelve estadísticas clave para un hábito específico, como la racha
+    actual, la racha más larga y el total de completitudes.
+    Las cifras salen de la proyección persistida; con `include_dates=false`
+    la lectura es O(1) sin importar la antigüedad del hábito.
+    Responde en MessagePack si se pide con `Accept: application/msgpack`.
+    """
+    snapshot = await get_habit_stats_snapshot(session, habit.id)
+    await session.commit()
+
+    completion_dates = []
+    if include_dates and snapshot.total_completions:
+        statement = select(HabitCompletion.completion_date).where(
+            HabitCompletion.habit_id == habit.id
+        ).distinct().order_by(HabitCompletion.completion_date)
+        completion_dates = (await session.exec(statement)).all()
+
+    stats = {
+        "current_streak": current_streak_from_snapshot(snapshot),
+        "longest_streak": snapshot.longest_streak,
+        "total_completions": snapshot.total_completions,
+        "completion_dates": completion_dates,
+    }
+    return negotiated_response(request, stats, response)
+
+
+@router.get("/{habit_id}/analytics", response_model=HabitAnalytics, dependencies=[Depends(flush_pending_tracks), Depends(check_not_modified)])
+async def get_habit_analytics(
+    *,
+    session: AsyncSession = Depends(get_session),
+    habit: Habit = Depends(get_valid_habit_for_user),
+    from_date: date | None = Query(default=None, alias="from"),
+    to_date: date | None = Query(default=None, alias="to")
+):
+    """
+    Tasa de completitud por día de la semana, adherencia móvil a 7 y 30
+    días, rachas y totales semanales de un hábito, calculados con NumPy.
+    Por defecto cubre los últimos `DEFAULT_ANALYTICS_DAYS` días.
+    """
+    start_date, end_date = _analytics_range(from_date, to_date)
+    (analytics,) = await get_habits_analytics(session, [habit], start_date, end_date)
+    return analytics
 
 
-@router.get("/{habit_id}/stats", response_model=HabitStats)
-def get_habit_stats(
-    habit: Habit = Depends(get_valid_habit_for_user)
+@router.get("/{habit_id}/heatmap", response_model=HabitHeatmap, dependencies=[Depends(flush_pending_tracks), Depends(check_not_modified)])
+async def get_habit_heatmap(
+    *,
+    session: AsyncSession = Depends(get_session),
+    habit: Habit = Depends(get_valid_habit_for_user),
+    year: int | None = Query(default=None, ge=1, le=9999)
 ):
     """
-    Calcula y devuelve estadísticas clave para un hábito específico,
-    como la racha actual, la racha más larga y el total de completitudes.
+    Devuelve un año completo de completitudes como un bitmap de 46 bytes
+    en base64, junto con el total y las rachas del año, calculados con
+    operaciones de bits. Por defecto, el año en curso.
     """
-    completion_dates = sorted(
-        list(set(c.completion_date for c in habit.completions)))
-
-    if not completion_dates:
-        return HabitStats(
-            current_streak=0,
-            longest_streak=0,
-            total_completions=0,
-            completion_dates=[]
-        )
+    today = date.today()
+    year = year or today.year
 
-    total_completions = len(completion_dates)
+    bitmap = await get_year_bitmap(session, habit, year)
 
-    longest_streak = 0
+    value = bitmap_to_int(bitmap.bits)
     current_streak = 0
+    if year == today.year:
+        current_streak = run_ending_at(value, day_index(today)) or (
+            run_ending_at(value, day_index(today) - 1) if day_index(today) else 0)
 
-    if total_completions > 0:
-
-        longest_streak = 1
-        streak_so_far = 1
-
-        for i in range(1, total_completions):
-
-            consecutive_day = completion_dates[i] == completion_dates[i-1] + timedelta(
-                days=1)
-
-            if consecutive_day:
-                streak_so_far += 1
-            else:
-                streak_so_far = 1
-
-            if streak_so_far > longest_streak:
-                longest_streak = streak_so_far
-
-        today = date.today()
-        last_completion_date = completion_dates[-1]
+    return HabitHeatmap(
+        habit_id=habit.id,
+        year=year,
+        days_in_year=days_in_year(year),
+        bitmap=base64.b64encode(bitmap.bits).decode(),
+        total_completions=count_days(bitmap.bits),
+        longest_streak=longest_run(value),
+        current_streak=current_streak
+    )
 
-        if last_completion_date == today or last_completion_date == today - timedelta(days=1):
-            current_streak = streak_so_far
-        else:
-            current_streak = 0
 
-    return HabitStats(
-        current_streak=current_streak,
-        longest_streak=longest_streak,
-        total_completions=total_completions,
-        completion_dates=completion_dates
-    )
+@router.get("/{habit_id}/periods", response_model=List[HabitPeriod], dependencies=[Depends(flush_pending_tracks), Depends(check_not_modified)])
+async def get_habit_periods_by_id(
+    *,
+    session: AsyncSession = Depends(get_session),
+    habit: Habit = Depends(get_valid_habit_for_user),
+    period: PeriodType = PeriodType.WEEK,
+    from_date: date | None = Query(default=None, alias="from"),
+    to_date: date | None = Query(default=None, alias="to")
+):
+    """
+    Completitudes y suma de `value` por semana ISO (`period=week`) o por
+    mes (`period=month`) en el rango `from`/`to` (por defecto, el último
+    año). Se sirve solo de los agregados precalculados, sin leer las
+    completitudes; los periodos sin ninguna se omiten.
+    """
+    start_date, end_date = _analytics_range(from_date, to_date)
+    return await get_habit_periods(session, habit.id, period, start_date, end_date)
 
 
 @router.post("/{habit_id}/completions/bulk", response_model=BulkResponse)
-def create_bulk_completions(
+async def create_bulk_completions(
     *,
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_session),
+    request: Request,
     habit: Habit = Depends(get_valid_habit_for_user),
     bulk_in: HabitCompletionBulkCreate
 ):
@@ -290,25 +655,55 @@ def create_bulk_completions(
     Evita la creación de duplicados si una fecha ya está registrada.
     """
 
-    statement = select(HabitCompletion.completion_date).where(
-        HabitCompletion.habit_id == habit.id)
-    existing_dates = set(session.exec(statement).all())
+    async def insert_bulk(session: AsyncSession) -> int:
+        inserted_dates = await insert_completions_ignoring_conflicts(
+            session, habit.id, [(completion_date, None) for completion_date in sorted(set(bulk_in.dates))])
 
-    new_completions = []
+        if not inserted_dates:
+            return 0
 
-    for completion_date in set(bulk_in.dates):
-        if completion_date not in existing_dates:
-            new_completions.append(
-                HabitCompletion(
-                    habit_id=habit.id,
-                    completion_date=completion_date
-                )
-            )
+        await register_completions_added(session, habit.id, inserted_dates)
+        await register_bitmap_days(session, habit, inserted_dates)
+        await register_rollup_deltas(
+            session, [(habit.id, completion_date, 1, 0) for completion_date in inserted_dates])
+        await record_changes(session, habit.user_id, completion_changes(habit.id, inserted_dates))
+        return len(inserted_dates)
 
-    if not new_completions:
-        return BulkResponse(entries_created=0)
+    return BulkResponse(entries_created=await run_write(request, session, insert_bulk))
 
-    session.add_all(new_completions)
-    session.commit()
 
-    return BulkResponse(entries_created=len(new_completions))
+@router.post("/{habit_id}/completions/import", response_model=ImportResponse)
+async def import_habit_completions(
+    *,
+    session: AsyncSession = Depends(get_session),
+    request: Request,
+    habit: Habit = Depends(get_valid_habit_for_user)
+):
+    """
+    Importa un historial de completitudes enviado en streaming como NDJSON
+    (`application/x-ndjson`) o CSV (`text/csv`), con una fecha y un
+    `value` opcional por fila. El cuerpo se procesa a medida que llega y
+    se valida entero antes de escribir nada; después se escribe por
+    bloques, cada uno en una transacción corta. Las fechas ya registradas
+    se omiten. Si alguna fila no es válida no se importa nada.
+    """
+    file_format = import_format(request.headers.get("content-type"))
+    if file_format is None:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail="Formato no soportado: usa application/x-ndjson o text/csv."
+        )
+
+    # Mientras llega el cuerpo la petición no retiene ninguna conexión.
+    await session.commit()
+    parse = parse_ndjson if file_format == "ndjson" else parse_csv
+    try:
+        spool = await spool_records(parse(iter_lines(request.stream())))
+    except ImportFormatError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    with spool:
+        created, skipped = await import_completions(
+            habit, iter_spooled(spool), lambda unit: run_write(request, session, unit))
+    return ImportResponse(entries_created=created, entries_skipped=skipped)
@@ -0,0 +1,48 @@
+from fastapi import APIRouter, Depends, Query, Request
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from database import get_session
+from models.user_models import User
+from schemas.sync_schemas import SyncResponse
+from sync_services import DEFAULT_SYNC_PAGE_SIZE, MAX_SYNC_PAGE_SIZE, current_sync_cursor, get_changes_since
+from tracking_buffer import flush_pending_tracks
+from utils.auth_utils import get_current_user
+from utils.pagination_utils import decode_cursor
+from utils.response_utils import negotiated_response
+
+router = APIRouter(prefix="/sync", tags=["Sync"])
+
+
+@router.get("", response_model=SyncResponse, dependencies=[Depends(flush_pending_tracks)])
+async def get_sync_changes(
+    *,
+    session: AsyncSession = Depends(get_session),
+    current_user: User = Depends(get_current_user),
+    request: Request,
+    since: str | None = None,
+    limit: int = Query(default=DEFAULT_SYNC_PAGE_SIZE, ge=1, le=MAX_SYNC_PAGE_SIZE)
+):
+    """
+    Sincronización incremental: devuelve solo los hábitos y completitudes
+    creados, modificados o borrados desde el cursor `since`, en páginas de
+    como mucho `limit` cambios. En una cuenta sin cambios la respuesta es
+    casi vacía y cuesta una consulta por índice.
+    Sin `since` devuelve `reset=true` y el cursor actual, para que el
+    cliente descargue el estado completo y siga desde ahí.
+    Responde en MessagePack si se pide con `Accept: application/msgpack`.
+    """
+    if since is None:
+        return negotiated_response(request, {
+            "cursor": await current_sync_cursor(session, current_user.id),
+            "has_more": False,
+            "reset": True,
+            "habits": [],
+            "deleted_habit_ids": [],
+            "completions": [],
+            "deleted_completions": [],
+        })
+
+    version, change_id = decode_cursor(since, int, int)
+
+    changes = await get_changes_since(session, current_user.id, version, change_id, limit)
+    return negotiated_response(request, changes)
@@ -1,9 +1,15 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query, Request
+from fastapi.responses import StreamingResponse
 from models.user_models import User
 from utils.auth_utils import get_current_user
+from utils.etag_utils import bump_data_version
 from schemas.user_schemas import UserUpdate
 from database import get_session
-from sqlmodel import Session
+from sqlmodel import update
+from sqlmodel.ext.asyncio.session import AsyncSession
+from export_services import EXPORT_MEDIA_TYPES, stream_account_export
+from tracking_buffer import flush_pending_tracks
+from write_queue import run_write
 
 router = APIRouter(prefix="/users", tags=["Users"])
 
@@ -19,10 +25,11 @@ async def get_user(current_user: User = Depends(get_current_user)):
 
 
 @router.patch("/", response_model=User)
-def update_current_user(
+async def update_current_user(
     *,
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_session),
     current_user: User = Depends(get_current_user),
+    request: Request,
     user_in: UserUpdate
 ):
     """
@@ -30,11 +37,39 @@ def update_current_user(
     como el nombre o la zona horaria.
     """
     update_data = user_in.model_dump(exclude_unset=True)
+    user_id = current_user.id
 
-    current_user.sqlmodel_update(update_data)
+    async def update_user(session: AsyncSession) -> User:
+        if update_data:
+            await session.exec(update(User).where(User.id == user_id).values(**update_data))
+        await bump_data_version(session, user_id)
+        return await session.get(User, user_id, populate_existing=True)
 
-    session.add(current_user)
-    session.commit()
-    session.refresh(current_user)
+    return await run_write(request, session, update_user)
 
-    return current_user
+
+@router.get("/export", dependencies=[Depends(flush_pending_tracks)])
+async def export_current_user_data(
+    *,
+    current_user: User = Depends(get_current_user),
+    export_format: str = Query(
+        default="ndjson", alias="format", pattern="^(ndjson|csv)$"),
+    gzip: bool = False
+):
+    """
+    Exporta todos los hábitos y completitudes del usuario en NDJSON o CSV,
+    una fila por completitud. La respuesta se genera en streaming desde un
+    cursor de la base de datos, así que la memoria no depende del tamaño
+    de la cuenta. Con `gzip=true` se envía comprimida (`Content-Encoding: gzip`).
+    """
+    headers = {
+        "Content-Disposition": f'attachment; filename="habitapp-export-{current_user.id}.{export_format}"'
+    }
+    if gzip:
+        headers["Content-Encoding"] = "gzip"
+
+    return StreamingResponse(
+        stream_account_export(current_user.id, export_format, gzip),
+        media_type=EXPORT_MEDIA_TYPES[export_format],
+        headers=headers
+    )
@@ -1,6 +1,7 @@
+from enum import Enum
 from sqlmodel import SQLModel
 from datetime import date, time
-from models.habit_models import HabitType
+from models.habit_models import CalendarSyncStatus, HabitType
 
 
 class HabitBase(SQLModel):
@@ -29,6 +30,7 @@ class HabitUpdate(SQLModel):
 class HabitRead(HabitBase):
     id: int
     user_id: int
+    calendar_sync_status: CalendarSyncStatus | None = None
 
 
 class HabitCompletionRead(SQLModel):
@@ -56,9 +58,128 @@ class HabitStats(SQLModel):
     completion_dates: list[date]
 
 
+class HabitDashboardItem(SQLModel):
+    """
+    Resumen de un hábito para el panel principal: las mismas cifras que
+    `HabitStats` (sin la lista de fechas) más el progreso de hoy.
+    """
+    habit: HabitRead
+    current_streak: int
+    longest_streak: int
+    total_completions: int
+    completed_today: bool
+    today_value: int | None = None
+
+
 class HabitCompletionBulkCreate(SQLModel):
     dates: list[date]
 
 
 class BulkResponse(SQLModel):
     entries_created: int
+
+
+class CalendarSyncResponse(SQLModel):
+    operations_enqueued: int
+
+
+class WeeklyTotal(SQLModel):
+    week_start: date
+    total: int
+
+
+class HabitAnalytics(SQLModel):
+    """
+    Métricas de un hábito en el rango [start_date, end_date].
+    `weekday_completion_rate` va de lunes a domingo; `adherence_7` y
+    `adherence_30` tienen un valor por día del rango; `weekly_totals` solo
+    se calcula para hábitos de frecuencia y de temporizador.
+    """
+    habit_id: int
+    start_date: date
+    end_date: date
+    completed_days: int
+    completion_rate: float
+    weekday_completion_rate: list[float]
+    adherence_7: list[float]
+    adherence_30: list[float]
+    current_run: int
+    longest_run: int
+    weekly_totals: list[WeeklyTotal] | None = None
+
+
+class HabitHeatmap(SQLModel):
+    """
+    Un año de completitudes en formato compacto: `bitmap` es el bitmap del
+    año en base64 (46 bytes, bit 0 = 1 de enero, orden little-endian).
+    """
+    habit_id: int
+    year: int
+    days_in_year: int
+    bitmap: str
+    total_completions: int
+    longest_streak: int
+    current_streak: int
+
+
+class ImportResponse(SQLModel):
+    entries_created: int
+    entries_skipped: int
+
+
+class PeriodType(str, Enum):
+    WEEK = "week"
+    MONTH = "month"
+
+
+class HabitPeriod(SQLModel):
+    """
+    Completitudes y suma de `value` de un hábito en una semana ISO
+    (de lunes a domingo) o un mes, ambos extremos inclusive.
+    """
+    period_start: date
+    period_end: date
+    completions: int
+    total_value: int
+
+
+class BatchOperationType(str, Enum):
+    COMPLETE = "complete"
+    UNCOMPLETE = "uncomplete"
+    TRACK = "track"
+
+
+class HabitBatchOperation(SQLModel):
+    """
+    Una operación del lote. `completion_date` es hoy si se omite y `value`
+    solo se usa (y es obligatorio) en `track`.
+    """
+    op: BatchOperationType
+    habit_id: int
+    completion_date: date | None = None
+    value: int | None = None
+
+
+class HabitBatchRequest(SQLModel):
+    operations: list[HabitBatchOperation]
+
+
+class HabitBatchResult(SQLModel):
+    """
+    Resultado de una operación, en el mismo orden que la petición.
+    `status_code` es el que habría devuelto el endpoint individual y
+    `value` es el valor del registro después de la operación.
+    """
+    index: int
+    op: BatchOperationType
+    habit_id: int
+    completion_date: date
+    status_code: int
+    detail: str | None = None
+    value: int | None = None
+
+
+class HabitBatchResponse(SQLModel):
+    applied: int
+    failed: int
+    results: list[HabitBatchResult]
@@ -0,0 +1,28 @@
+from sqlmodel import SQLModel
+from datetime import date
+from schemas.habit_schemas import HabitCompletionRead, HabitRead
+
+
+class DeletedCompletion(SQLModel):
+    habit_id: int
+    completion_date: date
+
+
+class SyncResponse(SQLModel):
+    """
+    Cambios desde el cursor `since`, con el estado actual de cada hábito o
+    completitud creado o modificado y la clave de los borrados. Al borrar
+    un hábito se borran también sus completitudes, que no se listan una a
+    una. El cliente aplica primero los borrados y después el resto (un
+    hábito borrado y recreado aparece en ambos). `cursor` se envía en la
+    siguiente llamada; si `has_more` es true hay más páginas. Con `reset`
+    el cliente no tenía cursor: debe descargar el estado completo con los
+    endpoints de siempre y seguir desde `cursor`.
+    """
+    cursor: str
+    has_more: bool
+    reset: bool = False
+    habits: list[HabitRead]
+    deleted_habit_ids: list[int]
+    completions: list[HabitCompletionRead]
+    deleted_completions: list[DeletedCompletion]
@@ -0,0 +1,153 @@
+"""
+Recalcula las estadísticas de rachas (`HabitStatsSnapshot`) de todos los
+hábitos, para informes nocturnos o para reparar proyecciones.
+
+Los hábitos se reparten en bloques de IDs consecutivos entre varios
+procesos: cada uno lee con su propia conexión, en streaming y en el orden
+del índice (habit_id, completion_date), las fechas de su bloque y las pasa
+por `iter_habit_streaks`, así que su memoria no depende del historial. El
+proceso principal escribe cada bloque con un upsert masivo y lo confirma
+en cuanto llega; el progreso indica desde qué ID se puede reanudar.
+
+Uso, desde la raíz del proyecto:
+    python -m stats_job --workers 8
+    python -m stats_job --start-id 120000 --end-id 250000
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict
+from sqlmodel import select
+
+from database import async_session_maker, create_db_and_tables, dialect_insert, engine
+from models.habit_models import Habit, HabitCompletion, HabitStatsSnapshot
+from utils.streak_utils import StreakStats, iter_habit_streaks
+
+from dotenv import load_dotenv
+load_dotenv()
+
+
+STATS_JOB_SHARD_SIZE = int(os.getenv("STATS_JOB_SHARD_SIZE", "1000"))
+# Segundos mínimos entre dos líneas de progreso.
+PROGRESS_INTERVAL_SECONDS = 2.0
+
+# Bucle de eventos propio de cada proceso del pool, reutilizado entre
+# bloques para que el pool de conexiones del motor siga siendo válido.
+_worker_loop: asyncio.AbstractEventLoop | None = None
+
+
+def _init_worker() -> None:
+    global _worker_loop
+    _worker_loop = asyncio.new_event_loop()
+
+
+def _stream_streaks(sync_connection, habit_ids: list[int]) -> list[dict]:
+    statement = select(HabitCompletion.habit_id, HabitCompletion.completion_date).where(
+        HabitCompletion.habit_id >= habit_ids[0],
+        HabitCompletion.habit_id <= habit_ids[-1]
+    ).order_by(HabitCompletion.habit_id, HabitCompletion.completion_date)
+    rows = sync_connection.execution_options(stream_results=True).execute(statement)
+
+    streaks = {stats.habit_id: stats for stats in iter_habit_streaks(rows)}
+    return [asdict(streaks.get(habit_id) or StreakStats(habit_id)) for habit_id in habit_ids]
+
+
+async def _compute_shard(habit_ids: list[int]) -> list[dict]:
+    async with engine.connect() as connection:
+        return await connection.run_sync(_stream_streaks, habit_ids)
+
+
+def compute_shard(habit_ids: list[int]) -> list[dict]:
+    """
+    Calcula en un proceso del pool las métricas de un bloque de hábitos
+    (IDs ordenados), incluidos los que no tienen completitudes.
+    """
+    return _worker_loop.run_until_complete(_compute_shard(habit_ids))
+
+
+async def _write_shard(rows: list[dict]) -> None:
+    async with async_session_maker() as session:
+        insert = dialect_insert(session)
+        statement = insert(HabitStatsSnapshot)
+        statement = statement.on_conflict_do_update(
+            index_elements=["habit_id"],
+            set_={column: getattr(statement.excluded, column)
+                  for column in ("current_run", "longest_streak", "total_completions", "last_completion_date")}
+        )
+        await session.exec(statement, params=rows)
+        await session.commit()
+
+
+async def run_stats_job(workers: int, shard_size: int = STATS_JOB_SHARD_SIZE, start_id: int | None = None, end_id: int | None = None) -> int:
+    """
+    Recalcula las proyecciones de los hábitos con ID en [start_id, end_id]
+    (todos por defecto) con `workers` procesos. Devuelve el número de
+    hábitos procesados. Las escrituras de completitudes simultáneas a un
+    bloque pueden quedar pisadas por su resultado, así que conviene
+    lanzarlo con poco tráfico.
+    """
+    statement = select(Habit.id).order_by(Habit.id)
+    if start_id is not None:
+        statement = statement.where(Habit.id >= start_id)
+    if end_id is not None:
+        statement = statement.where(Habit.id <= end_id)
+    async with async_session_maker() as session:
+        habit_ids = list((await session.exec(statement)).all())
+
+    shards = [habit_ids[index:index + shard_size]
+              for index in range(0, len(habit_ids), shard_size)]
+    shard_index = {shard[0]: index for index, shard in enumerate(shards)}
+    finished = [False] * len(shards)
+    resume_from = 0
+    processed = completions = 0
+    started = last_report = time.perf_counter()
+
+    loop = asyncio.get_running_loop()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             mp_context=multiprocessing.get_context("spawn")) as pool:
+        futures = [loop.run_in_executor(pool, compute_shard, shard) for shard in shards]
+        for future in asyncio.as_completed(futures):
+            rows = await future
+            await _write_shard(rows)
+
+            finished[shard_index[rows[0]["habit_id"]]] = True
+            while resume_from < len(shards) and finished[resume_from]:
+                resume_from += 1
+            processed += len(rows)
+            completions += sum(row["total_completions"] for row in rows)
+
+            now = time.perf_counter()
+            if now - last_report >= PROGRESS_INTERVAL_SECONDS or processed == len(habit_ids):
+                last_report = now
+                elapsed = now - started
+                resume = f"--start-id {shards[resume_from][0]}" if resume_from < len(shards) else "terminado"
+                print(f"{processed}/{len(habit_ids)} hábitos, {completions} completitudes, "
+                      f"{processed / elapsed:.0f} hábitos/s, {completions / elapsed:.0f} completitudes/s "
+                      f"(reanudar: {resume})")
+
+    return processed
+
+
+async def _main(args: argparse.Namespace) -> None:
+    await create_db_and_tables()
+    started = time.perf_counter()
+    processed = await run_stats_job(args.workers, args.shard_size, args.start_id, args.end_id)
+    print(f"Estadísticas recalculadas para {processed} hábitos en {time.perf_counter() - started:.1f} s")
+    await engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--shard-size", type=int, default=STATS_JOB_SHARD_SIZE,
+                        help="Hábitos por bloque.")
+    parser.add_argument("--start-id", type=int, help="Primer ID de hábito (inclusive).")
+    parser.add_argument("--end-id", type=int, help="Último ID de hábito (inclusive).")
+    asyncio.run(_main(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+from dataclasses import asdict
+from datetime import date, timedelta
+from typing import Iterable
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from database import dialect_insert
+from models.habit_models import HabitCompletion, HabitStatsSnapshot
+from utils.streak_utils import StreakStats, compute_streaks, current_streak, iter_habit_streaks
+
+
+def current_streak_from_snapshot(snapshot: HabitStatsSnapshot, today: date | None = None) -> int:
+    """
+    Racha actual según la proyección: 0 si la última completitud no fue hoy ni ayer.
+    """
+    return current_streak(snapshot.current_run, snapshot.last_completion_date, today or date.today())
+
+
+# Clave de `session.info` con los hábitos cuya proyección ya se bloqueó
+# en la transacción en curso (que también se guarda, para invalidarla).
+_LOCKED_SNAPSHOTS = "locked_stats_snapshots"
+
+
+def _locked_habit_ids(session: AsyncSession) -> set[int]:
+    sync_session = session.sync_session
+    transaction = sync_session.get_nested_transaction() or sync_session.get_transaction()
+    locked = session.info.get(_LOCKED_SNAPSHOTS)
+    if locked is None or locked[0] is not transaction:
+        locked = session.info[_LOCKED_SNAPSHOTS] = (transaction, set())
+    return locked[1]
+
+
+async def _lock_snapshot(session: AsyncSession, habit_id: int) -> HabitStatsSnapshot | None:
+    """
+    Lee la proyección con SELECT ... FOR UPDATE (y sin usar la copia de la
+    sesión): dos escrituras simultáneas sobre el mismo hábito se aplican
+    una tras otra en lugar de pisarse. En SQLite, que ya serializa a los
+    escritores, es un SELECT normal. Si ya se bloqueó en esta transacción
+    no se repite la consulta.
+    """
+    locked = _locked_habit_ids(session)
+    if habit_id in locked:
+        return await session.get(HabitStatsSnapshot, habit_id)
+    snapshot = await session.get(HabitStatsSnapshot, habit_id, with_for_update=True, populate_existing=True)
+    locked.add(habit_id)
+    return snapshot
+
+
+async def _create_snapshot(session: AsyncSession, habit_id: int) -> HabitStatsSnapshot:
+    """
+    Crea la proyección vacía si no existe (INSERT ... ON CONFLICT DO
+    NOTHING, para que dos peticiones que la crean a la vez no choquen con
+    la clave primaria) y la vuelve a leer bloqueada.
+    """
+    insert = dialect_insert(session)
+    await session.exec(insert(HabitStatsSnapshot).values(habit_id=habit_id).on_conflict_do_nothing(
+        index_elements=["habit_id"]))
+    snapshot = await session.get(HabitStatsSnapshot, habit_id, with_for_update=True, populate_existing=True)
+    _locked_habit_ids(session).add(habit_id)
+    return snapshot
+
+
+async def lock_snapshots(session: AsyncSession, habit_ids: Iterable[int]) -> list[HabitStatsSnapshot]:
+    """
+    Bloquea y carga de una vez las proyecciones de varios hábitos, para que
+    las funciones `register_*` posteriores de la misma transacción las
+    encuentren ya en la sesión sin volver a consultarlas.
+    """
+    habit_ids = set(habit_ids)
+    statement = select(HabitStatsSnapshot).where(
+        HabitStatsSnapshot.habit_id.in_(habit_ids)
+    ).with_for_update().execution_options(populate_existing=True)
+    snapshots = list((await session.exec(statement)).all())
+    _locked_habit_ids(session).update(habit_ids)
+    return snapshots
+
+
+async def recompute_habit_stats(session: AsyncSession, habit_id: int) -> HabitStatsSnapshot:
+    """
+    Recalcula desde cero la proyección de estadísticas de un hábito
+    leyendo únicamente la columna de fechas. La fila se crea y se bloquea
+    antes de leer las fechas, así que una escritura simultánea se ve entera.
+    """
+    snapshot = await _lock_snapshot(session, habit_id)
+    if snapshot is None:
+        snapshot = await _create_snapshot(session, habit_id)
+
+    statement = select(HabitCompletion.completion_date).where(
+        HabitCompletion.habit_id == habit_id
+    ).distinct().order_by(HabitCompletion.completion_date)
+    completion_dates = list((await session.exec(statement)).all())
+
+    current_run, longest_streak, total_completions = compute_streaks(
+        completion_dates)
+
+    snapshot.current_run = current_run
+    snapshot.longest_streak = longest_streak
+    snapshot.total_completions = total_completions
+    snapshot.last_completion_date = completion_dates[-1] if completion_dates else None
+
+    session.add(snapshot)
+    return snapshot
+
+
+async def get_habit_stats_snapshot(session: AsyncSession, habit_id: int) -> HabitStatsSnapshot:
+    """
+    Devuelve la proyección de un hábito, construyéndola la primera vez
+    (por ejemplo, para hábitos creados antes de que existiera la tabla).
+    """
+    snapshot = await session.get(HabitStatsSnapshot, habit_id)
+    if snapshot is None:
+        snapshot = await recompute_habit_stats(session, habit_id)
+    return snapshot
+
+
+async def build_missing_snapshots(session: AsyncSession, habit_ids: list[int]) -> dict[int, HabitStatsSnapshot]:
+    """
+    Construye en una sola pasada las proyecciones de varios hábitos que aún
+    no la tienen, leyendo (habit_id, completion_date) ordenado por hábito.
+    Se guardan con un único INSERT ... ON CONFLICT DO NOTHING y se leen de
+    vuelta: si otra petición creó alguna a la vez, se usa la suya.
+    """
+    if not habit_ids:
+        return {}
+
+    statement = select(HabitCompletion.habit_id, HabitCompletion.completion_date).where(
+        HabitCompletion.habit_id.in_(habit_ids)
+    ).distinct().order_by(HabitCompletion.habit_id, HabitCompletion.completion_date)
+
+    streaks = {stats.habit_id: stats for stats in iter_habit_streaks(await session.exec(statement))}
+
+    insert = dialect_insert(session)
+    await session.exec(
+        insert(HabitStatsSnapshot).on_conflict_do_nothing(index_elements=["habit_id"]),
+        params=[asdict(streaks.get(habit_id) or StreakStats(habit_id)) for habit_id in habit_ids])
+
+    statement = select(HabitStatsSnapshot).where(
+        HabitStatsSnapshot.habit_id.in_(habit_ids)
+    ).execution_options(populate_existing=True)
+    return {snapshot.habit_id: snapshot for snapshot in (await session.exec(statement)).all()}
+
+
+async def _has_completion(session: AsyncSession, habit_id: int, completion_date: date) -> bool:
+    statement = select(HabitCompletion.id).where(
+        HabitCompletion.habit_id == habit_id,
+        HabitCompletion.completion_date == completion_date
+    )
+    return (await session.exec(statement)).first() is not None
+
+
+async def _is_isolated(session: AsyncSession, habit_id: int, completion_date: date) -> bool:
+    return not (
+        await _has_completion(session, habit_id, completion_date - timedelta(days=1))
+        or await _has_completion(session, habit_id, completion_date + timedelta(days=1))
+    )
+
+
+def _append_date(snapshot: HabitStatsSnapshot, completion_date: date) -> None:
+    last_completion_date = snapshot.last_completion_date
+
+    if last_completion_date is not None and completion_date == last_completion_date + timedelta(days=1):
+        snapshot.current_run += 1
+    else:
+        snapshot.current_run = 1
+
+    snapshot.last_completion_date = completion_date
+    snapshot.total_completions += 1
+    snapshot.longest_streak = max(snapshot.longest_streak, snapshot.current_run)
+
+
+async def register_completions_added(session: AsyncSession, habit_id: int, completion_dates: Iterable[date]) -> HabitStatsSnapshot:
+    """
+    Actualiza la proyección tras insertar fechas nuevas (que no existían).
+    Las fechas posteriores a la última completitud se aplican en O(1) cada una;
+    un relleno hacia atrás solo fuerza un recálculo si toca una racha existente.
+    """
+    new_dates = sorted(set(completion_dates))
+    snapshot = await _lock_snapshot(session, habit_id)
+
+    if not new_dates:
+        return snapshot or await recompute_habit_stats(session, habit_id)
+
+    if snapshot is None:
+        return await recompute_habit_stats(session, habit_id)
+
+    last_completion_date = snapshot.last_completion_date
+
+    if last_completion_date is None or new_dates[0] > last_completion_date:
+        for completion_date in new_dates:
+            _append_date(snapshot, completion_date)
+    elif len(new_dates) == 1 and await _is_isolated(session, habit_id, new_dates[0]):
+        snapshot.total_completions += 1
+        snapshot.longest_streak = max(snapshot.longest_streak, 1)
+    else:
+        return await recompute_habit_stats(session, habit_id)
+
+    session.add(snapshot)
+    return snapshot
+
+
+async def register_completion_added(session: AsyncSession, habit_id: int, completion_date: date) -> HabitStatsSnapshot:
+    return await register_completions_added(session, habit_id, [completion_date])
+
+
+async def register_completion_upserted(session: AsyncSession, habit_id: int, completion_date: date) -> HabitStatsSnapshot:
+    """
+    Variante para escrituras tipo upsert, donde no se sabe si la fila era
+    nueva. La proyección lo resuelve sola: una fecha igual a la última ya
+    estaba contada y una posterior es nueva; solo una anterior obliga a recalcular.
+    """
+    snapshot = await _lock_snapshot(session, habit_id)
+    if snapshot is None:
+        return await recompute_habit_stats(session, habit_id)
+
+    last_completion_date = snapshot.last_completion_date
+    if last_completion_date is None or completion_date > last_completion_date:
+        _append_date(snapshot, completion_date)
+        session.add(snapshot)
+        return snapshot
+    if completion_date == last_completion_date:
+        return snapshot
+    return await recompute_habit_stats(session, habit_id)
+
+
+async def register_completion_removed(session: AsyncSession, habit_id: int, completion_date: date) -> HabitStatsSnapshot:
+    """
+    Actualiza la proyección tras borrar una fecha. Solo se recalcula todo
+    cuando la fecha borrada estaba dentro de una racha que importa.
+    """
+    snapshot = await _lock_snapshot(session, habit_id)
+    if snapshot is None or snapshot.total_completions <= 1:
+        return await recompute_habit_stats(session, habit_id)
+
+    if completion_date == snapshot.last_completion_date:
+        if 1 < snapshot.current_run < snapshot.longest_streak:
+            snapshot.current_run -= 1
+            snapshot.last_completion_date = completion_date - \
+                timedelta(days=1)
+            snapshot.total_completions -= 1
+        else:
+            return await recompute_habit_stats(session, habit_id)
+    elif await _is_isolated(session, habit_id, completion_date):
+        snapshot.total_completions -= 1
+    else:
+        return await recompute_habit_stats(session, habit_id)
+
+    session.add(snapshot)
+    return snapshot
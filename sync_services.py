@@ -0,0 +1,123 @@
+from datetime import date
+from typing import Iterable
+from sqlmodel import insert, select, tuple_
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from models.habit_models import Habit, HabitCompletion
+from models.sync_models import ChangeEntity, ChangeOperation, SyncChange
+from schemas.habit_schemas import HabitCompletionRead, HabitRead
+from utils.etag_utils import bump_data_version
+from utils.pagination_utils import encode_cursor
+
+
+DEFAULT_SYNC_PAGE_SIZE = 500
+MAX_SYNC_PAGE_SIZE = 5000
+
+_HABIT_COLUMNS = [getattr(Habit, name) for name in HabitRead.model_fields]
+_COMPLETION_COLUMNS = [getattr(HabitCompletion, name)
+                       for name in HabitCompletionRead.model_fields]
+
+
+def habit_change(habit_id: int, operation: ChangeOperation = ChangeOperation.UPSERT) -> dict:
+    return {"entity": ChangeEntity.HABIT, "operation": operation,
+            "habit_id": habit_id, "completion_date": None}
+
+
+def completion_changes(habit_id: int, completion_dates: Iterable[date], operation: ChangeOperation = ChangeOperation.UPSERT) -> list[dict]:
+    return [{"entity": ChangeEntity.COMPLETION, "operation": operation,
+             "habit_id": habit_id, "completion_date": completion_date}
+            for completion_date in completion_dates]
+
+
+async def record_changes(session: AsyncSession, user_id: int, changes: list[dict]) -> None:
+    """
+    Sustituye a `bump_data_version` en las escrituras de hábitos y
+    completitudes: incrementa la versión de datos del usuario y anota los
+    cambios con esa versión (un único executemany), en la misma transacción.
+    """
+    version = await bump_data_version(session, user_id)
+    if version is None or not changes:
+        return
+    await session.exec(insert(SyncChange), params=[
+        {"user_id": user_id, "version": version, **change} for change in changes
+    ])
+
+
+async def current_sync_cursor(session: AsyncSession, user_id: int) -> str:
+    """
+    Cursor que apunta al último cambio registrado del usuario.
+    """
+    statement = select(SyncChange.version, SyncChange.id).where(
+        SyncChange.user_id == user_id
+    ).order_by(SyncChange.version.desc(), SyncChange.id.desc()).limit(1)
+    last = (await session.exec(statement)).first()
+    return encode_cursor(*(last or (0, 0)))
+
+
+async def get_changes_since(session: AsyncSession, user_id: int, version: int, change_id: int, limit: int) -> dict:
+    """
+    Devuelve la página de cambios posteriores a (version, change_id): lee
+    como mucho `limit` entradas del registro, se queda con la última
+    operación de cada hábito o completitud y lee su estado actual con una
+    consulta `IN` por tabla. Lo que ya no existe se devuelve como borrado,
+    aunque su borrado llegue en una página posterior.
+    """
+    statement = select(SyncChange).where(
+        SyncChange.user_id == user_id,
+        tuple_(SyncChange.version, SyncChange.id) > tuple_(version, change_id)
+    ).order_by(SyncChange.version, SyncChange.id).limit(limit + 1)
+    entries = list((await session.exec(statement)).all())
+
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+    if entries:
+        version, change_id = entries[-1].version, entries[-1].id
+
+    habit_operations: dict[int, ChangeOperation] = {}
+    completion_operations: dict[tuple[int, date], ChangeOperation] = {}
+    deleted_habits: set[int] = set()
+    for entry in entries:
+        if entry.entity == ChangeEntity.HABIT:
+            habit_operations[entry.habit_id] = entry.operation
+            if entry.operation == ChangeOperation.DELETE:
+                deleted_habits.add(entry.habit_id)
+        else:
+            completion_operations[(entry.habit_id, entry.completion_date)] = entry.operation
+
+    habit_ids = [habit_id for habit_id, operation in habit_operations.items()
+                 if operation == ChangeOperation.UPSERT]
+    completion_keys = [key for key, operation in completion_operations.items()
+                       if operation == ChangeOperation.UPSERT]
+
+    habits = []
+    if habit_ids:
+        habits = [dict(row._mapping) for row in await session.exec(
+            select(*_HABIT_COLUMNS).where(Habit.id.in_(habit_ids), Habit.user_id == user_id))]
+    completions = []
+    if completion_keys:
+        completions = [dict(row._mapping) for row in await session.exec(
+            select(*_COMPLETION_COLUMNS).where(
+                tuple_(HabitCompletion.habit_id, HabitCompletion.completion_date).in_(completion_keys)))]
+
+    # Un hábito borrado y recreado con el mismo ID (SQLite puede reutilizar
+    # el último) aparece en los dos sitios: el cliente aplica antes los borrados.
+    found_habits = {habit["id"] for habit in habits}
+    deleted_habits.update(habit_id for habit_id in habit_ids if habit_id not in found_habits)
+    found_completions = {(completion["habit_id"], completion["completion_date"])
+                         for completion in completions}
+    deleted_completions = [
+        {"habit_id": habit_id, "completion_date": completion_date}
+        for (habit_id, completion_date), operation in completion_operations.items()
+        if (operation == ChangeOperation.DELETE or (habit_id, completion_date) not in found_completions)
+        and habit_id not in deleted_habits
+    ]
+
+    return {
+        "cursor": encode_cursor(version, change_id),
+        "has_more": has_more,
+        "reset": False,
+        "habits": habits,
+        "deleted_habit_ids": sorted(deleted_habits),
+        "completions": completions,
+        "deleted_completions": deleted_completions,
+    }
@@ -0,0 +1,53 @@
+"""
+Configuración común de los tests: una base de datos SQLite temporal por
+ejecución y usuarios con su token. Las variables de entorno se fijan aquí,
+antes de que los tests importen la app, porque el motor se crea al importar
+`database`.
+"""
+import asyncio
+import os
+import tempfile
+
+import pytest
+
+_DATABASE_DIR = tempfile.mkdtemp(prefix="habitapp-tests-")
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{_DATABASE_DIR}/habitapp-tests.db"
+os.environ["SECRET_KEY"] = os.getenv("SECRET_KEY") or "tests-secret-key"
+# Los tests de concurrencia lanzan cientos de escrituras a la vez: en una
+# máquina cargada la espera por el bloqueo de SQLite puede pasar de 5 s.
+os.environ["SQLITE_BUSY_TIMEOUT_MS"] = "60000"
+# El worker de calendario no debe salir a Google desde los tests.
+os.environ.setdefault("GOOGLE_CALENDAR_BASE_URL", "http://calendar.invalid/calendar/v3")
+
+
+@pytest.fixture
+def make_user():
+    """
+    Devuelve una corrutina que crea un usuario y devuelve (id, cabeceras
+    con su token de acceso).
+    """
+    from database import async_session_maker
+    from models.user_models import User
+    from security import create_jwt_tokens
+
+    async def _make_user(email: str) -> tuple[int, dict[str, str]]:
+        async with async_session_maker() as session:
+            user = User(google_id=email, email=email, full_name="Test")
+            session.add(user)
+            await session.commit()
+            access_token = create_jwt_tokens(user.id)["access_token"]
+            return user.id, {"Authorization": f"Bearer {access_token}"}
+
+    return _make_user
+
+
+@pytest.fixture(autouse=True)
+def fresh_connection_pool():
+    """
+    Cada test corre en su propio bucle de eventos (`asyncio.run`): el pool
+    del motor se sustituye al terminar para que su cola de espera no quede
+    ligada al bucle de un test anterior.
+    """
+    yield
+    from database import engine
+    asyncio.run(engine.dispose(close=False))
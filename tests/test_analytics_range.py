@@ -0,0 +1,29 @@
+import asyncio
+
+import httpx
+
+from analytics_services import ANALYTICS_MAX_DATE, ANALYTICS_MIN_DATE
+from database import create_db_and_tables
+from main import app
+
+
+def test_analytics_rejects_ranges_outside_the_limits(make_user):
+    async def scenario():
+        await create_db_and_tables()
+        _, headers = await make_user("analytics-range@example.com")
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            habit_id = (await client.post("/habits/", json={"name": "Leer"}, headers=headers)).json()["id"]
+            paths = ["/habits/analytics", f"/habits/{habit_id}/analytics", f"/habits/{habit_id}/periods"]
+            for path in paths:
+                for params in ({"from": "0001-01-03", "to": "0001-02-01"},
+                               {"from": "9999-12-20", "to": "9999-12-31"},
+                               {"from": "2000-01-01", "to": "2020-01-01"}):
+                    response = await client.get(path, params=params, headers=headers)
+                    assert response.status_code == 422, (path, params, response.text)
+
+                for params in ({"from": ANALYTICS_MIN_DATE.isoformat(), "to": "0001-06-01"},
+                               {"from": "9999-06-01", "to": ANALYTICS_MAX_DATE.isoformat()}):
+                    response = await client.get(path, params=params, headers=headers)
+                    assert response.status_code == 200, (path, params, response.text)
+
+    asyncio.run(scenario())
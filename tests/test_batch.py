@@ -0,0 +1,62 @@
+import asyncio
+
+import httpx
+
+from database import create_db_and_tables
+from main import app
+
+
+def test_batch_applies_what_it_can_and_reports_each_failure(make_user):
+    """
+    Cada operación recibe el código de su endpoint individual y las que
+    fallan no impiden aplicar las demás, en el orden del lote.
+    """
+    async def scenario():
+        await create_db_and_tables()
+        _, headers = await make_user("batch@example.com")
+        _, other_headers = await make_user("batch-other@example.com")
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            simple_id = (await client.post("/habits/", json={"name": "Leer"}, headers=headers)).json()["id"]
+            timer_id = (await client.post("/habits/", json={
+                "name": "Correr", "habit_type": "timer"}, headers=headers)).json()["id"]
+            foreign_id = (await client.post("/habits/", json={"name": "Ajeno"}, headers=other_headers)).json()["id"]
+            await client.post(f"/habits/{simple_id}/complete", json={"completion_date": "2024-05-01"}, headers=headers)
+
+            response = await client.post("/habits/batch", json={"operations": [
+                {"op": "complete", "habit_id": simple_id, "completion_date": "2024-05-02"},
+                {"op": "complete", "habit_id": simple_id, "completion_date": "2024-05-01"},
+                {"op": "uncomplete", "habit_id": simple_id, "completion_date": "2024-05-03"},
+                {"op": "complete", "habit_id": foreign_id, "completion_date": "2024-05-02"},
+                {"op": "complete", "habit_id": 999999, "completion_date": "2024-05-02"},
+                {"op": "track", "habit_id": simple_id, "completion_date": "2024-05-02"},
+                {"op": "track", "habit_id": timer_id, "completion_date": "2024-05-02", "value": 10},
+                {"op": "track", "habit_id": timer_id, "completion_date": "2024-05-02", "value": 5},
+                {"op": "uncomplete", "habit_id": simple_id, "completion_date": "2024-05-01"},
+                {"op": "uncomplete", "habit_id": simple_id, "completion_date": "2024-05-01"},
+            ]}, headers=headers)
+            assert response.status_code == 200
+            body = response.json()
+            assert [result["status_code"] for result in body["results"]] == [
+                200, 409, 404, 403, 404, 400, 200, 200, 204, 404]
+            assert [result["value"] for result in body["results"]][6:8] == [10, 15]
+            assert (body["applied"], body["failed"]) == (4, 6)
+
+            dates = [completion["completion_date"] for completion in
+                     (await client.get(f"/habits/{simple_id}/completions", headers=headers)).json()]
+            assert dates == ["2024-05-02"]
+            (timer_completion,) = (await client.get(f"/habits/{timer_id}/completions", headers=headers)).json()
+            assert timer_completion["value"] == 15
+            assert (await client.get(f"/habits/{foreign_id}/completions", headers=other_headers)).json() == []
+
+            etag = (await client.get("/habits/", headers=headers)).headers["etag"]
+            response = await client.post("/habits/batch", json={"operations": [
+                {"op": "complete", "habit_id": foreign_id}]}, headers=headers)
+            assert response.json()["applied"] == 0
+            response = await client.get("/habits/", headers={**headers, "If-None-Match": etag})
+            assert response.status_code == 304
+
+            response = await client.post("/habits/batch", json={"operations": [
+                {"op": "complete", "habit_id": simple_id}] * 1001}, headers=headers)
+            assert response.status_code == 400
+
+    asyncio.run(scenario())
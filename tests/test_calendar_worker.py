@@ -0,0 +1,185 @@
+import asyncio
+import json
+from itertools import count
+
+import httpx
+from sqlmodel import select
+
+from calendar_worker import CalendarSyncWorker
+from database import async_session_maker, create_db_and_tables
+from main import app
+from models.calendar_models import CalendarOperation, CalendarSyncTask, CalendarTaskStatus
+from models.habit_models import CalendarSyncStatus, Habit
+from models.user_models import User
+
+
+class FakeCalendar:
+    """
+    Imita el endpoint por lotes de Google Calendar: interpreta el cuerpo
+    multipart/mixed, aplica cada operación sobre `events` y responde con
+    una parte por operación. `on_request` se llama antes de responder,
+    para simular cambios del usuario mientras el lote está en vuelo.
+    """
+
+    def __init__(self, on_request=None):
+        self.events: dict[str, dict] = {}
+        self.calls: list[tuple[str, str]] = []
+        self.on_request = on_request
+        self._ids = count(1)
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        boundary = request.headers["content-type"].split("boundary=")[1]
+        parts = [part for part in request.content.decode().split(f"--{boundary}")
+                 if part.strip() and part.strip() != "--"]
+
+        if self.on_request is not None:
+            await self.on_request(self)
+
+        responses = []
+        for index, part in enumerate(parts):
+            request_line = next(line for line in part.split("\r\n") if " HTTP/1.1" in line)
+            method, path, _ = request_line.split(" ")
+            body = part.split("\r\n\r\n", 2)[2].strip() if method != "DELETE" else ""
+            self.calls.append((method, path))
+            status, payload = self._apply(method, path.rsplit("/", 1)[-1], json.loads(body) if body else None)
+            responses += [
+                "--response_boundary",
+                "Content-Type: application/http",
+                f"Content-ID: <response-item{index}>",
+                "",
+                f"HTTP/1.1 {status} OK",
+                "Content-Type: application/json",
+                "",
+                json.dumps(payload) if payload is not None else "",
+            ]
+        responses.append("--response_boundary--")
+        return httpx.Response(
+            200, content="\r\n".join(responses).encode(),
+            headers={"Content-Type": "multipart/mixed; boundary=response_boundary"})
+
+    def _apply(self, method: str, event_id: str, body: dict | None) -> tuple[int, dict | None]:
+        if method == "POST":
+            event_id = f"event{next(self._ids)}"
+            self.events[event_id] = {**body, "id": event_id}
+            return 200, self.events[event_id]
+        if event_id not in self.events:
+            return 404, {"error": {"code": 404}}
+        if method == "PATCH":
+            self.events[event_id].update(body)
+            return 200, self.events[event_id]
+        del self.events[event_id]
+        return 204, None
+
+
+async def _setup(make_user, email: str):
+    await create_db_and_tables()
+    user_id, headers = await make_user(email)
+    async with async_session_maker() as session:
+        user = await session.get(User, user_id)
+        user.google_access_token = "token"
+        session.add(user)
+        await session.commit()
+    return user_id, headers
+
+
+async def _drain(worker: CalendarSyncWorker) -> None:
+    while await worker.drain_once():
+        await asyncio.gather(*worker._jobs)
+
+
+async def _tasks(user_id: int) -> list[CalendarSyncTask]:
+    async with async_session_maker() as session:
+        return list((await session.exec(select(CalendarSyncTask).where(
+            CalendarSyncTask.user_id == user_id).order_by(CalendarSyncTask.id))).all())
+
+
+def _api_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+
+
+def _worker(calendar: FakeCalendar) -> CalendarSyncWorker:
+    http_client = httpx.AsyncClient(transport=httpx.MockTransport(calendar.handle))
+    return CalendarSyncWorker(async_session_maker, http_client)
+
+
+def test_create_update_and_delete_reach_the_calendar(make_user):
+    async def scenario():
+        user_id, headers = await _setup(make_user, "calendar-crud@example.com")
+        calendar = FakeCalendar()
+        worker = _worker(calendar)
+
+        async with _api_client() as client:
+            habit_id = (await client.post("/habits/", json={
+                "name": "Correr", "sync_to_calendar": True}, headers=headers)).json()["id"]
+            await _drain(worker)
+
+            async with async_session_maker() as session:
+                habit = await session.get(Habit, habit_id)
+            assert habit.calendar_sync_status == CalendarSyncStatus.SYNCED
+            assert calendar.events[habit.google_event_id]["summary"] == "Hábito: Correr"
+
+            await client.patch(f"/habits/{habit_id}", json={"name": "Nadar"}, headers=headers)
+            await _drain(worker)
+            assert calendar.events[habit.google_event_id]["summary"] == "Hábito: Nadar"
+
+            await client.delete(f"/habits/{habit_id}", headers=headers)
+            await _drain(worker)
+
+        assert calendar.events == {}
+        assert [method for method, _ in calendar.calls] == ["POST", "PATCH", "DELETE"]
+        assert {task.status for task in await _tasks(user_id)} == {CalendarTaskStatus.DONE}
+
+    asyncio.run(scenario())
+
+
+def test_habit_deleted_while_its_create_is_in_flight(make_user):
+    """
+    El usuario borra el hábito mientras Google crea su evento: el lote no
+    falla, los demás hábitos guardan su evento una sola vez y el evento
+    del hábito borrado se elimina en el siguiente lote.
+    """
+    async def scenario():
+        user_id, headers = await _setup(make_user, "calendar-race@example.com")
+        async with _api_client() as client:
+            habit_ids = [(await client.post("/habits/", json={
+                "name": f"Hábito {index}", "sync_to_calendar": True}, headers=headers)).json()["id"]
+                for index in range(3)]
+
+            async def delete_first_habit(calendar: FakeCalendar) -> None:
+                if len(calendar.calls) == 0:
+                    response = await client.delete(f"/habits/{habit_ids[0]}", headers=headers)
+                    assert response.status_code == 204
+
+            calendar = FakeCalendar(on_request=delete_first_habit)
+            worker = _worker(calendar)
+            await _drain(worker)
+
+        assert [method for method, _ in calendar.calls] == ["POST", "POST", "POST", "DELETE"]
+        async with async_session_maker() as session:
+            habits = (await session.exec(select(Habit).where(Habit.id.in_(habit_ids)))).all()
+        assert sorted(calendar.events) == sorted(habit.google_event_id for habit in habits)
+        assert all(habit.calendar_sync_status == CalendarSyncStatus.SYNCED for habit in habits)
+        assert {task.status for task in await _tasks(user_id)} == {CalendarTaskStatus.DONE}
+
+    asyncio.run(scenario())
+
+
+def test_unexpected_error_counts_as_a_failed_attempt(make_user):
+    async def scenario():
+        user_id, headers = await _setup(make_user, "calendar-crash@example.com")
+        async with _api_client() as client:
+            await client.post("/habits/", json={"name": "Leer", "sync_to_calendar": True}, headers=headers)
+
+        def explode(request: httpx.Request) -> httpx.Response:
+            raise RuntimeError("fallo inesperado")
+
+        http_client = httpx.AsyncClient(transport=httpx.MockTransport(explode))
+        await _drain(CalendarSyncWorker(async_session_maker, http_client))
+
+        (task,) = await _tasks(user_id)
+        assert task.operation == CalendarOperation.CREATE
+        assert task.status == CalendarTaskStatus.PENDING
+        assert task.attempts == 1
+        assert "fallo inesperado" in task.last_error
+
+    asyncio.run(scenario())
@@ -0,0 +1,33 @@
+import asyncio
+
+import httpx
+from sqlmodel import update
+
+from database import async_session_maker, create_db_and_tables
+from main import app
+from models.user_models import User
+
+
+def test_etag_follows_writes_made_by_other_processes(make_user):
+    """
+    Otro proceso que escribe sube `data_version` en la base de datos pero
+    no puede vaciar la caché de usuarios de este: el ETag no debe venir
+    de esa caché.
+    """
+    async def scenario():
+        await create_db_and_tables()
+        user_id, headers = await make_user("etag@example.com")
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            etag = (await client.get("/habits/", headers=headers)).headers["etag"]
+            response = await client.get("/habits/", headers={**headers, "If-None-Match": etag})
+            assert response.status_code == 304
+
+            async with async_session_maker() as session:
+                await session.exec(update(User).where(User.id == user_id).values(data_version=User.data_version + 1))
+                await session.commit()
+
+            response = await client.get("/habits/", headers={**headers, "If-None-Match": etag})
+            assert response.status_code == 200
+            assert response.headers["etag"] != etag
+
+    asyncio.run(scenario())
@@ -0,0 +1,49 @@
+import asyncio
+import csv
+import io
+import json
+
+import httpx
+
+from database import async_session_maker, create_db_and_tables
+from main import app
+from models.habit_models import Habit
+
+
+def test_export_keeps_every_habit_field_and_round_trips_through_import(make_user):
+    async def scenario():
+        await create_db_and_tables()
+        _, headers = await make_user("export@example.com")
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            habit_id = (await client.post("/habits/", json={
+                "name": "Agua", "habit_type": "frequency", "frequency_count": 3,
+                "scheduled_time": "08:30:00"}, headers=headers)).json()["id"]
+            async with async_session_maker() as session:
+                habit = await session.get(Habit, habit_id)
+                habit.frequency_period = "weekly"
+                session.add(habit)
+                await session.commit()
+            for _ in range(2):
+                await client.post(f"/habits/{habit_id}/track", json={"value": 4}, headers=headers)
+
+            export = (await client.get("/users/export", headers=headers)).text
+            (row,) = [json.loads(line) for line in export.splitlines()]
+            assert row["frequency_period"] == "weekly"
+            assert row["frequency_count"] == 3
+            assert row["scheduled_time"] == "08:30:00"
+            assert row["calendar_sync_status"] is None
+            assert row["value"] == 8
+
+            csv_export = (await client.get("/users/export", params={"format": "csv"}, headers=headers)).text
+            (csv_row,) = csv.DictReader(io.StringIO(csv_export))
+            assert csv_row["frequency_period"] == "weekly"
+
+            copy_id = (await client.post("/habits/", json={
+                "name": row["habit_name"], "habit_type": row["habit_type"]}, headers=headers)).json()["id"]
+            response = await client.post(f"/habits/{copy_id}/completions/import", content=export.encode(),
+                                         headers={**headers, "Content-Type": "application/x-ndjson"})
+            assert response.json() == {"entries_created": 1, "entries_skipped": 0}
+            (completion,) = (await client.get(f"/habits/{copy_id}/completions", headers=headers)).json()
+            assert (completion["completion_date"], completion["value"]) == (row["completion_date"], 8)
+
+    asyncio.run(scenario())
@@ -0,0 +1,113 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import httpx
+import pytest
+
+from database import async_session_maker, create_db_and_tables
+from google_token_services import GoogleTokenError, GoogleTokenManager
+from models.calendar_models import CalendarSyncTask
+from models.user_models import User
+
+
+async def _user_with_tokens(email: str, expires_in: timedelta) -> int:
+    await create_db_and_tables()
+    async with async_session_maker() as session:
+        user = User(google_id=email, email=email, full_name="Test",
+                    google_access_token="old", google_refresh_token="refresh",
+                    google_token_expires_at=datetime.now(timezone.utc) + expires_in)
+        session.add(user)
+        await session.commit()
+        return user.id
+
+
+def _manager(handler) -> GoogleTokenManager:
+    return GoogleTokenManager(async_session_maker, httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+
+
+@pytest.mark.parametrize("response", [
+    httpx.Response(200, text="<html>no es JSON</html>"),
+    httpx.Response(200, json={"token_type": "Bearer"}),
+    httpx.Response(200, json=["access_token"]),
+])
+def test_unexpected_token_response_is_a_token_error(response):
+    async def scenario():
+        user_id = await _user_with_tokens(f"bad-token-{id(response)}@example.com", timedelta(0))
+        with pytest.raises(GoogleTokenError):
+            await _manager(lambda request: response).refresh(user_id)
+
+    asyncio.run(scenario())
+
+
+def test_forced_refresh_does_not_reuse_a_normal_one_in_flight():
+    async def scenario():
+        user_id = await _user_with_tokens("forced-refresh@example.com", timedelta(hours=1))
+        manager = _manager(lambda request: httpx.Response(
+            200, json={"access_token": "new", "expires_in": 3600}))
+        # El token aún no caduca: el refresco normal no llega a llamar a Google.
+        normal = asyncio.create_task(manager.refresh(user_id))
+        forced = asyncio.create_task(manager.refresh(user_id, force=True))
+
+        assert (await normal).access_token == "old"
+        assert (await forced).access_token == "new"
+
+    asyncio.run(scenario())
+
+
+def test_sweep_only_refreshes_users_with_pending_calendar_sync():
+    async def scenario():
+        dormant_id = await _user_with_tokens("dormant@example.com", timedelta(minutes=1))
+        active_id = await _user_with_tokens("active@example.com", timedelta(minutes=1))
+        async with async_session_maker() as session:
+            session.add(CalendarSyncTask(user_id=active_id, habit_id=1))
+            await session.commit()
+
+        await _manager(lambda request: httpx.Response(
+            200, json={"access_token": "new", "expires_in": 3600})).sweep()
+        async with async_session_maker() as session:
+            assert (await session.get(User, dormant_id)).google_access_token == "old"
+            assert (await session.get(User, active_id)).google_access_token == "new"
+
+    asyncio.run(scenario())
+
+
+def test_no_database_connection_is_held_while_google_answers():
+    async def scenario():
+        from database import engine
+
+        user_id = await _user_with_tokens("no-connection-held@example.com", timedelta(0))
+        checked_out = []
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            checked_out.append(engine.pool.checkedout())
+            return httpx.Response(200, json={"access_token": "new", "expires_in": 3600, "refresh_token": "rotated"})
+
+        token = await _manager(handler).refresh(user_id)
+        assert token.access_token == "new"
+        assert checked_out == [0]
+        async with async_session_maker() as session:
+            user = await session.get(User, user_id)
+        assert (user.google_access_token, user.google_refresh_token) == ("new", "rotated")
+
+    asyncio.run(scenario())
+
+
+def test_revoked_grant_only_clears_the_refresh_token_it_used():
+    async def scenario():
+        user_id = await _user_with_tokens("revoked@example.com", timedelta(0))
+
+        async def handler(request: httpx.Request) -> httpx.Response:
+            # El usuario vuelve a iniciar sesión mientras Google responde.
+            async with async_session_maker() as session:
+                user = await session.get(User, user_id)
+                user.google_refresh_token = "relogin"
+                session.add(user)
+                await session.commit()
+            return httpx.Response(400, json={"error": "invalid_grant"})
+
+        with pytest.raises(GoogleTokenError):
+            await _manager(handler).refresh(user_id)
+        async with async_session_maker() as session:
+            assert (await session.get(User, user_id)).google_refresh_token == "relogin"
+
+    asyncio.run(scenario())
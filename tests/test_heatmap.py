@@ -0,0 +1,28 @@
+import asyncio
+
+import httpx
+from sqlmodel import select
+
+from database import async_session_maker, create_db_and_tables
+from main import app
+from models.habit_models import HabitCompletionBitmap
+
+
+def test_heatmap_reads_any_year_without_writing(make_user):
+    async def scenario():
+        await create_db_and_tables()
+        _, headers = await make_user("heatmap@example.com")
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            habit_id = (await client.post("/habits/", json={"name": "Meditar"}, headers=headers)).json()["id"]
+            for year, days in ((9999, 365), (2024, 366), (1, 365)):
+                response = await client.get(f"/habits/{habit_id}/heatmap", params={"year": year}, headers=headers)
+                assert response.status_code == 200, response.text
+                assert response.json()["days_in_year"] == days
+                assert response.json()["total_completions"] == 0
+
+        async with async_session_maker() as session:
+            bitmaps = (await session.exec(select(HabitCompletionBitmap).where(
+                HabitCompletionBitmap.habit_id == habit_id))).all()
+        assert bitmaps == []
+
+    asyncio.run(scenario())
@@ -0,0 +1,57 @@
+import asyncio
+import json
+
+import httpx
+from sqlmodel import func, select
+
+from database import async_session_maker, create_db_and_tables
+from main import app
+from models.habit_models import HabitCompletion
+
+NDJSON = {"Content-Type": "application/x-ndjson"}
+
+
+async def _import(client: httpx.AsyncClient, habit_id: int, headers: dict, body: bytes, content_type: dict = NDJSON) -> httpx.Response:
+    return await client.post(f"/habits/{habit_id}/completions/import",
+                             content=body, headers={**headers, **content_type})
+
+
+async def _count(habit_id: int) -> int:
+    async with async_session_maker() as session:
+        return (await session.exec(select(func.count()).select_from(HabitCompletion).where(
+            HabitCompletion.habit_id == habit_id))).one()
+
+
+def test_import_writes_in_chunks_and_rejects_bad_rows(make_user, monkeypatch):
+    monkeypatch.setattr("completion_services.IMPORT_CHUNK_SIZE", 3)
+
+    async def scenario():
+        await create_db_and_tables()
+        _, headers = await make_user("import@example.com")
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            habit_id = (await client.post("/habits/", json={
+                "name": "Correr", "habit_type": "timer"}, headers=headers)).json()["id"]
+
+            rows = [json.dumps({"completion_date": f"2024-01-{day:02d}", "value": day}) for day in range(1, 11)]
+            response = await _import(client, habit_id, headers, "\n".join(rows + rows[:2]).encode())
+            assert response.status_code == 200, response.text
+            assert response.json() == {"entries_created": 10, "entries_skipped": 2}
+
+            bad_bodies = [
+                b'{"completion_date": "2024-02-01"}\n{"completion_date": "2024-02-02", "value": 1e400}',
+                b'{"completion_date": "2024-02-01", "value": 99999999999999999999}',
+                b'{"completion_date": "2024-02-01", "value": 1.5}',
+                b'{"completion_date": "2024-02-01", "value": true}',
+                b'{"completion_date": "2024-02-01", "value": false}',
+                b'{"completion_date": "2024-02-01"}\n{"completion_date": "2024-02-\xff02"}',
+            ]
+            for body in bad_bodies:
+                response = await _import(client, habit_id, headers, body)
+                assert response.status_code == 400, response.text
+            response = await _import(client, habit_id, headers, b"2024-02-01,\xe9\n", {"Content-Type": "text/csv"})
+            assert response.status_code == 400, response.text
+            assert "Línea 1" in response.json()["detail"]
+
+        assert await _count(habit_id) == 10
+
+    asyncio.run(scenario())
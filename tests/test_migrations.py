@@ -0,0 +1,62 @@
+from sqlalchemy import create_engine, inspect
+from sqlmodel import SQLModel
+
+from migrations import run_migrations
+
+# Esquema de las tablas tal y como las creaba la primera versión de la app.
+OLD_SCHEMA = [
+    """CREATE TABLE user (
+        id INTEGER NOT NULL PRIMARY KEY, google_id VARCHAR NOT NULL, email VARCHAR NOT NULL,
+        full_name VARCHAR NOT NULL, picture_url VARCHAR, timezone VARCHAR,
+        google_access_token VARCHAR, google_refresh_token VARCHAR,
+        google_token_expires_at DATETIME, created_at DATETIME NOT NULL, is_active BOOLEAN NOT NULL)""",
+    """CREATE TABLE habit (
+        id INTEGER NOT NULL PRIMARY KEY, name VARCHAR NOT NULL, description VARCHAR,
+        habit_type VARCHAR(9) NOT NULL, frequency_count INTEGER, frequency_period VARCHAR,
+        target_minutes INTEGER, created_at DATETIME NOT NULL, scheduled_time TIME,
+        user_id INTEGER REFERENCES user (id))""",
+    """CREATE TABLE habitcompletion (
+        id INTEGER NOT NULL PRIMARY KEY, completion_date DATE NOT NULL, value INTEGER,
+        habit_id INTEGER REFERENCES habit (id))""",
+    "INSERT INTO user VALUES (1, 'g', 'a@example.com', 'A', NULL, NULL, NULL, NULL, NULL, '2024-01-01', 1)",
+    "INSERT INTO habit (id, name, habit_type, created_at, user_id) VALUES (1, 'Leer', 'TIMER', '2024-01-01', 1)",
+    "INSERT INTO habitcompletion (completion_date, value, habit_id) VALUES "
+    "('2024-01-01', 5, 1), ('2024-01-01', 7, 1), ('2024-01-02', 3, 1)",
+]
+
+
+def _migrate(engine) -> None:
+    with engine.begin() as connection:
+        SQLModel.metadata.create_all(connection)
+        run_migrations(connection)
+
+
+def test_old_database_is_upgraded(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    with engine.begin() as connection:
+        for statement in OLD_SCHEMA:
+            connection.exec_driver_sql(statement)
+
+    _migrate(engine)
+    _migrate(engine)
+
+    inspector = inspect(engine)
+    assert {"calendar_sync_status", "google_event_id"} <= {
+        column["name"] for column in inspector.get_columns("habit")}
+    assert "data_version" in {column["name"] for column in inspector.get_columns("user")}
+    assert "ix_habit_user_id" in {index["name"] for index in inspector.get_indexes("habit")}
+    assert any(index["unique"] and index["column_names"] == ["habit_id", "completion_date"]
+               for index in inspector.get_indexes("habitcompletion"))
+
+    with engine.connect() as connection:
+        rows = connection.exec_driver_sql(
+            "SELECT completion_date, value FROM habitcompletion ORDER BY completion_date").all()
+        assert [tuple(row) for row in rows] == [("2024-01-01", 12), ("2024-01-02", 3)]
+        assert connection.exec_driver_sql("SELECT data_version FROM user").scalar() == 0
+
+
+def test_new_database_needs_no_migration(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'new.db'}")
+    _migrate(engine)
+    indexes = inspect(engine).get_indexes("habitcompletion")
+    assert not any(index["name"] == "uq_habitcompletion_habit_date" for index in indexes)
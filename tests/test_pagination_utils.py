@@ -0,0 +1,25 @@
+from datetime import date
+
+import pytest
+from fastapi import HTTPException
+
+from utils.pagination_utils import decode_cursor, encode_cursor
+
+
+def test_cursor_round_trip():
+    cursor = encode_cursor(date(2024, 3, 1), 42)
+    assert decode_cursor(cursor, date, int) == [date(2024, 3, 1), 42]
+
+
+@pytest.mark.parametrize("cursor, types", [
+    ("no-es-base64!", (int,)),
+    (encode_cursor("a"), (int,)),
+    (encode_cursor(True), (int,)),
+    (encode_cursor(1, 2), (int,)),
+    (encode_cursor(1, 2), (date, int)),
+    (encode_cursor("2024-02-30", 1), (date, int)),
+])
+def test_invalid_cursor_is_a_400(cursor, types):
+    with pytest.raises(HTTPException) as error:
+        decode_cursor(cursor, *types)
+    assert error.value.status_code == 400
@@ -0,0 +1,53 @@
+import asyncio
+
+import httpx
+
+from database import async_session_maker, create_db_and_tables
+from main import app
+from rollup_services import rebuild_rollups
+
+
+def test_rollups_accumulate_on_write_and_match_a_rebuild(make_user):
+    async def scenario():
+        await create_db_and_tables()
+        _, headers = await make_user("rollups@example.com")
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            habit_id = (await client.post("/habits/", json={
+                "name": "Correr", "habit_type": "timer"}, headers=headers)).json()["id"]
+            base = f"/habits/{habit_id}"
+            params = {"from": "2024-01-01", "to": "2024-03-31"}
+
+            async def periods(period: str) -> list[dict]:
+                response = await client.get(f"{base}/periods", params={**params, "period": period}, headers=headers)
+                assert response.status_code == 200, response.text
+                return response.json()
+
+            # Lunes 2024-01-29 a domingo 2024-02-04: una semana ISO en dos meses.
+            await client.post(f"{base}/completions/bulk", json={
+                "dates": ["2024-01-29", "2024-01-31", "2024-02-01", "2024-02-04"]}, headers=headers)
+            await client.post(f"{base}/completions/import", content=(
+                b'{"completion_date": "2024-02-10", "value": 30}\n'
+                b'{"completion_date": "2024-03-05", "value": 20}\n'),
+                headers={**headers, "Content-Type": "application/x-ndjson"})
+            await client.post("/habits/batch", json={"operations": [
+                {"op": "track", "habit_id": habit_id, "completion_date": "2024-02-01", "value": 7},
+                {"op": "track", "habit_id": habit_id, "completion_date": "2024-02-12", "value": 5},
+            ]}, headers=headers)
+            await client.delete(f"{base}/complete", params={"completion_date": "2024-01-31"}, headers=headers)
+
+            assert await periods("month") == [
+                {"period_start": "2024-01-01", "period_end": "2024-01-31", "completions": 1, "total_value": 0},
+                {"period_start": "2024-02-01", "period_end": "2024-02-29", "completions": 4, "total_value": 42},
+                {"period_start": "2024-03-01", "period_end": "2024-03-31", "completions": 1, "total_value": 20},
+            ]
+            weeks = await periods("week")
+            assert [(week["period_start"], week["completions"], week["total_value"]) for week in weeks] == [
+                ("2024-01-29", 3, 7), ("2024-02-05", 1, 30), ("2024-02-12", 1, 5), ("2024-03-04", 1, 20)]
+
+            accumulated = {period: await periods(period) for period in ("week", "month")}
+            async with async_session_maker() as session:
+                assert await rebuild_rollups(session, [habit_id]) == 1
+                await session.commit()
+            assert {period: await periods(period) for period in ("week", "month")} == accumulated
+
+    asyncio.run(scenario())
@@ -0,0 +1,148 @@
+import asyncio
+from datetime import date, timedelta
+
+import httpx
+from sqlmodel import delete, select
+
+from database import async_session_maker, create_db_and_tables
+from main import app
+from models.habit_models import HabitCompletion, HabitStatsSnapshot
+from utils.streak_utils import compute_streaks
+
+BASE_DATE = date(2024, 1, 1)
+
+
+def _day(offset: int) -> str:
+    return (BASE_DATE + timedelta(days=offset)).isoformat()
+
+
+def _api_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+
+
+async def _assert_matches_recompute(habit_id: int) -> None:
+    """
+    La proyección mantenida paso a paso coincide con un recálculo completo.
+    """
+    async with async_session_maker() as session:
+        snapshot = await session.get(HabitStatsSnapshot, habit_id)
+        dates = list((await session.exec(select(HabitCompletion.completion_date).where(
+            HabitCompletion.habit_id == habit_id).order_by(HabitCompletion.completion_date))).all())
+    current_run, longest_streak, total_completions = compute_streaks(dates)
+    assert (snapshot.current_run, snapshot.longest_streak, snapshot.total_completions,
+            snapshot.last_completion_date) == (
+        current_run, longest_streak, total_completions, dates[-1] if dates else None), dates
+
+
+def test_projection_matches_a_full_recompute_after_each_write(make_user):
+    async def scenario():
+        await create_db_and_tables()
+        _, headers = await make_user("stats-projection@example.com")
+        async with _api_client() as client:
+            habit_id = (await client.post("/habits/", json={"name": "Correr"}, headers=headers)).json()["id"]
+            base = f"/habits/{habit_id}"
+
+            async def complete(offset: int) -> None:
+                response = await client.post(f"{base}/complete", json={"completion_date": _day(offset)}, headers=headers)
+                assert response.status_code == 200, response.text
+
+            async def unmark(offset: int) -> None:
+                response = await client.delete(f"{base}/complete", params={"completion_date": _day(offset)}, headers=headers)
+                assert response.status_code == 204, response.text
+
+            await _assert_matches_recompute(habit_id)
+            steps = [
+                # Añadir al final: la misma racha y una nueva.
+                lambda: complete(0), lambda: complete(1), lambda: complete(2), lambda: complete(10),
+                # Rellenos hacia atrás: aislado y uniendo dos rachas.
+                lambda: complete(5), lambda: complete(4), lambda: complete(3),
+                # Borrados dentro de una racha, al final de la última y el último día.
+                lambda: unmark(2), lambda: unmark(10), lambda: unmark(5),
+            ]
+            for step in steps:
+                await step()
+                await _assert_matches_recompute(habit_id)
+
+            response = await client.post(f"{base}/completions/bulk", json={
+                "dates": [_day(20), _day(21), _day(15), _day(1)]}, headers=headers)
+            assert response.json() == {"entries_created": 3}
+            await _assert_matches_recompute(habit_id)
+
+            response = await client.post("/habits/batch", json={"operations": [
+                {"op": "complete", "habit_id": habit_id, "completion_date": _day(22)},
+                {"op": "uncomplete", "habit_id": habit_id, "completion_date": _day(0)},
+                {"op": "complete", "habit_id": habit_id, "completion_date": _day(16)},
+            ]}, headers=headers)
+            assert response.json()["applied"] == 3
+            await _assert_matches_recompute(habit_id)
+
+            response = await client.post(f"{base}/completions/import",
+                                          content=f'{{"date": "{_day(30)}"}}\n{{"date": "{_day(17)}"}}\n'.encode(),
+                                          headers={**headers, "Content-Type": "application/x-ndjson"})
+            assert response.json()["entries_created"] == 2
+            await _assert_matches_recompute(habit_id)
+
+            timer_id = (await client.post("/habits/", json={
+                "name": "Leer", "habit_type": "timer"}, headers=headers)).json()["id"]
+            for _ in range(2):
+                assert (await client.post(f"/habits/{timer_id}/track", json={"value": 5}, headers=headers)).status_code == 200
+                await _assert_matches_recompute(timer_id)
+
+    asyncio.run(scenario())
+
+
+def test_concurrent_first_reads_build_the_snapshot_once(make_user):
+    """
+    Hábitos sin proyección (como los creados antes de que existiera): las
+    primeras lecturas simultáneas la construyen sin chocar entre ellas.
+    """
+    async def scenario():
+        await create_db_and_tables()
+        _, headers = await make_user("stats-first-access@example.com")
+        async with _api_client() as client:
+            habit_ids = [(await client.post("/habits/", json={"name": f"Hábito {index}"}, headers=headers)).json()["id"]
+                         for index in range(3)]
+            for offset in (0, 1, 3):
+                await client.post(f"/habits/{habit_ids[0]}/complete", json={"completion_date": _day(offset)}, headers=headers)
+            async with async_session_maker() as session:
+                await session.exec(delete(HabitStatsSnapshot).where(HabitStatsSnapshot.habit_id.in_(habit_ids)))
+                await session.commit()
+
+            responses = await asyncio.gather(*(
+                client.get(f"/habits/{habit_id}/stats", headers=headers)
+                for habit_id in habit_ids for _ in range(15)
+            ))
+            assert [response.status_code for response in responses] == [200] * len(responses)
+            assert {response.json()["total_completions"] for response in responses[:15]} == {3}
+
+        for habit_id in habit_ids:
+            await _assert_matches_recompute(habit_id)
+
+    asyncio.run(scenario())
+
+
+def test_parallel_dashboards_build_missing_snapshots_once(make_user):
+    async def scenario():
+        await create_db_and_tables()
+        _, headers = await make_user("stats-dashboard@example.com")
+        async with _api_client() as client:
+            habit_ids = [(await client.post("/habits/", json={"name": f"Hábito {index}"}, headers=headers)).json()["id"]
+                         for index in range(5)]
+            for offset in (0, 1):
+                await client.post(f"/habits/{habit_ids[1]}/complete", json={"completion_date": _day(offset)}, headers=headers)
+
+            for _ in range(3):
+                async with async_session_maker() as session:
+                    await session.exec(delete(HabitStatsSnapshot).where(HabitStatsSnapshot.habit_id.in_(habit_ids)))
+                    await session.commit()
+
+                responses = await asyncio.gather(
+                    *(client.get("/habits/dashboard", headers=headers) for _ in range(15)),
+                    *(client.get(f"/habits/{habit_ids[1]}/stats", headers=headers) for _ in range(5)))
+                assert [response.status_code for response in responses] == [200] * len(responses)
+                assert [item["total_completions"] for item in responses[0].json()] == [0, 2, 0, 0, 0]
+
+        for habit_id in habit_ids:
+            await _assert_matches_recompute(habit_id)
+
+    asyncio.run(scenario())
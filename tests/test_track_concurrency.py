@@ -0,0 +1,34 @@
+import asyncio
+
+import httpx
+
+from main import app
+
+TRACK_CALLS = 300
+
+
+def test_parallel_track_calls_add_up(make_user):
+    """
+    Cientos de `/track` simultáneos sobre el mismo hábito y día: el
+    incremento atómico no pierde ninguno y la fila es una sola.
+    """
+    async def scenario():
+        async with app.router.lifespan_context(app):
+            _, headers = await make_user("track-concurrency@example.com")
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                response = await client.post(
+                    "/habits/", json={"name": "Leer", "habit_type": "timer"}, headers=headers)
+                habit_id = response.json()["id"]
+
+                responses = await asyncio.gather(*(
+                    client.post(f"/habits/{habit_id}/track", json={"value": 1}, headers=headers)
+                    for _ in range(TRACK_CALLS)
+                ))
+                assert [r.status_code for r in responses] == [200] * TRACK_CALLS
+
+                completions = (await client.get(
+                    f"/habits/{habit_id}/completions", headers=headers)).json()
+                assert [completion["value"] for completion in completions] == [TRACK_CALLS]
+
+    asyncio.run(scenario())
@@ -0,0 +1,59 @@
+import asyncio
+from datetime import date
+
+import httpx
+from sqlmodel import select
+
+import tracking_buffer
+from database import async_session_maker, create_db_and_tables
+from main import app
+from models.habit_models import HabitCompletion
+from tracking_buffer import TrackingBuffer
+
+
+async def _stored_value(habit_id: int) -> int | None:
+    async with async_session_maker() as session:
+        return (await session.exec(select(HabitCompletion.value).where(
+            HabitCompletion.habit_id == habit_id, HabitCompletion.completion_date == date.today()))).first()
+
+
+def test_write_behind_flushes_on_read_and_on_shutdown(make_user, monkeypatch):
+    # Sin volcado periódico durante el test: solo las lecturas y el cierre escriben.
+    monkeypatch.setattr(tracking_buffer, "TRACK_FLUSH_INTERVAL_SECONDS", 3600)
+
+    async def scenario():
+        await create_db_and_tables()
+        _, headers = await make_user("write-behind@example.com")
+        buffer = TrackingBuffer(async_session_maker)
+        monkeypatch.setattr(app.state, "tracking_buffer", buffer, raising=False)
+        buffer.start()
+        try:
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+                habit_id = (await client.post("/habits/", json={
+                    "name": "Leer", "habit_type": "timer"}, headers=headers)).json()["id"]
+
+                async def track(value: int) -> int:
+                    response = await client.post(f"/habits/{habit_id}/track", json={"value": value}, headers=headers)
+                    assert response.status_code == 200, response.text
+                    return response.json()["value"]
+
+                # La primera del día se escribe al momento; las siguientes se acumulan.
+                assert await track(5) == 5
+                assert await _stored_value(habit_id) == 5
+                assert [await track(3), await track(2)] == [8, 10]
+                assert await _stored_value(habit_id) == 5
+
+                (completion,) = (await client.get(f"/habits/{habit_id}/completions", headers=headers)).json()
+                assert completion["value"] == 10
+                assert await _stored_value(habit_id) == 10
+                stats = (await client.get(f"/habits/{habit_id}/stats", headers=headers)).json()
+                assert stats["total_completions"] == 1
+
+                assert await track(4) == 14
+                assert await _stored_value(habit_id) == 10
+        finally:
+            await buffer.stop()
+
+        assert await _stored_value(habit_id) == 14
+
+    asyncio.run(scenario())
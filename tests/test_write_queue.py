@@ -0,0 +1,83 @@
+import asyncio
+
+import httpx
+
+from database import async_session_maker, create_db_and_tables
+from main import app
+from write_queue import GroupCommitWriter
+
+
+def test_write_routes_go_through_the_group_commit_writer(make_user, monkeypatch):
+    async def scenario():
+        await create_db_and_tables()
+        _, headers = await make_user("write-queue@example.com")
+
+        writer = GroupCommitWriter(async_session_maker)
+        submitted = []
+        submit = writer.submit
+
+        async def counting_submit(unit):
+            submitted.append(unit.__name__)
+            return await submit(unit)
+
+        monkeypatch.setattr(writer, "submit", counting_submit)
+        monkeypatch.setattr(app.state, "write_queue", writer, raising=False)
+        writer.start()
+        try:
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+                habit_id = (await client.post("/habits/", json={"name": "Leer"}, headers=headers)).json()["id"]
+                base = f"/habits/{habit_id}"
+                responses = [
+                    await client.patch(base, json={"name": "Escribir"}, headers=headers),
+                    await client.post(f"{base}/complete", json={"completion_date": "2024-03-01"}, headers=headers),
+                    await client.delete(f"{base}/complete", params={"completion_date": "2024-03-01"}, headers=headers),
+                    await client.post(f"{base}/completions/bulk", json={"dates": ["2024-03-02", "2024-03-03"]}, headers=headers),
+                    await client.post("/habits/batch", json={"operations": [
+                        {"op": "complete", "habit_id": habit_id, "completion_date": "2024-03-04"}]}, headers=headers),
+                    await client.post(f"{base}/completions/import", content=b'{"completion_date": "2024-03-05"}\n',
+                                      headers={**headers, "Content-Type": "application/x-ndjson"}),
+                    await client.post("/habits/calendar/sync", headers=headers),
+                    await client.delete(base, headers=headers),
+                ]
+                assert [response.status_code for response in responses] == [200, 200, 204, 200, 200, 200, 200, 204]
+                assert responses[0].json()["name"] == "Escribir"
+                assert responses[3].json() == {"entries_created": 2}
+                assert responses[5].json() == {"entries_created": 1, "entries_skipped": 0}
+
+                assert (await client.delete(base, headers=headers)).status_code == 404
+        finally:
+            await writer.stop()
+
+        assert submitted == ["create", "update_habit", "complete", "unmark", "insert_bulk", "apply",
+                             "write_chunk", "recompute", "enqueue_all", "delete_habit"]
+
+    asyncio.run(scenario())
+
+
+def test_writer_statements_count_against_the_submitting_request():
+    async def scenario():
+        from sqlalchemy import text
+
+        from utils.metrics_utils import RequestQueries, _current_queries
+
+        await create_db_and_tables()
+        writer = GroupCommitWriter(async_session_maker)
+        writer.start()
+
+        async def unit(session):
+            await session.exec(text("SELECT 1"))
+            await session.exec(text("SELECT 2"))
+
+        async def request(queries: RequestQueries):
+            _current_queries.set(queries)
+            await writer.submit(unit)
+
+        first, second = RequestQueries(), RequestQueries()
+        try:
+            await asyncio.gather(request(first), request(second))
+        finally:
+            await writer.stop()
+        # Sus dos sentencias más el SAVEPOINT y su RELEASE.
+        assert (first.statements, second.statements) == (4, 4)
+
+    asyncio.run(scenario())
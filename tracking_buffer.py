@@ -0,0 +1,175 @@
+import asyncio
+import os
+from datetime import date
+
+from fastapi import Depends, Request
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from batch_services import apply_habit_batch
+from models.habit_models import Habit, HabitCompletion
+from models.user_models import User
+from schemas.habit_schemas import BatchOperationType, HabitBatchOperation, HabitCompletionRead
+from utils.auth_utils import get_current_user
+
+from dotenv import load_dotenv
+load_dotenv()
+
+
+TRACK_WRITE_BEHIND = os.getenv("TRACK_WRITE_BEHIND", "false").lower() in (
+    "1", "true", "yes", "on")
+# Como mucho se pierden los incrementos de este intervalo si el proceso muere.
+TRACK_FLUSH_INTERVAL_SECONDS = float(
+    os.getenv("TRACK_FLUSH_INTERVAL_SECONDS", "2"))
+# Claves (hábito, fecha) pendientes a partir de las cuales se vuelca sin esperar.
+TRACK_FLUSH_MAX_PENDING = int(os.getenv("TRACK_FLUSH_MAX_PENDING", "1000"))
+
+_COMPLETION_COLUMNS = [getattr(HabitCompletion, name)
+                       for name in HabitCompletionRead.model_fields]
+
+
+class TrackingBuffer:
+    """
+    Modo write-behind de `/track`: acumula en memoria los incrementos por
+    (hábito, fecha) de filas que ya existen y los vuelca cada
+    `TRACK_FLUSH_INTERVAL_SECONDS` (o al llegar a `TRACK_FLUSH_MAX_PENDING`
+    claves) con `apply_habit_batch`, un lote por usuario. Así una sesión de
+    temporizador que envía progreso cada pocos segundos no escribe ni hace
+    commit en cada petición.
+    - Lecturas: `flush_pending_tracks` vuelca lo pendiente del usuario antes
+      de las rutas que leen o modifican sus completitudes, y la respuesta de
+      `/track` ya suma lo pendiente.
+    - El lock evita que una respuesta de `/track` lea la fila a mitad de un
+      volcado y cuente dos veces (o ninguna) lo que se está escribiendo.
+    - Solo ve los incrementos de su propio proceso: pensado para un único
+      proceso de la app (p. ej. con SQLite).
+    """
+
+    def __init__(self, session_maker: async_sessionmaker):
+        self.session_maker = session_maker
+        self._pending: dict[int, dict[tuple[int, date], int]] = {}
+        self._size = 0
+        self._lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._closing = False
+        self._runner: asyncio.Task | None = None
+
+    def start(self) -> None:
+        self._runner = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """
+        Detiene el volcado periódico sin cortarlo a medias y vuelca lo que quede.
+        """
+        self._closing = True
+        self._wakeup.set()
+        if self._runner is not None:
+            await self._runner
+        try:
+            await self.flush()
+        except Exception as err:
+            print(f"Error al volcar el progreso pendiente al cerrar: {err!r}")
+
+    def has_pending(self, user_id: int) -> bool:
+        return user_id in self._pending
+
+    async def _run(self) -> None:
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), TRACK_FLUSH_INTERVAL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            if self._closing:
+                break
+            try:
+                await self.flush()
+            except Exception as err:
+                print(f"Error al volcar el progreso pendiente: {err!r}")
+
+    async def track(self, session: AsyncSession, habit: Habit, completion_date: date, value: int) -> dict | None:
+        """
+        Acumula `value` para (hábito, fecha) y devuelve la completitud con
+        el valor que tendrá tras el volcado. Devuelve `None` si la fila aún
+        no existe: la primera del día se escribe al momento para tener su ID.
+        """
+        async with self._lock:
+            statement = select(*_COMPLETION_COLUMNS).where(
+                HabitCompletion.habit_id == habit.id,
+                HabitCompletion.completion_date == completion_date
+            )
+            row = (await session.exec(statement)).first()
+            if row is None:
+                return None
+
+            increments = self._pending.setdefault(habit.user_id, {})
+            key = (habit.id, completion_date)
+            if key not in increments:
+                self._size += 1
+            increments[key] = increments.get(key, 0) + value
+            if self._size >= TRACK_FLUSH_MAX_PENDING:
+                self._wakeup.set()
+
+            completion = dict(row._mapping)
+            completion["value"] = (completion["value"] or 0) + increments[key]
+            return completion
+
+    async def flush(self, user_id: int | None = None) -> int | None:
+        """
+        Vuelca los incrementos pendientes (solo los de `user_id` si se
+        indica), un lote y una transacción por usuario. Si el lote de un
+        usuario falla, sus incrementos vuelven al buffer para el siguiente
+        intento. Con `user_id` devuelve su `data_version` tras el volcado,
+        o `None` si no tenía nada pendiente.
+        """
+        async with self._lock:
+            if user_id is None:
+                user_ids = list(self._pending)
+            else:
+                user_ids = [user_id] if user_id in self._pending else []
+
+            data_version = None
+            for pending_user_id in user_ids:
+                increments = self._pending.pop(pending_user_id)
+                self._size -= len(increments)
+                operations = [
+                    HabitBatchOperation(op=BatchOperationType.TRACK, habit_id=habit_id,
+                                        completion_date=completion_date, value=value)
+                    for (habit_id, completion_date), value in increments.items()
+                ]
+                try:
+                    async with self.session_maker() as session:
+                        await apply_habit_batch(session, pending_user_id, operations)
+                        await session.commit()
+                        if user_id is not None:
+                            data_version = (await session.exec(
+                                select(User.data_version).where(User.id == user_id))).first()
+                except Exception:
+                    self._restore(pending_user_id, increments)
+                    raise
+            return data_version
+
+    def _restore(self, user_id: int, increments: dict[tuple[int, date], int]) -> None:
+        current = self._pending.setdefault(user_id, {})
+        for key, value in increments.items():
+            if key not in current:
+                self._size += 1
+            current[key] = current.get(key, 0) + value
+
+
+async def flush_pending_tracks(request: Request, current_user: User = Depends(get_current_user)) -> None:
+    """
+    Dependencia para las rutas que leen o modifican completitudes: si el
+    modo write-behind está activo y el usuario tiene progreso pendiente, lo
+    vuelca antes, de modo que la ruta (y su ETag) ya lo incluyan.
+    Debe ir antes que `check_not_modified` en `dependencies=[...]`.
+    """
+    tracking_buffer: TrackingBuffer | None = getattr(
+        request.app.state, "tracking_buffer", None)
+    if tracking_buffer is None or not tracking_buffer.has_pending(current_user.id):
+        return
+
+    data_version = await tracking_buffer.flush(current_user.id)
+    if data_version is not None:
+        current_user.data_version = data_version
@@ -1,25 +1,52 @@
+import hashlib
+import os
 from fastapi import Depends, HTTPException, status
-from sqlmodel import Session
+from sqlalchemy.orm import make_transient_to_detached
+from sqlmodel.ext.asyncio.session import AsyncSession
 from jose import JWTError, jwt
 
 from database import get_session
 from models.user_models import User
 from security import SECRET_KEY, ALGORITHM, oauth2_scheme, TokenData, security_scheme
 from fastapi.security import HTTPAuthorizationCredentials
+from utils.cache_utils import TTLCache
 
 
-def get_current_user(creds: HTTPAuthorizationCredentials = Depends(security_scheme), db: Session = Depends(get_session)) -> User:
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "2048"))
+USER_CACHE_TTL_SECONDS = float(os.getenv("USER_CACHE_TTL_SECONDS", "60"))
+
+# hash del token -> user_id, válido hasta el `exp` del propio token.
+token_claims_cache = TTLCache(maxsize=TOKEN_CACHE_SIZE)
+# user_id -> columnas del usuario (nunca la instancia ORM, que es mutable).
+user_cache = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL_SECONDS)
+
+
+def invalidate_cached_user(user_id: int | None) -> None:
     """
-    Decodifica el token JWT para obtener el ID del usuario, luego busca
-    al usuario en la base de datos y lo devuelve.
+    Descarta la copia en caché de un usuario. Hay que llamarla en cada
+    escritura sobre `User` para que la siguiente petición lo relea.
     """
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="No se pudieron validar las credenciales",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
+    if user_id is not None:
+        user_cache.pop(user_id)
 
-    token = creds.credentials
+
+def _user_from_snapshot(snapshot: dict) -> User:
+    """
+    Reconstruye un `User` a partir de la copia en caché y lo marca como
+    "detached" con su identidad, de modo que `session.add` lo trate como
+    una fila existente (UPDATE) y no como una nueva (INSERT).
+    """
+    user = User.model_validate(snapshot)
+    make_transient_to_detached(user)
+    return user
+
+
+def _decode_user_id(token: str, credentials_exception: HTTPException) -> int:
+    token_hash = hashlib.sha256(token.encode()).hexdigest()
+    user_id = token_claims_cache.get(token_hash)
+    if user_id is not None:
+        return user_id
 
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
@@ -35,10 +62,40 @@ def get_current_user(creds: HTTPAuthorizationCredentials = Depends(security_sche
     if token_data.user_id is None:
         raise credentials_exception
 
-    user = db.get(User, token_data.user_id)
+    expires_at = payload.get("exp")
+    if expires_at is not None:
+        token_claims_cache.set(token_hash, token_data.user_id,
+                               expires_at=float(expires_at))
 
-    if user is None:
-        raise credentials_exception
+    return token_data.user_id
+
+
+async def get_current_user(creds: HTTPAuthorizationCredentials = Depends(security_scheme), db: AsyncSession = Depends(get_session)) -> User:
+    """
+    Decodifica el token JWT para obtener el ID del usuario, luego busca
+    al usuario en la base de datos y lo devuelve.
+    Las peticiones repetidas con el mismo token no vuelven a verificar la
+    firma ni a consultar la base de datos mientras duren las cachés.
+    """
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="No se pudieron validar las credenciales",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+    token = creds.credentials
+    user_id = _decode_user_id(token, credentials_exception)
+
+    snapshot = user_cache.get(user_id)
+    if snapshot is not None:
+        user = _user_from_snapshot(snapshot)
+    else:
+        user = await db.get(User, user_id)
+
+        if user is None:
+            raise credentials_exception
+
+        user_cache.set(user_id, user.model_dump())
 
     if not user.is_active:
         raise HTTPException(status_code=400, detail="Usuario inactivo")
@@ -0,0 +1,82 @@
+import calendar
+from datetime import date, timedelta
+from typing import Iterable
+
+# Un bit por día del año (hasta 366) -> 46 bytes.
+YEAR_BITMAP_DAYS = 366
+YEAR_BITMAP_BYTES = (YEAR_BITMAP_DAYS + 7) // 8
+
+
+def day_index(day: date) -> int:
+    """Posición del día dentro de su año: 1 de enero = 0."""
+    return day.timetuple().tm_yday - 1
+
+
+def days_in_year(year: int) -> int:
+    return 366 if calendar.isleap(year) else 365
+
+
+def bitmap_to_int(bits: bytes) -> int:
+    return int.from_bytes(bits, "little")
+
+
+def int_to_bitmap(value: int) -> bytes:
+    return value.to_bytes(YEAR_BITMAP_BYTES, "little")
+
+
+def bitmap_from_dates(dates: Iterable[date]) -> bytes:
+    """
+    Construye el bitmap de un año a partir de fechas de ese mismo año.
+    """
+    value = 0
+    for day in dates:
+        value |= 1 << day_index(day)
+    return int_to_bitmap(value)
+
+
+def set_days(bits: bytes, dates: Iterable[date], completed: bool) -> bytes:
+    """
+    Enciende (o apaga, con `completed=False`) los bits de las fechas dadas.
+    """
+    value = bitmap_to_int(bits)
+    mask = bitmap_to_int(bitmap_from_dates(dates))
+    value = value | mask if completed else value & ~mask
+    return int_to_bitmap(value)
+
+
+def dates_from_bitmap(year: int, bits: bytes) -> list[date]:
+    value = bitmap_to_int(bits)
+    first_day = date(year, 1, 1)
+    dates = []
+    while value:
+        lowest = value & -value
+        dates.append(first_day + timedelta(days=lowest.bit_length() - 1))
+        value ^= lowest
+    return dates
+
+
+def count_days(bits: bytes) -> int:
+    """Total de días marcados (popcount)."""
+    return bitmap_to_int(bits).bit_count()
+
+
+def longest_run(value: int) -> int:
+    """
+    Racha más larga de bits consecutivos a 1: cada `value & (value >> 1)`
+    acorta todas las rachas en uno, así que basta contar cuántas vueltas
+    hacen falta para dejarlo a cero.
+    """
+    length = 0
+    while value:
+        value &= value >> 1
+        length += 1
+    return length
+
+
+def run_ending_at(value: int, index: int) -> int:
+    """
+    Longitud de la racha de unos que termina en el bit `index` (0 si ese
+    bit está apagado): distancia hasta el cero más alto por debajo.
+    """
+    gaps = ~value & ((1 << (index + 1)) - 1)
+    return index - (gaps.bit_length() - 1)
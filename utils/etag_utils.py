@@ -0,0 +1,82 @@
+from datetime import date
+from fastapi import Depends, HTTPException, Request, Response, status
+from sqlalchemy import event
+from sqlmodel import select, update
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from database import get_session
+from models.user_models import User
+from utils.auth_utils import get_current_user, invalidate_cached_user
+from utils.response_utils import wants_msgpack
+
+
+def make_etag(user: User, today: date | None = None, variant: str | None = None) -> str:
+    """
+    ETag débil de los datos de un usuario. Incluye la fecha porque varias
+    respuestas (rachas actuales, progreso de hoy) cambian con el día
+    aunque no haya escrituras, y `variant` distingue representaciones
+    del mismo recurso (p. ej. MessagePack frente a JSON).
+    """
+    today = today or date.today()
+    suffix = f"-{variant}" if variant else ""
+    return f'W/"{user.id}-{user.data_version}-{today.isoformat()}{suffix}"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """
+    Comparación débil de `If-None-Match`, que puede traer varias
+    etiquetas separadas por comas o `*`.
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+
+    def opaque(tag: str) -> str:
+        tag = tag.strip()
+        return tag[2:] if tag.startswith("W/") else tag
+
+    return any(opaque(tag) == opaque(etag) for tag in if_none_match.split(","))
+
+
+async def check_not_modified(
+    request: Request,
+    response: Response,
+    current_user: User = Depends(get_current_user),
+    session: AsyncSession = Depends(get_session)
+) -> None:
+    """
+    Dependencia para GETs de lectura: responde 304 si el cliente ya tiene
+    la versión actual, con una sola consulta por clave primaria además de
+    la autenticación; si no, añade el ETag a la respuesta.
+    La versión se lee de la base de datos y no del usuario en caché: la
+    caché es por proceso y otro proceso puede haber escrito después.
+    Hay que declararla en `dependencies=[...]` de la ruta para que se
+    resuelva antes que las demás dependencias.
+    """
+    data_version = (await session.exec(
+        select(User.data_version).where(User.id == current_user.id))).first()
+    if data_version is not None:
+        current_user.data_version = data_version
+    etag = make_etag(
+        current_user, variant="msgpack" if wants_msgpack(request) else None)
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        raise HTTPException(
+            status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag, "Vary": "Accept"})
+    response.headers["ETag"] = etag
+
+
+async def bump_data_version(session: AsyncSession, user_id: int) -> int | None:
+    """
+    Incrementa la versión de datos del usuario dentro de la transacción en
+    curso (UPDATE atómico que devuelve el valor nuevo) y lo devuelve, o
+    `None` si el usuario no existe. Al confirmar se descarta el usuario de
+    la caché para que el siguiente ETag ya use la versión nueva.
+    """
+    result = await session.exec(
+        update(User).where(User.id == user_id).values(
+            data_version=User.data_version + 1).returning(User.data_version)
+    )
+    event.listen(session.sync_session, "after_commit",
+                 lambda _: invalidate_cached_user(user_id), once=True)
+    return result.scalar_one_or_none()
@@ -0,0 +1,35 @@
+import os
+import httpx
+
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(
+    os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+HTTP_KEEPALIVE_EXPIRY_SECONDS = float(
+    os.getenv("HTTP_KEEPALIVE_EXPIRY_SECONDS", "30"))
+HTTP_CONNECT_TIMEOUT_SECONDS = float(
+    os.getenv("HTTP_CONNECT_TIMEOUT_SECONDS", "5"))
+HTTP_TIMEOUT_SECONDS = float(os.getenv("HTTP_TIMEOUT_SECONDS", "10"))
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "true").lower() in (
+    "1", "true", "yes", "on")
+
+
+def create_http_client(**kwargs) -> httpx.AsyncClient:
+    """
+    Crea el cliente HTTP compartido por todo el proceso: conexiones
+    persistentes (keep-alive), HTTP/2 y límites y timeouts explícitos.
+    Los `kwargs` permiten sobrescribir opciones, p. ej. `transport` o
+    `base_url` para apuntar a un servidor local de pruebas.
+    """
+    options = {
+        "http2": HTTP2_ENABLED,
+        "limits": httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY_SECONDS,
+        ),
+        "timeout": httpx.Timeout(
+            HTTP_TIMEOUT_SECONDS, connect=HTTP_CONNECT_TIMEOUT_SECONDS),
+    }
+    options.update(kwargs)
+    return httpx.AsyncClient(**options)
+
@@ -0,0 +1,176 @@
+import codecs
+import csv
+import json
+import tempfile
+from datetime import date
+from typing import IO, AsyncIterable, AsyncIterator
+
+NDJSON_CONTENT_TYPES = ("application/x-ndjson",
+                        "application/ndjson", "application/jsonl")
+CSV_CONTENT_TYPES = ("text/csv",)
+
+_DATE_FIELDS = ("completion_date", "date")
+
+# Rango de la columna INTEGER de `value` (32 bits en PostgreSQL).
+VALUE_MIN = -2**31
+VALUE_MAX = 2**31 - 1
+
+# Las filas validadas se guardan en memoria hasta este tamaño y, a partir
+# de ahí, en un fichero temporal.
+SPOOL_MAX_MEMORY = 1024 * 1024
+
+
+class ImportFormatError(ValueError):
+    """
+    Una fila del fichero importado no se puede interpretar. `line` es el
+    número de línea (empezando en 1).
+    """
+
+    def __init__(self, line: int, message: str):
+        super().__init__(f"Línea {line}: {message}")
+        self.line = line
+
+
+def import_format(content_type: str | None) -> str | None:
+    """
+    "ndjson", "csv" o `None` si el Content-Type no es uno de los soportados.
+    """
+    media_type = (content_type or "").split(";")[0].strip().lower()
+    if media_type in NDJSON_CONTENT_TYPES:
+        return "ndjson"
+    if media_type in CSV_CONTENT_TYPES:
+        return "csv"
+    return None
+
+
+async def iter_lines(chunks: AsyncIterable[bytes]) -> AsyncIterator[str]:
+    """
+    Parte en líneas un flujo de bytes UTF-8 a medida que llega, sin
+    acumular más que la línea en curso.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    line_number = 0
+    async for chunk in chunks:
+        try:
+            pending += decoder.decode(chunk)
+        except UnicodeDecodeError as err:
+            raise ImportFormatError(
+                line_number + chunk[:max(err.start, 0)].count(b"\n") + 1, "el texto no es UTF-8 válido")
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            line_number += 1
+            yield line.rstrip("\r")
+    try:
+        pending += decoder.decode(b"", final=True)
+    except UnicodeDecodeError:
+        raise ImportFormatError(line_number + 1, "el texto no es UTF-8 válido")
+    if pending:
+        yield pending.rstrip("\r")
+
+
+def _parse_date(raw, line: int) -> date:
+    try:
+        return date.fromisoformat(str(raw).strip())
+    except ValueError:
+        raise ImportFormatError(line, f"fecha no válida: {raw!r}")
+
+
+def _parse_value(raw, line: int) -> int | None:
+    if raw is None or str(raw).strip() == "":
+        return None
+    # En JSON, `true` y `1.5` se convertirían sin error en 1.
+    if isinstance(raw, bool) or (isinstance(raw, float) and not raw.is_integer()):
+        raise ImportFormatError(line, f"valor no válido: {raw!r}")
+    try:
+        value = int(raw)
+    except (TypeError, ValueError, OverflowError):
+        raise ImportFormatError(line, f"valor no válido: {raw!r}")
+    if not VALUE_MIN <= value <= VALUE_MAX:
+        raise ImportFormatError(
+            line, f"valor fuera de rango ({VALUE_MIN} a {VALUE_MAX}): {raw!r}")
+    return value
+
+
+async def parse_ndjson(lines: AsyncIterable[str]) -> AsyncIterator[tuple[date, int | None]]:
+    """
+    Una fila por línea: {"completion_date": "2024-01-31", "value": 30}
+    (`date` también vale como nombre de la fecha; `value` es opcional).
+    """
+    line_number = 0
+    async for line in lines:
+        line_number += 1
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            raise ImportFormatError(line_number, "JSON no válido")
+        if not isinstance(record, dict):
+            raise ImportFormatError(line_number, "se esperaba un objeto JSON")
+
+        raw_date = next((record[field]
+                        for field in _DATE_FIELDS if field in record), None)
+        if raw_date is None:
+            raise ImportFormatError(line_number, "falta la fecha")
+        yield _parse_date(raw_date, line_number), _parse_value(record.get("value"), line_number)
+
+
+async def parse_csv(lines: AsyncIterable[str]) -> AsyncIterator[tuple[date, int | None]]:
+    """
+    Columnas `completion_date` (o `date`) y, opcionalmente, `value`. La
+    cabecera es opcional: sin ella, la primera columna es la fecha y la
+    segunda el valor.
+    """
+    date_column, value_column = 0, 1
+    line_number = 0
+    async for line in lines:
+        line_number += 1
+        if not line.strip():
+            continue
+        row = next(csv.reader([line]))
+
+        if line_number == 1:
+            header = [column.strip().lower() for column in row]
+            date_header = next(
+                (field for field in _DATE_FIELDS if field in header), None)
+            if date_header is not None:
+                date_column = header.index(date_header)
+                value_column = header.index(
+                    "value") if "value" in header else None
+                continue
+
+        if date_column >= len(row):
+            raise ImportFormatError(line_number, "falta la fecha")
+        raw_value = row[value_column] if value_column is not None and value_column < len(
+            row) else None
+        yield _parse_date(row[date_column], line_number), _parse_value(raw_value, line_number)
+
+
+async def spool_records(records: AsyncIterable[tuple[date, int | None]]) -> IO[str]:
+    """
+    Lee y valida todas las filas antes de escribir nada en la base de
+    datos y las guarda en un fichero temporal (en memoria mientras es
+    pequeño), listo para leerlo desde el principio con `iter_spooled`.
+    Si alguna fila no es válida, lanza `ImportFormatError` y descarta el
+    fichero.
+    """
+    spool = tempfile.SpooledTemporaryFile(
+        max_size=SPOOL_MAX_MEMORY, mode="w+", encoding="utf-8", newline="\n")
+    try:
+        async for completion_date, value in records:
+            spool.write(f"{completion_date.isoformat()},{'' if value is None else value}\n")
+    except BaseException:
+        spool.close()
+        raise
+    spool.seek(0)
+    return spool
+
+
+async def iter_spooled(spool: IO[str]) -> AsyncIterator[tuple[date, int | None]]:
+    """
+    Devuelve las filas guardadas por `spool_records`.
+    """
+    for line in spool:
+        raw_date, raw_value = line.rstrip("\n").split(",")
+        yield date.fromisoformat(raw_date), int(raw_value) if raw_value else None
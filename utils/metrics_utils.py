@@ -0,0 +1,164 @@
+import os
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+from fastapi import Response
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Histogram, generate_latest
+from starlette.routing import Match
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from dotenv import load_dotenv
+load_dotenv()
+
+
+# Sentencias SQL por petición a partir de las cuales se avisa en el log
+# (0 lo desactiva).
+METRICS_QUERY_BUDGET = int(os.getenv("METRICS_QUERY_BUDGET", "15"))
+
+UNMATCHED_ROUTE = "unmatched"
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "Latencia de las peticiones HTTP, hasta enviar el último byte.",
+    ["method", "route", "status"],
+)
+REQUEST_DB_STATEMENTS = Histogram(
+    "http_request_db_statements",
+    "Sentencias SQL ejecutadas por petición.",
+    ["method", "route"],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89, 144),
+)
+REQUEST_DB_SECONDS = Histogram(
+    "http_request_db_duration_seconds",
+    "Tiempo total de base de datos por petición.",
+    ["method", "route"],
+)
+QUERY_BUDGET_EXCEEDED = Counter(
+    "http_requests_over_query_budget_total",
+    "Peticiones que superaron el presupuesto de sentencias SQL.",
+    ["method", "route"],
+)
+DB_STATEMENTS = Counter(
+    "db_statements_total",
+    "Sentencias SQL ejecutadas, dentro de una petición o en segundo plano.",
+    ["source"],
+)
+
+
+@dataclass
+class RequestQueries:
+    statements: int = 0
+    seconds: float = 0.0
+    # Presupuesto propio de la petición (`set_query_budget`); si es None,
+    # se usa el del middleware.
+    budget: int | None = None
+
+
+# Contadores de la petición en curso. Las dependencias síncronas, las
+# respuestas en streaming y las unidades del escritor de group commit
+# corren en copias del contexto, pero comparten este mismo objeto, así
+# que también suman. El BEGIN y el COMMIT del grupo se cuentan en
+# segundo plano.
+_current_queries: ContextVar[RequestQueries | None] = ContextVar(
+    "current_request_queries", default=None)
+
+
+def record_statement(seconds: float) -> None:
+    """
+    Anota una sentencia SQL ya ejecutada. La llaman los eventos del motor
+    en `database.py`; fuera de una petición (workers, tareas de arranque)
+    solo cuenta en `db_statements_total`.
+    """
+    queries = _current_queries.get()
+    if queries is None:
+        DB_STATEMENTS.labels(source="background").inc()
+        return
+    queries.statements += 1
+    queries.seconds += seconds
+    DB_STATEMENTS.labels(source="request").inc()
+
+
+def set_query_budget(statements: int) -> None:
+    """
+    Fija el presupuesto de sentencias de la petición en curso. Es para las
+    rutas que escalan con la entrada, como un lote sobre varios hábitos:
+    así solo avisan cuando superan lo que les corresponde. Con el aviso
+    desactivado (`METRICS_QUERY_BUDGET=0`) no tiene efecto.
+    """
+    queries = _current_queries.get()
+    if queries is not None:
+        queries.budget = statements
+
+
+def _route_template(scope: Scope) -> str:
+    """
+    Plantilla de la ruta (`/habits/{habit_id}`), no la URL concreta, para
+    que el número de series no crezca con los IDs.
+    """
+    route = scope.get("route")
+    if route is None and "app" in scope:
+        for candidate in scope["app"].routes:
+            match, _ = candidate.matches(scope)
+            if match == Match.FULL:
+                route = candidate
+                break
+    return getattr(route, "path", None) or UNMATCHED_ROUTE
+
+
+class MetricsMiddleware:
+    """
+    Middleware ASGI que mide cada petición HTTP: latencia por ruta, método
+    y código, y número de sentencias y tiempo de base de datos. Avisa en
+    el log cuando una petición supera `query_budget` sentencias (o el que
+    haya fijado la ruta con `set_query_budget`), que suele delatar un
+    patrón N+1.
+    """
+
+    def __init__(self, app: ASGIApp, query_budget: int = METRICS_QUERY_BUDGET):
+        self.app = app
+        self.query_budget = query_budget
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        queries = RequestQueries()
+        token = _current_queries.set(queries)
+        status_code = 500
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            _current_queries.reset(token)
+            self._observe(scope, status_code, elapsed, queries)
+
+    def _observe(self, scope: Scope, status_code: int, elapsed: float, queries: RequestQueries) -> None:
+        method = scope["method"]
+        route = _route_template(scope)
+
+        REQUEST_LATENCY.labels(method, route, str(status_code)).observe(elapsed)
+        REQUEST_DB_STATEMENTS.labels(method, route).observe(queries.statements)
+        REQUEST_DB_SECONDS.labels(method, route).observe(queries.seconds)
+
+        budget = self.query_budget if queries.budget is None else queries.budget
+        if self.query_budget and queries.statements > budget:
+            QUERY_BUDGET_EXCEEDED.labels(method, route).inc()
+            print(f"Aviso: {method} {route} ejecutó {queries.statements} sentencias SQL "
+                  f"(presupuesto {budget}, {queries.seconds * 1000:.1f} ms en base de datos, "
+                  f"{elapsed * 1000:.1f} ms en total)")
+
+
+def metrics_response() -> Response:
+    """
+    Exposición en formato de texto de Prometheus del registro por defecto.
+    """
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,46 @@
+import base64
+import json
+from datetime import date
+from fastapi import HTTPException, status
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(*values) -> str:
+    """
+    Codifica la clave de la última fila de una página como un cursor opaco.
+    """
+    raw = json.dumps(values, default=str, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def _cursor_value(value, value_type: type):
+    if value_type is date:
+        return date.fromisoformat(value)
+    if not isinstance(value, value_type) or isinstance(value, bool):
+        raise TypeError(f"se esperaba {value_type.__name__}")
+    return value
+
+
+def decode_cursor(cursor: str, *types: type) -> list:
+    """
+    Decodifica un cursor generado por `encode_cursor` y comprueba que
+    tenga un valor de cada tipo de `types`, en orden (`int`, o `date`, que
+    viaja en formato ISO). Lanza un 400 si el cursor no es válido.
+    """
+    invalid_cursor = HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail="Cursor de paginación inválido."
+    )
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, UnicodeDecodeError):
+        raise invalid_cursor
+
+    if not isinstance(values, list) or len(values) != len(types):
+        raise invalid_cursor
+    try:
+        return [_cursor_value(value, value_type) for value, value_type in zip(values, types)]
+    except (TypeError, ValueError):
+        raise invalid_cursor
@@ -0,0 +1,71 @@
+from typing import Any
+import msgpack
+import orjson
+from fastapi import Request, Response
+from fastapi.responses import JSONResponse
+
+
+MSGPACK_MEDIA_TYPES = ("application/msgpack",
+                       "application/x-msgpack", "application/vnd.msgpack")
+
+
+class ORJSONResponse(JSONResponse):
+    """
+    Respuesta JSON serializada con orjson. Es la clase por defecto de la
+    app: entiende fechas, horas, enums y UUIDs sin pasar por
+    `jsonable_encoder`.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+
+def _msgpack_default(value: Any) -> Any:
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    raise TypeError(f"No se puede serializar {type(value).__name__} en MessagePack")
+
+
+class MsgPackResponse(Response):
+    """
+    Respuesta en MessagePack para clientes nativos. Fechas y horas van
+    como cadenas ISO 8601, igual que en JSON.
+    """
+    media_type = "application/msgpack"
+
+    def render(self, content: Any) -> bytes:
+        return msgpack.packb(content, default=_msgpack_default, use_bin_type=True)
+
+
+def wants_msgpack(request: Request) -> bool:
+    """
+    Indica si el cliente pide MessagePack en `Accept` (con q > 0).
+    """
+    for media_range in request.headers.get("accept", "").split(","):
+        media_type, *params = [part.strip()
+                               for part in media_range.split(";")]
+        if media_type.lower() not in MSGPACK_MEDIA_TYPES:
+            continue
+        quality = next((param[2:] for param in params if param.startswith("q=")), "1")
+        try:
+            if float(quality) > 0:
+                return True
+        except ValueError:
+            return True
+    return False
+
+
+def negotiated_response(request: Request, content: Any, response: Response | None = None, status_code: int = 200) -> Response:
+    """
+    Serializa `content` (tipos básicos, ya validados) en MessagePack o
+    JSON según `Accept`, sin pasar por la validación del `response_model`.
+    Copia las cabeceras puestas en el `response` inyectado (ETag, cursor...),
+    que FastAPI no añade cuando la ruta devuelve su propia respuesta.
+    """
+    response_class = MsgPackResponse if wants_msgpack(
+        request) else ORJSONResponse
+    negotiated = response_class(content, status_code=status_code)
+    negotiated.headers["Vary"] = "Accept"
+    if response is not None:
+        negotiated.headers.raw.extend(response.headers.raw)
+    return negotiated
@@ -0,0 +1,69 @@
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Iterable, Iterator
+
+ONE_DAY = timedelta(days=1)
+
+
+@dataclass
+class StreakStats:
+    """
+    Métricas de rachas de un hábito. `current_run` es la racha que termina
+    en `last_completion_date`, independientemente de la fecha actual.
+    """
+    habit_id: int
+    current_run: int = 0
+    longest_streak: int = 0
+    total_completions: int = 0
+    last_completion_date: date | None = None
+
+
+def iter_habit_streaks(rows: Iterable[tuple[int, date]]) -> Iterator[StreakStats]:
+    """
+    Consume filas (habit_id, completion_date) ordenadas por hábito y fecha
+    y devuelve las métricas de cada hábito en cuanto termina, sin guardar
+    sus fechas: la memoria no depende del tamaño del historial. Las fechas
+    repetidas se cuentan una vez.
+    """
+    habit_id = last_date = None
+    current_run = longest_streak = total = 0
+
+    for row_habit_id, completion_date in rows:
+        if row_habit_id != habit_id:
+            if habit_id is not None:
+                yield StreakStats(habit_id, current_run, longest_streak, total, last_date)
+            habit_id, last_date = row_habit_id, None
+            current_run = longest_streak = total = 0
+        elif completion_date == last_date:
+            continue
+
+        if last_date is not None and completion_date - last_date == ONE_DAY:
+            current_run += 1
+        else:
+            current_run = 1
+        if current_run > longest_streak:
+            longest_streak = current_run
+        total += 1
+        last_date = completion_date
+
+    if habit_id is not None:
+        yield StreakStats(habit_id, current_run, longest_streak, total, last_date)
+
+
+def compute_streaks(completion_dates: list[date]) -> tuple[int, int, int]:
+    """
+    Recorre una lista ordenada de fechas y devuelve (racha que termina en
+    la última fecha, racha más larga, total).
+    """
+    for stats in iter_habit_streaks((0, completion_date) for completion_date in completion_dates):
+        return stats.current_run, stats.longest_streak, stats.total_completions
+    return 0, 0, 0
+
+
+def current_streak(current_run: int, last_completion_date: date | None, today: date) -> int:
+    """
+    La racha actual solo sigue viva si la última completitud fue hoy o ayer.
+    """
+    if last_completion_date == today or last_completion_date == today - ONE_DAY:
+        return current_run
+    return 0
@@ -0,0 +1,160 @@
+import asyncio
+import contextvars
+import os
+from typing import Any, Awaitable, Callable
+
+from fastapi import Request
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from dotenv import load_dotenv
+load_dotenv()
+
+
+GROUP_COMMIT_ENABLED = os.getenv("GROUP_COMMIT_ENABLED", "false").lower() in (
+    "1", "true", "yes", "on")
+# Tiempo que se espera a más escrituras antes de confirmar un grupo.
+GROUP_COMMIT_WINDOW_MS = float(os.getenv("GROUP_COMMIT_WINDOW_MS", "2"))
+GROUP_COMMIT_MAX_BATCH = int(os.getenv("GROUP_COMMIT_MAX_BATCH", "64"))
+
+# Unidad de escritura: recibe la sesión y hace sus cambios sin hacer commit.
+WriteUnit = Callable[[AsyncSession], Awaitable[Any]]
+
+
+class GroupCommitWriter:
+    """
+    Escritor único con group commit: las rutas le envían unidades de
+    escritura y una sola tarea las ejecuta en orden de llegada. Las que
+    llegan mientras se confirma un grupo, o dentro de
+    `GROUP_COMMIT_WINDOW_MS`, van juntas (hasta `GROUP_COMMIT_MAX_BATCH`)
+    en una única transacción con un commit.
+    - Cada unidad corre en su propio SAVEPOINT: si falla, se deshace solo
+      ella y su llamador recibe la excepción; las demás siguen.
+    - Cada llamador recibe el resultado de su unidad cuando el grupo ya
+      está confirmado, o la excepción del commit si este falla.
+    - En SQLite el grupo empieza con BEGIN IMMEDIATE: toma el bloqueo de
+      escritura de una vez en lugar de competir por él a mitad de transacción.
+    - Cada unidad corre en una copia del contexto de quien la envió, así
+      que sus sentencias cuentan en las métricas de esa petición.
+    """
+
+    def __init__(self, session_maker: async_sessionmaker):
+        self.session_maker = session_maker
+        self._queue: asyncio.Queue[tuple[WriteUnit, asyncio.Future, contextvars.Context] | None] = asyncio.Queue()
+        self._runner: asyncio.Task | None = None
+
+    def start(self) -> None:
+        self._runner = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """
+        Confirma las escrituras ya encoladas y detiene el escritor.
+        """
+        if self._runner is not None:
+            await self._queue.put(None)
+            await self._runner
+            self._runner = None
+
+    async def submit(self, unit: WriteUnit) -> Any:
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((unit, future, contextvars.copy_context()))
+        return await future
+
+    async def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            item = await self._queue.get()
+            if item is None:
+                break
+            batch = [item]
+            stopping = await self._collect(batch)
+            try:
+                await self._commit_batch(batch)
+            except Exception as err:
+                print(f"Error en el escritor de group commit: {err!r}")
+
+    async def _collect(self, batch: list) -> bool:
+        """
+        Añade al grupo lo que ya está en cola y lo que llegue dentro de la
+        ventana. Devuelve True si se pidió parar.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + GROUP_COMMIT_WINDOW_MS / 1000
+        while len(batch) < GROUP_COMMIT_MAX_BATCH:
+            try:
+                item = self._queue.get_nowait()
+            except asyncio.QueueEmpty:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+            if item is None:
+                return True
+            batch.append(item)
+        return False
+
+    async def _commit_batch(self, batch: list[tuple[WriteUnit, asyncio.Future, contextvars.Context]]) -> None:
+        # Los llamadores que ya se fueron (p. ej. cliente desconectado) no se ejecutan.
+        batch = [item for item in batch if not item[1].done()]
+        if not batch:
+            return
+
+        results = []
+        try:
+            async with self.session_maker() as session:
+                connection = await session.connection()
+                if connection.dialect.name == "sqlite":
+                    await connection.exec_driver_sql("BEGIN IMMEDIATE")
+
+                for unit, future, context in batch:
+                    try:
+                        result = await asyncio.create_task(
+                            self._run_unit(session, unit), context=context)
+                    except Exception as err:
+                        if not future.done():
+                            future.set_exception(err)
+                    else:
+                        results.append((future, result))
+
+                await session.commit()
+        except Exception as err:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(err)
+            return
+
+        for future, result in results:
+            if not future.done():
+                future.set_result(result)
+
+    @staticmethod
+    async def _run_unit(session: AsyncSession, unit: WriteUnit) -> Any:
+        async with session.begin_nested():
+            return await unit(session)
+
+
+async def run_write(request: Request, session: AsyncSession, unit: WriteUnit) -> Any:
+    """
+    Ejecuta una unidad de escritura: a través del escritor de group commit
+    si está activo (`GROUP_COMMIT_ENABLED`) o, si no, en la sesión de la
+    petición con su propio commit, como siempre.
+    Todas las rutas que escriben pasan por aquí. Las unidades pueden
+    correr en otra sesión: releen lo que modifican en vez de usar objetos
+    de la sesión de la petición. Quedan fuera las escrituras en segundo
+    plano (worker de calendario, tokens de Google, buffer de /track,
+    recálculos masivos) y las proyecciones que construye una lectura.
+    """
+    writer: GroupCommitWriter | None = getattr(request.app.state, "write_queue", None)
+    if writer is None:
+        result = await unit(session)
+        await session.commit()
+        return result
+    # Cierra la transacción de lectura de la petición para devolver su
+    # conexión al pool mientras espera: si no, con muchas peticiones en
+    # cola el escritor se quedaría sin conexión. Los objetos ya cargados
+    # siguen siendo legibles (expire_on_commit=False).
+    await session.commit()
+    return await writer.submit(unit)